@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Class, Student, Subject, Enrollment, TeacherSubject, AcademicYear, FeeItem, StudentFee
+from .models import Class, Student, Subject, Enrollment, TeacherSubject, AcademicYear, FeeItem, StudentFee, StudentBalance, FeeStructure
 
 admin.site.register(Class)
 admin.site.register(Student)
@@ -8,4 +8,6 @@ admin.site.register(Enrollment)
 admin.site.register(TeacherSubject)
 admin.site.register(AcademicYear)
 admin.site.register(FeeItem)
-admin.site.register(StudentFee)
\ No newline at end of file
+admin.site.register(StudentFee)
+admin.site.register(StudentBalance)
+admin.site.register(FeeStructure)
\ No newline at end of file
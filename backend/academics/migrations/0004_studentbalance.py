@@ -0,0 +1,87 @@
+# Generated by Django 5.2.11 on 2026-10-16 23:42
+
+from decimal import Decimal
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Q, Sum
+
+
+def backfill_balances(apps, schema_editor):
+    """
+    Build a balance row for every existing student, so the dashboard (which
+    reads only StudentBalance) is right as soon as this is applied. Same
+    rules as payments.services.balances, on the historical models.
+    """
+    Student = apps.get_model('academics', 'Student')
+    StudentFee = apps.get_model('academics', 'StudentFee')
+    StudentBalance = apps.get_model('academics', 'StudentBalance')
+
+    totals = {
+        row['student_id']: row
+        for row in StudentFee.objects.values('student_id').annotate(
+            total_owed=Sum('fee_item__amount'),
+            total_paid=Sum('amount_paid'),
+            fee_count=Count('id'),
+            unpaid_fee_count=Count('id', filter=Q(is_paid=False)),
+        ).order_by()
+    }
+
+    balances = []
+    for student_id, school_id in Student.objects.values_list('pk', 'school_id').iterator():
+        row = totals.get(student_id, {})
+        total_owed = row.get('total_owed') or Decimal('0')
+        total_paid = row.get('total_paid') or Decimal('0')
+        outstanding = total_owed - total_paid
+        fee_count = row.get('fee_count', 0)
+        unpaid_fee_count = row.get('unpaid_fee_count', 0)
+        if outstanding == 0:
+            payment_status = 'PAID'
+        elif outstanding < 0:
+            payment_status = 'UNKNOWN'
+        elif unpaid_fee_count == fee_count:
+            payment_status = 'UNPAID'
+        else:
+            payment_status = 'PARTIAL'
+
+        balances.append(StudentBalance(
+            student_id=student_id,
+            school_id=school_id,
+            total_owed=total_owed,
+            total_paid=total_paid,
+            outstanding=outstanding,
+            fee_count=fee_count,
+            unpaid_fee_count=unpaid_fee_count,
+            payment_status=payment_status,
+        ))
+    StudentBalance.objects.bulk_create(balances, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('academics', '0003_academicyear_feeitem_studentfee'),
+        ('school', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StudentBalance',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('total_owed', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('total_paid', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('outstanding', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('fee_count', models.PositiveIntegerField(default=0)),
+                ('unpaid_fee_count', models.PositiveIntegerField(default=0)),
+                ('payment_status', models.CharField(choices=[('PAID', 'Paid'), ('PARTIAL', 'Partial'), ('UNPAID', 'Unpaid'), ('UNKNOWN', 'Unknown')], default='PAID', max_length=10)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('school', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='student_balances', to='school.school')),
+                ('student', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='balance', to='academics.student')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['school', 'payment_status'], name='academics_s_school__113a71_idx')],
+            },
+        ),
+        migrations.RunPython(backfill_balances, migrations.RunPython.noop),
+    ]
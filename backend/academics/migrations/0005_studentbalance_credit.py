@@ -0,0 +1,18 @@
+# Generated by Django 5.2.11 on 2026-10-17 00:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('academics', '0004_studentbalance'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='studentbalance',
+            name='credit',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=12),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.2.11 on 2026-10-17 00:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('academics', '0006_feestructure'),
+        ('school', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='student',
+            index=models.Index(fields=['school', 'student_id'], name='academics_s_school__3bda2b_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='student',
+            index=models.Index(fields=['school', 'student_class'], name='academics_s_school__705c9a_idx'),
+        ),
+    ]
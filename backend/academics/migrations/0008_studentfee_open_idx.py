@@ -0,0 +1,17 @@
+# Generated by Django 5.2.11 on 2026-10-17 00:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('academics', '0007_student_school_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='studentfee',
+            index=models.Index(condition=models.Q(('is_paid', False)), fields=['student', 'academic_year', 'term'], name='studentfee_open_idx'),
+        ),
+    ]
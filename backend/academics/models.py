@@ -1,5 +1,6 @@
 from django.db import models
 from school.models import School
+from school.tenancy import SchoolScopedManager
 from accounts.models import User
 
 class Class(models.Model):
@@ -11,6 +12,9 @@ class Class(models.Model):
     )
     created_at = models.DateTimeField(auto_now_add=True)
 
+    objects = models.Manager()
+    scoped = SchoolScopedManager()
+
     def __str__(self):
         return f"{self.name} ({self.school.name})"
 
@@ -32,6 +36,16 @@ class Student(models.Model):
     )
     created_at = models.DateTimeField(auto_now_add=True)
 
+    objects = models.Manager()
+    scoped = SchoolScopedManager()
+
+    class Meta:
+        indexes = [
+            # Tenant lists: default ordering and the class filter
+            models.Index(fields=['school', 'student_id']),
+            models.Index(fields=['school', 'student_class']),
+        ]
+
     def __str__(self):
         return f"{self.first_name} {self.last_name} ({self.student_class.name if self.student_class else 'No class'})"
 
@@ -145,8 +159,94 @@ class StudentFee(models.Model):
     is_paid = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    objects = models.Manager()
+    scoped = SchoolScopedManager('student__school')
+
     class Meta:
         unique_together = ('student', 'fee_item', 'academic_year', 'term')
+        indexes = [
+            # A student's open fees, as reconciliation and credits walk them
+            models.Index(
+                fields=['student', 'academic_year', 'term'],
+                name='studentfee_open_idx',
+                condition=models.Q(is_paid=False),
+            ),
+        ]
 
     def __str__(self):
         return f"{self.student} owes {self.fee_item} ({self.academic_year} Term {self.term})"
+
+
+class FeeStructure(models.Model):
+    """
+    Which fee items a class is billed for in a term. StudentFee rows are
+    generated from these by payments.services.fee_assignment.
+    """
+    school = models.ForeignKey(
+        'school.School',
+        on_delete=models.CASCADE,
+        related_name='fee_structures'
+    )
+    academic_year = models.ForeignKey(
+        AcademicYear,
+        on_delete=models.CASCADE,
+        related_name='fee_structures'
+    )
+    term = models.IntegerField(choices=StudentFee.TERM_CHOICES)
+    student_class = models.ForeignKey(
+        Class,
+        on_delete=models.CASCADE,
+        related_name='fee_structures'
+    )
+    fee_item = models.ForeignKey(
+        FeeItem,
+        on_delete=models.CASCADE,
+        related_name='fee_structures'
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ('academic_year', 'term', 'student_class', 'fee_item')
+
+    def __str__(self):
+        return f"{self.student_class.name}: {self.fee_item.name} ({self.academic_year.name} Term {self.term})"
+
+
+class StudentBalance(models.Model):
+    """
+    Denormalized fee totals per student, kept in sync by
+    payments.services.balances. Rebuild with `manage.py rebuild_student_balances`.
+    """
+    PAYMENT_STATUS_CHOICES = (
+        ('PAID', 'Paid'),
+        ('PARTIAL', 'Partial'),
+        ('UNPAID', 'Unpaid'),
+        ('UNKNOWN', 'Unknown'),
+    )
+
+    student = models.OneToOneField(
+        'Student',
+        on_delete=models.CASCADE,
+        related_name='balance'
+    )
+    school = models.ForeignKey(
+        'school.School',
+        on_delete=models.CASCADE,
+        related_name='student_balances'
+    )
+    total_owed = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    total_paid = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    outstanding = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    credit = models.DecimalField(max_digits=12, decimal_places=2, default=0)  # unspent overpayments
+    fee_count = models.PositiveIntegerField(default=0)
+    unpaid_fee_count = models.PositiveIntegerField(default=0)
+    payment_status = models.CharField(max_length=10, choices=PAYMENT_STATUS_CHOICES, default='PAID')
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['school', 'payment_status']),
+        ]
+
+    def __str__(self):
+        return f"{self.student} - {self.outstanding} ({self.payment_status})"
@@ -0,0 +1,120 @@
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.settings import api_settings
+
+from accounts.models import User
+from school.models import School
+
+# Claims CustomTokenObtainPairSerializer adds; tokens without them fall back to the DB
+REQUIRED_CLAIMS = ('username', 'role', 'school_id', 'school_name')
+
+
+def _user_state_key(user_id):
+    return f'auth:user-active:{user_id}'
+
+
+def _revoked_key(jti):
+    return f'auth:revoked:{jti}'
+
+
+def get_user_state(user_id):
+    """
+    The account's active flag, school and role, cached for
+    AUTH_STATE_CACHE_TIMEOUT seconds, or None if the user is gone. Saving a
+    User clears its entry (accounts.signals), so the TTL only bounds changes
+    made without save(), e.g. queryset.update().
+    """
+    key = _user_state_key(user_id)
+    state = cache.get(key)
+    if state is None:
+        row = User.objects.filter(pk=user_id).values('is_active', 'school_id', 'role').first()
+        state = row or {}
+        cache.set(key, state, settings.AUTH_STATE_CACHE_TIMEOUT)
+    return state or None
+
+
+def forget_user_state(user_id):
+    cache.delete(_user_state_key(user_id))
+
+
+def revoke_access_token(token):
+    """
+    Blacklist one access token until it expires. simplejwt only blacklists
+    refresh tokens, in the database; access tokens are checked here instead.
+    """
+    remaining = token['exp'] - int(datetime.now(dt_timezone.utc).timestamp())
+    if remaining > 0:
+        cache.set(_revoked_key(token[api_settings.JTI_CLAIM]), True, remaining)
+
+
+def is_access_token_revoked(token):
+    return cache.get(_revoked_key(token[api_settings.JTI_CLAIM]), False)
+
+
+def _from_claims(model, **values):
+    """
+    An instance of an existing row holding only `values`. The other fields
+    are deferred, so reading one loads it and save() writes only these.
+    """
+    return model.from_db(DEFAULT_DB_ALIAS, list(values), list(values.values()))
+
+
+class DatabaseJWTAuthentication(JWTAuthentication):
+    """simplejwt's authentication (loads the User row) plus the access-token blacklist"""
+
+    def get_user(self, validated_token):
+        if is_access_token_revoked(validated_token):
+            raise AuthenticationFailed('Token has been revoked', code='token_revoked')
+        return super().get_user(validated_token)
+
+
+class StatelessJWTAuthentication(DatabaseJWTAuthentication):
+    """
+    JWT authentication that builds request.user from the token's claims.
+
+    The user and their school come from `user_id`, `username`, `email`,
+    `role`, `school_id` and `school_name` without a query. Each request
+    checks the access-token blacklist and the cached user state: a token
+    whose school or role no longer matches the account is rejected, so the
+    client refreshes and gets current claims. A warm request makes no
+    database queries.
+
+    request.user holds only the claimed fields; others load on access.
+    Views that read or write the rest of the user (profile, password
+    change) use DatabaseJWTAuthentication.
+    """
+
+    def get_user(self, validated_token):
+        if any(claim not in validated_token for claim in REQUIRED_CLAIMS):
+            # Issued without our claims: load the user the usual way
+            return super().get_user(validated_token)
+
+        if is_access_token_revoked(validated_token):
+            raise AuthenticationFailed('Token has been revoked', code='token_revoked')
+        user_id = validated_token[api_settings.USER_ID_CLAIM]
+        state = get_user_state(user_id)
+        if state is None or not state['is_active']:
+            raise AuthenticationFailed('User is inactive', code='user_inactive')
+
+        school_id = validated_token['school_id']
+        if state['school_id'] != school_id or state['role'] != validated_token['role']:
+            # Moved to another school or role since the token was issued
+            raise AuthenticationFailed('Token claims are out of date', code='token_stale')
+
+        user = _from_claims(
+            User,
+            id=user_id,
+            username=validated_token['username'],
+            email=validated_token.get('email', ''),
+            role=validated_token['role'],
+            school_id=school_id,
+            is_active=True,
+        )
+        if school_id is not None:
+            user.school = _from_claims(School, id=school_id, name=validated_token['school_name'])
+        return user
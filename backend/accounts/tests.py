@@ -0,0 +1,69 @@
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from school.models import School
+from accounts.models import User
+
+
+# A private in-memory cache, so blacklist and active-flag entries don't leak between runs
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class StatelessAuthenticationTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.school = School.objects.create(name="Test Academy")
+        self.user = User.objects.create_user(
+            username='bursar', password='bursar123', role='ADMIN', school=self.school,
+            first_name='Jane', last_name='Wanjiru'
+        )
+        self.client = APIClient()
+        response = self.client.post('/api/auth/login/', {'username': 'bursar', 'password': 'bursar123'})
+        self.tokens = response.json()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {self.tokens['access']}")
+
+    def test_requests_authenticate_without_queries(self):
+        # First request caches the active flag and the school
+        self.assertEqual(self.client.get('/api/payments/students/').status_code, 200)
+
+        with self.assertNumQueries(1):
+            # Only the view's count; no user or school lookup
+            response = self.client.get('/api/payments/students/')
+        self.assertEqual(response.json()['count'], 0)
+
+    def test_profile_loads_the_full_user(self):
+        response = self.client.get('/api/auth/profile/')
+        self.assertEqual(response.json()['first_name'], 'Jane')
+
+    def test_deactivation_and_logout_revoke_access(self):
+        self.assertEqual(self.client.get('/api/auth/users/').status_code, 200)
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.client.get('/api/auth/users/').status_code, 401)
+
+        self.user.is_active = True
+        self.user.save()
+        response = self.client.post('/api/auth/logout/', {'refresh_token': self.tokens['refresh']})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.client.get('/api/auth/users/').status_code, 401)
+
+    def test_moved_user_must_refresh_for_new_claims(self):
+        other_school = School.objects.create(name="Other Academy")
+        self.user.school = other_school
+        self.user.role = 'TEACHER'
+        self.user.save()
+
+        # The old token still names the old school
+        self.assertEqual(self.client.get('/api/payments/students/').status_code, 401)
+
+        response = self.client.post('/api/auth/token/refresh/', {'refresh': self.tokens['refresh']})
+        self.assertEqual(response.status_code, 200)
+        access = AccessToken(response.json()['access'])
+        self.assertEqual(
+            (access['school_id'], access['school_name'], access['role']),
+            (other_school.pk, "Other Academy", 'TEACHER')
+        )
+
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {response.json()['access']}")
+        self.assertEqual(self.client.get('/api/payments/students/').status_code, 200)
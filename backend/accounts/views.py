@@ -3,30 +3,34 @@ from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework_simplejwt.tokens import RefreshToken
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
-from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer, TokenRefreshSerializer
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.settings import api_settings
 
 from accounts.models import User
+from accounts.authentication import DatabaseJWTAuthentication, revoke_access_token
 from .serializers import (
     UserRegistrationSerializer, UserLoginSerializer,
     UserSerializer, ChangePasswordSerializer
 )
 
 
+def add_user_claims(token, user):
+    """The claims StatelessJWTAuthentication builds request.user from"""
+    token['username'] = user.username
+    token['email'] = user.email
+    token['role'] = user.role
+    token['school_id'] = user.school.id if user.school else None
+    token['school_name'] = user.school.name if user.school else None
+    return token
+
+
 class CustomTokenObtainPairSerializer(TokenObtainPairSerializer):
     """Customize JWT token to include user info"""
     
     @classmethod
     def get_token(cls, user):
-        token = super().get_token(user)
-        
-        # Add custom claims
-        token['username'] = user.username
-        token['email'] = user.email
-        token['role'] = user.role
-        token['school_id'] = user.school.id if user.school else None
-        token['school_name'] = user.school.name if user.school else None
-        
-        return token
+        return add_user_claims(super().get_token(user), user)
     
     def validate(self, attrs):
         data = super().validate(attrs)
@@ -51,6 +55,30 @@ class CustomTokenObtainPairView(TokenObtainPairView):
     serializer_class = CustomTokenObtainPairSerializer
 
 
+class CustomTokenRefreshSerializer(TokenRefreshSerializer):
+    """
+    Refresh with the user's current claims. The stock serializer copies the
+    old refresh token's payload, so a moved or demoted user would keep their
+    old school and role for as long as they kept refreshing.
+    """
+    
+    def validate(self, attrs):
+        refresh = self.token_class(attrs['refresh'])
+        user = User.objects.select_related('school').filter(
+            pk=refresh[api_settings.USER_ID_CLAIM]
+        ).first()
+        if user is None or not user.is_active:
+            raise AuthenticationFailed('User is inactive', code='user_inactive')
+        
+        add_user_claims(refresh, user)
+        return super().validate({'refresh': str(refresh)})
+
+
+class CustomTokenRefreshView(TokenRefreshView):
+    """Token refresh that re-issues the user's claims"""
+    serializer_class = CustomTokenRefreshSerializer
+
+
 class UserRegistrationView(generics.CreateAPIView):
     """Register new user"""
     queryset = User.objects.all()
@@ -62,8 +90,8 @@ class UserRegistrationView(generics.CreateAPIView):
         serializer.is_valid(raise_exception=True)
         user = serializer.save()
         
-        # Generate tokens for new user
-        refresh = RefreshToken.for_user(user)
+        # Generate tokens for new user, with the claims stateless auth reads
+        refresh = CustomTokenObtainPairSerializer.get_token(user)
         
         return Response({
             'user': UserSerializer(user).data,
@@ -79,6 +107,8 @@ class UserProfileView(generics.RetrieveUpdateAPIView):
     """Get and update current user profile"""
     serializer_class = UserSerializer
     permission_classes = [permissions.IsAuthenticated]
+    # Reads and saves the whole user, so load the row
+    authentication_classes = [DatabaseJWTAuthentication]
     
     def get_object(self):
         return self.request.user
@@ -87,6 +117,7 @@ class UserProfileView(generics.RetrieveUpdateAPIView):
 class ChangePasswordView(APIView):
     """Change user password"""
     permission_classes = [permissions.IsAuthenticated]
+    authentication_classes = [DatabaseJWTAuthentication]
     
     def post(self, request):
         serializer = ChangePasswordSerializer(
@@ -116,6 +147,9 @@ class LogoutView(APIView):
             if refresh_token:
                 token = RefreshToken(refresh_token)
                 token.blacklist()
+                # The access token would otherwise work until it expires
+                if request.auth is not None:
+                    revoke_access_token(request.auth)
                 return Response({
                     'message': 'Logout successful'
                 }, status=status.HTTP_200_OK)
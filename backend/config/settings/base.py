@@ -48,6 +48,7 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'school.tenancy.TenantMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -113,6 +114,32 @@ USE_TZ = True
 # Static files (CSS, JavaScript, Images)
 STATIC_URL = 'static/'
 
+# Uploaded files (M-Pesa statements waiting for the upload worker)
+MEDIA_URL = 'media/'
+MEDIA_ROOT = BASE_DIR.parent / 'media'
+
+# Cache
+# File-based so the upload worker process can invalidate entries the web
+# processes read (local memory caches are per process).
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR.parent / 'cache',
+    }
+}
+
+# Dashboard stats are invalidated on writes; the timeout is only a safety net
+DASHBOARD_CACHE_TIMEOUT = 60 * 60
+
+# Admission number lookup index per school, invalidated on student writes
+ADMISSION_INDEX_CACHE_TIMEOUT = 60 * 60
+
+# Worker threads used by parallel reconciliation (Postgres only; SQLite runs serially)
+RECONCILE_WORKERS = 4
+
+# Processes used to render PDF fee statements (None: one per CPU)
+STATEMENT_WORKERS = None
+
 # Default primary key field type
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
@@ -120,7 +147,7 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 # ==================== REST FRAMEWORK CONFIGURATION ====================
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'accounts.authentication.StatelessJWTAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticated',
@@ -159,6 +186,12 @@ SIMPLE_JWT = {
     'JTI_CLAIM': 'jti',
 }
 
+# Seconds a user's active flag is trusted before re-checking the database
+AUTH_STATE_CACHE_TIMEOUT = 60
+
+# Seconds a School row is kept in each process's tenant cache (school.tenancy)
+TENANT_CACHE_TIMEOUT = 300
+
 
 # ==================== CORS CONFIGURATION ====================
 # For development - allow all origins
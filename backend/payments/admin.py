@@ -1,4 +1,9 @@
 from django.contrib import admin
-from .models import Payment
+from .models import Payment, PaymentAllocation, CreditEntry, UploadJob, DailyCollection, StatementJob
 
 admin.site.register(Payment)
+admin.site.register(PaymentAllocation)
+admin.site.register(CreditEntry)
+admin.site.register(UploadJob)
+admin.site.register(DailyCollection)
+admin.site.register(StatementJob)
@@ -0,0 +1,60 @@
+"""
+Management command to bill students from the fee structure in bulk.
+Usage: python manage.py assign_fees --academic-year-id 1 [--term 2] [--class-id 3] [--reconcile]
+
+Creates the StudentFee rows each class's FeeStructure calls for. Fees a
+student already has are left alone, so it is safe to re-run. Held credit
+is spent on the new fees; --reconcile also retries failed payments.
+"""
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from academics.models import AcademicYear, Class
+from payments.services.fee_assignment import assign_fees
+
+
+class Command(BaseCommand):
+    help = 'Generate student fees for an academic year or term from the fee structure'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--academic-year-id', type=int, required=True, help='Academic year to bill')
+        parser.add_argument('--term', type=int, choices=[1, 2, 3], help='Only bill this term')
+        parser.add_argument('--class-id', type=int, help='Only bill this class')
+        parser.add_argument(
+            '--reconcile',
+            action='store_true',
+            help='Also retry failed payments for billed students',
+        )
+
+    def handle(self, *args, **options):
+        try:
+            academic_year = AcademicYear.objects.select_related('school').get(pk=options['academic_year_id'])
+        except AcademicYear.DoesNotExist:
+            raise CommandError(f"Academic year {options['academic_year_id']} not found")
+
+        student_class = None
+        if options['class_id']:
+            try:
+                student_class = Class.objects.get(pk=options['class_id'], school=academic_year.school)
+            except Class.DoesNotExist:
+                raise CommandError(f"Class {options['class_id']} not found in {academic_year.school}")
+
+        started = time.perf_counter()
+        result = assign_fees(
+            academic_year.school, academic_year,
+            term=options['term'], student_class=student_class, reconcile=options['reconcile']
+        )
+        elapsed = time.perf_counter() - started
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Created {result['created']} fees for {result['students_billed']} students in {elapsed:.2f}s "
+            f"({result['skipped']} already billed)"
+        ))
+        self.stdout.write(f"Applied {result['credit_applied']} held credit")
+        if 'reconciliation' in result:
+            retried = result['reconciliation']
+            self.stdout.write(
+                f"Retried {retried['total']} failed payments: "
+                f"{retried['matched']} matched, {retried['failed']} failed"
+            )
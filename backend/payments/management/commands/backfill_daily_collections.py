@@ -0,0 +1,30 @@
+"""
+Management command to rebuild the DailyCollection rollup from MATCHED payments.
+Usage: python manage.py backfill_daily_collections [--school-id 1]
+"""
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from school.models import School
+from payments.services.collections import backfill_daily_collections
+
+
+class Command(BaseCommand):
+    help = 'Rebuild daily collection totals used by the trends dashboard'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--school-id', type=int, help='Only rebuild this school')
+
+    def handle(self, *args, **options):
+        schools = School.objects.all()
+        if options['school_id']:
+            schools = schools.filter(pk=options['school_id'])
+            if not schools.exists():
+                raise CommandError(f"School {options['school_id']} not found")
+
+        for school in schools:
+            with transaction.atomic():
+                days = backfill_daily_collections(school)
+            self.stdout.write(f'{school.name}: {days} days')
+
+        self.stdout.write(self.style.SUCCESS('Daily collections rebuilt'))
@@ -0,0 +1,115 @@
+"""
+Management command to benchmark M-Pesa CSV ingestion.
+Usage: python manage.py benchmark_ingest --rows 200000
+
+Compares the legacy row-by-row path (read whole file, one INSERT per row)
+against the streaming bulk parser. Every run is rolled back, so it is safe
+to point at a database that already holds data.
+"""
+import csv
+import io
+import time
+import tracemalloc
+import warnings
+from datetime import datetime, timedelta
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from school.models import School
+from payments.models import Payment
+from payments.parsers.mpesa_parser import parse_mpesa_csv, CHUNK_SIZE
+
+
+class _Rollback(Exception):
+    pass
+
+
+def build_csv(rows):
+    """Generate a synthetic Paybill statement with `rows` rows"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(['Transaction Date', 'Amount', 'Mpesa Receipt No', 'Account'])
+    start = datetime(2026, 1, 6, 8, 0, 0)
+    for i in range(rows):
+        writer.writerow([
+            (start + timedelta(seconds=i * 7)).strftime('%Y-%m-%d %H:%M:%S'),
+            f"{1000 + (i % 50) * 500}.00",
+            f"BENCH{i:010d}",
+            f"NA2026{(i % 9999) + 1:04d}",
+        ])
+    return buffer.getvalue().encode()
+
+
+def legacy_parse(file, school, uploaded_by):
+    """The original ingestion path, kept here only as a baseline"""
+    reader = csv.DictReader(file.read().decode().splitlines())
+    with warnings.catch_warnings():
+        # Naive datetimes warn on every row; don't let that skew the timing
+        warnings.simplefilter('ignore', RuntimeWarning)
+        for row in reader:
+            Payment.objects.create(
+                school=school,
+                student_admission_number=row.get("Account"),
+                transaction_code=row.get("Mpesa Receipt No"),
+                amount=row.get("Amount"),
+                transaction_date=datetime.strptime(row.get("Transaction Date"), "%Y-%m-%d %H:%M:%S"),
+                uploaded_by=uploaded_by,
+            )
+
+
+class Command(BaseCommand):
+    help = 'Benchmark legacy vs streaming M-Pesa CSV ingestion'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=20000, help='Rows in the synthetic statement')
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help='Streaming parser chunk size')
+        parser.add_argument('--skip-legacy', action='store_true', help='Only run the streaming parser')
+        parser.add_argument(
+            '--memory',
+            action='store_true',
+            help='Track peak Python memory with tracemalloc (slows both paths down)',
+        )
+
+    def handle(self, *args, **options):
+        school = School.objects.first()
+        if not school:
+            raise CommandError('No school found. Run seed_data first.')
+
+        rows = options['rows']
+        content = build_csv(rows)
+        self.stdout.write(f'Generated {rows} rows ({len(content) / 1024 / 1024:.1f} MB)')
+
+        runs = []
+        if not options['skip_legacy']:
+            runs.append(('legacy', lambda f: legacy_parse(f, school, None)))
+        runs.append((
+            'streaming',
+            lambda f: parse_mpesa_csv(f, school, None, chunk_size=options['chunk_size'])
+        ))
+
+        for label, run in runs:
+            upload = SimpleUploadedFile('bench.csv', content, content_type='text/csv')
+            elapsed, peak = self._measure(run, upload, options['memory'])
+            line = f'{label:>10}: {elapsed:8.2f}s  {rows / elapsed:10.0f} rows/s'
+            if peak is not None:
+                line += f'  peak {peak / 1024 / 1024:7.1f} MB'
+            self.stdout.write(line)
+
+    def _measure(self, run, upload, track_memory):
+        peak = None
+        if track_memory:
+            tracemalloc.start()
+        started = time.perf_counter()
+        try:
+            with transaction.atomic():
+                run(upload)
+                raise _Rollback()
+        except _Rollback:
+            pass
+        elapsed = time.perf_counter() - started
+        if track_memory:
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+        return elapsed, peak
@@ -0,0 +1,59 @@
+"""
+Management command that works through queued fee statement jobs.
+Usage: python manage.py process_statement_jobs [--once] [--sleep 2] [--workers 4]
+
+Each job's PDFs are rendered across a process pool (STATEMENT_WORKERS,
+one per CPU by default) and zipped onto local storage.
+"""
+import time
+
+from django.core.management.base import BaseCommand
+
+from payments.services.statements import claim_next_statement_job, generate_statements
+
+
+class Command(BaseCommand):
+    help = 'Render queued bulk fee statement jobs'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Drain the queue and exit instead of polling forever',
+        )
+        parser.add_argument(
+            '--sleep',
+            type=float,
+            default=2.0,
+            help='Seconds to wait between polls when the queue is empty',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=None,
+            help='Rendering processes per job (default: STATEMENT_WORKERS setting)',
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write('Waiting for statement jobs...')
+
+        while True:
+            job = claim_next_statement_job()
+            if job is None:
+                if options['once']:
+                    break
+                time.sleep(options['sleep'])
+                continue
+
+            self.stdout.write(f'Processing statement job {job.pk}')
+            started = time.perf_counter()
+            job = generate_statements(job, workers=options['workers'])
+            elapsed = time.perf_counter() - started
+
+            if job.status == 'COMPLETED':
+                self.stdout.write(self.style.SUCCESS(
+                    f'Job {job.pk} completed: {job.rendered_count} statements in {elapsed:.1f}s '
+                    f'({job.archive.name})'
+                ))
+            else:
+                self.stdout.write(self.style.ERROR(f'Job {job.pk} failed: {job.error_message}'))
@@ -0,0 +1,63 @@
+"""
+Management command that works through queued M-Pesa upload jobs.
+Usage: python manage.py process_upload_jobs [--once] [--sleep 2]
+
+Run one or more of these alongside the web server. Jobs are claimed from
+the database, so no external broker is needed and several workers can
+run at once.
+"""
+import time
+
+from django.core.management.base import BaseCommand
+
+from payments.services.jobs import claim_next_job, fail_stale_jobs, run_upload_job
+
+
+class Command(BaseCommand):
+    help = 'Process queued M-Pesa CSV upload jobs'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Drain the queue and exit instead of polling forever',
+        )
+        parser.add_argument(
+            '--sleep',
+            type=float,
+            default=2.0,
+            help='Seconds to wait between polls when the queue is empty',
+        )
+        parser.add_argument(
+            '--stale-minutes',
+            type=int,
+            default=30,
+            help='Fail RUNNING jobs that have not reported progress for this long',
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write('Waiting for upload jobs...')
+
+        while True:
+            stale = fail_stale_jobs(options['stale_minutes'])
+            if stale:
+                self.stdout.write(self.style.WARNING(f'Marked {stale} stale job(s) as failed'))
+
+            job = claim_next_job()
+            if job is None:
+                if options['once']:
+                    break
+                time.sleep(options['sleep'])
+                continue
+
+            self.stdout.write(f'Processing job {job.pk}: {job.original_filename}')
+            job = run_upload_job(job)
+
+            if job.status == 'COMPLETED':
+                self.stdout.write(self.style.SUCCESS(
+                    f'Job {job.pk} completed: {job.rows_created} created, '
+                    f'{job.rows_duplicate} duplicates, {job.rows_matched} matched, '
+                    f'{job.rows_failed} failed'
+                ))
+            else:
+                self.stdout.write(self.style.ERROR(f'Job {job.pk} failed: {job.error_message}'))
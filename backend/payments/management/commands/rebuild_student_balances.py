@@ -0,0 +1,32 @@
+"""
+Management command to rebuild the StudentBalance summary table from StudentFee.
+Usage: python manage.py rebuild_student_balances [--school-id 1]
+
+Run once after migrating, and any time the summary is suspected to be out of
+sync (e.g. after editing fees directly in the database).
+"""
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from school.models import School
+from payments.services.balances import rebuild_student_balances
+
+
+class Command(BaseCommand):
+    help = 'Rebuild per-student fee balance summaries'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--school-id', type=int, help='Only rebuild this school')
+
+    def handle(self, *args, **options):
+        school = None
+        if options['school_id']:
+            try:
+                school = School.objects.get(pk=options['school_id'])
+            except School.DoesNotExist:
+                raise CommandError(f"School {options['school_id']} not found")
+
+        with transaction.atomic():
+            count = rebuild_student_balances(school=school)
+
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt balances for {count} students'))
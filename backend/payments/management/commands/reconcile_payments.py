@@ -0,0 +1,82 @@
+"""
+Management command to reconcile UNPROCESSED payments.
+Usage: python manage.py reconcile_payments [--school-id 1] [--workers 8] [--dry-run]
+
+With --dry-run nothing is written; each payment's would-be allocation is
+printed instead.
+"""
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from school.models import School
+from payments.services.reconciliation import (
+    ALL_SCHOOLS, parallel_reconcile_payments, simulate_reconciliation
+)
+
+
+class Command(BaseCommand):
+    help = 'Reconcile unprocessed payments against student fees'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--school-id', type=int, help='Only reconcile this school')
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=settings.RECONCILE_WORKERS,
+            help='Worker threads (Postgres only; SQLite always runs one)',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Show what would change without saving anything',
+        )
+
+    def handle(self, *args, **options):
+        school = ALL_SCHOOLS
+        if options['school_id']:
+            try:
+                school = School.objects.get(pk=options['school_id'])
+            except School.DoesNotExist:
+                raise CommandError(f"School {options['school_id']} not found")
+
+        if options['dry_run']:
+            self.preview(school)
+            return
+
+        started = time.perf_counter()
+        result = parallel_reconcile_payments(school=school, workers=options['workers'])
+        elapsed = time.perf_counter() - started
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Reconciled {result['total']} payments in {elapsed:.2f}s: "
+            f"{result['matched']} matched, {result['failed']} failed"
+        ))
+
+    def preview(self, school):
+        started = time.perf_counter()
+        result = simulate_reconciliation(school=school)
+        elapsed = time.perf_counter() - started
+
+        for payment in result['payments']:
+            self.stdout.write(
+                f"{payment['transaction_code']} {payment['student_admission_number']} "
+                f"KES {payment['amount']}: {payment['status']}"
+                + (f" ({payment['error_message']})" if payment['error_message'] else '')
+            )
+            for allocation in payment['allocations']:
+                self.stdout.write(
+                    f"    {allocation['fee_item']} {allocation['academic_year']} T{allocation['term']}: "
+                    f"+{allocation['amount']} ({allocation['amount_paid_before']} -> "
+                    f"{allocation['amount_paid_after']})"
+                    + (' cleared' if allocation['is_paid'] else '')
+                )
+
+        summary = result['summary']
+        self.stdout.write(self.style.WARNING(
+            f"Dry run over {summary['total']} payments in {elapsed:.2f}s: "
+            f"{summary['matched']} would match, {summary['failed']} would fail, "
+            f"KES {summary['allocated_amount']} allocated, {summary['fees_cleared']} fees cleared. "
+            f"Nothing was saved."
+        ))
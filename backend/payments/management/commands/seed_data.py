@@ -10,7 +10,8 @@ import random
 
 from school.models import School
 from accounts.models import User
-from academics.models import Class, Student, AcademicYear, FeeItem, StudentFee
+from academics.models import Class, Student, AcademicYear, FeeItem, StudentFee, FeeStructure
+from payments.services.fee_assignment import assign_fees
 from payments.models import Payment
 
 
@@ -124,18 +125,20 @@ class Command(BaseCommand):
         
         self.stdout.write(f'Created {len(students)} students')
 
-        # Create student fees for each student
-        for student in students:
-            for term in [1, 2, 3]:
-                for fee_item in fee_items:
-                    StudentFee.objects.create(
-                        student=student,
-                        fee_item=fee_item,
-                        academic_year=academic_year,
-                        term=term,
-                        amount_paid=Decimal("0.00"),
-                        is_paid=False
-                    )
+        # Every class pays every fee item each term; bill students from that structure
+        FeeStructure.objects.bulk_create([
+            FeeStructure(
+                school=school,
+                academic_year=academic_year,
+                term=term,
+                student_class=cls,
+                fee_item=fee_item
+            )
+            for cls in classes
+            for term in [1, 2, 3]
+            for fee_item in fee_items
+        ])
+        assign_fees(school, academic_year)
         
         total_fees = StudentFee.objects.count()
         self.stdout.write(f'Created {total_fees} student fee records')
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.11 on 2026-10-16 23:44
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('academics', '0004_studentbalance'),
+        ('payments', '0003_uploadjob_content_hash'),
+        ('school', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(fields=['school', 'transaction_date', 'id'], name='payments_pa_school__b757ca_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(fields=['school', 'status', 'transaction_date', 'id'], name='payments_pa_school__2d65a9_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(fields=['school', 'created_at', 'id'], name='payments_pa_school__79a61e_idx'),
+        ),
+    ]
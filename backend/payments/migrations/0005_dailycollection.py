@@ -0,0 +1,54 @@
+# Generated by Django 5.2.11 on 2026-10-16 23:45
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+
+
+def backfill_daily_collections(apps, schema_editor):
+    """
+    Roll up existing MATCHED payments per school and local day, so trends
+    are complete as soon as this is applied (same totals as the
+    backfill_daily_collections command).
+    """
+    Payment = apps.get_model('payments', 'Payment')
+    DailyCollection = apps.get_model('payments', 'DailyCollection')
+
+    rows = Payment.objects.filter(status='MATCHED').annotate(
+        date=TruncDate('transaction_date')
+    ).values('school_id', 'date').annotate(
+        total_amount=Sum('amount'),
+        payment_count=Count('id'),
+    ).order_by()
+    DailyCollection.objects.bulk_create(
+        [DailyCollection(**row) for row in rows.iterator()],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0004_payment_keyset_indexes'),
+        ('school', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyCollection',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('total_amount', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('payment_count', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('school', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_collections', to='school.school')),
+            ],
+            options={
+                'ordering': ['date'],
+                'unique_together': {('school', 'date')},
+            },
+        ),
+        migrations.RunPython(backfill_daily_collections, migrations.RunPython.noop),
+    ]
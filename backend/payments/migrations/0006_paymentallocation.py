@@ -0,0 +1,30 @@
+# Generated by Django 5.2.11 on 2026-10-16 23:50
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('academics', '0004_studentbalance'),
+        ('payments', '0005_dailycollection'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PaymentAllocation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('payment', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='allocations', to='payments.payment')),
+                ('student_fee', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='allocations', to='academics.studentfee')),
+            ],
+            options={
+                'ordering': ['id'],
+                'indexes': [models.Index(fields=['student_fee', 'created_at'], name='payments_pa_student_d7afdf_idx')],
+                'unique_together': {('payment', 'student_fee')},
+            },
+        ),
+    ]
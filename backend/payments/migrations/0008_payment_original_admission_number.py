@@ -0,0 +1,18 @@
+# Generated by Django 5.2.11 on 2026-10-16 23:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0007_payment_upload_job'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='payment',
+            name='original_admission_number',
+            field=models.CharField(blank=True, max_length=20, null=True),
+        ),
+    ]
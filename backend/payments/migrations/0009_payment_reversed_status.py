@@ -0,0 +1,18 @@
+# Generated by Django 5.2.11 on 2026-10-17 00:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0008_payment_original_admission_number'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='payment',
+            name='status',
+            field=models.CharField(choices=[('UNPROCESSED', 'Unprocessed'), ('MATCHED', 'Matched'), ('FAILED', 'Failed'), ('REVERSED', 'Reversed')], default='UNPROCESSED', max_length=20),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.11 on 2026-10-17 00:04
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('academics', '0005_studentbalance_credit'),
+        ('payments', '0009_payment_reversed_status'),
+        ('school', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CreditEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('payment', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='credit_entries', to='payments.payment')),
+                ('school', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='credit_entries', to='school.school')),
+                ('student', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='credit_entries', to='academics.student')),
+                ('student_fee', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='credit_entries', to='academics.studentfee')),
+            ],
+            options={
+                'ordering': ['id'],
+                'indexes': [models.Index(fields=['student', 'payment'], name='payments_cr_student_94980c_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.11 on 2026-10-17 00:38
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('academics', '0008_studentfee_open_idx'),
+        ('payments', '0011_statementjob'),
+        ('school', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='payment',
+            name='payments_pa_status_7ad4af_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='payment',
+            name='payments_pa_student_96b903_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='payment',
+            name='payments_pa_transac_3f628e_idx',
+        ),
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(condition=models.Q(('status', 'UNPROCESSED')), fields=['-transaction_date'], name='payment_pending_idx'),
+        ),
+    ]
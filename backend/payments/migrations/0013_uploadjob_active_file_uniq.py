@@ -0,0 +1,20 @@
+# Generated by Django 5.2.11 on 2026-10-17 01:34
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0012_tenant_indexes'),
+        ('school', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='uploadjob',
+            constraint=models.UniqueConstraint(condition=models.Q(('status__in', ['QUEUED', 'RUNNING', 'COMPLETED'])), fields=('school', 'content_hash'), name='uploadjob_active_file_uniq'),
+        ),
+    ]
@@ -1,5 +1,6 @@
 from django.db import models
 from school.models import School
+from school.tenancy import SchoolScopedManager
 from accounts.models import User
 
 class Payment(models.Model):
@@ -8,6 +9,7 @@ class Payment(models.Model):
         ('UNPROCESSED', 'Unprocessed'),
         ('MATCHED', 'Matched'),
         ('FAILED', 'Failed'),
+        ('REVERSED', 'Reversed'),
     ]
 
     school = models.ForeignKey(School, on_delete=models.CASCADE, related_name='payments')
@@ -19,6 +21,8 @@ class Payment(models.Model):
     transaction_date = models.DateTimeField()
 
     # Reconciliation tracking
+    # Account value as typed, kept when auto-match corrected student_admission_number
+    original_admission_number = models.CharField(max_length=20, blank=True, null=True)
     matched_fee = models.ForeignKey(
         'academics.StudentFee',
         on_delete=models.SET_NULL,
@@ -31,17 +35,219 @@ class Payment(models.Model):
     # System info
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='UNPROCESSED')
     uploaded_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True)
+    upload_job = models.ForeignKey(
+        'UploadJob',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='payments'
+    )
 
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = models.Manager()
+    scoped = SchoolScopedManager()
+
     class Meta:
         ordering = ['-transaction_date']
+        # transaction_code is covered by its unique constraint. Every tenant
+        # query leads with school; QueryPlanTests checks they stay index-led.
+        indexes = [
+            # Keyset pagination over (transaction_date, id) and (created_at, id)
+            models.Index(fields=['school', 'transaction_date', 'id']),
+            models.Index(fields=['school', 'status', 'transaction_date', 'id']),
+            models.Index(fields=['school', 'created_at', 'id']),
+            # Payments per student by status: FAILED retries, MATCHED statements
+            models.Index(fields=['school', 'status', 'student_admission_number']),
+            # The cross-school reconciliation queue; small, as rows leave it once processed
+            models.Index(
+                fields=['-transaction_date'],
+                name='payment_pending_idx',
+                condition=models.Q(status='UNPROCESSED'),
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.transaction_code} - {self.amount} - {self.status}"
+
+class PaymentAllocation(models.Model):
+    """
+    The share of a payment applied to one student fee. A payment that clears
+    several fees has one row per fee; `Payment.matched_fee` keeps the first.
+    """
+    payment = models.ForeignKey(Payment, on_delete=models.CASCADE, related_name='allocations')
+    student_fee = models.ForeignKey(
+        'academics.StudentFee',
+        on_delete=models.CASCADE,
+        related_name='allocations'
+    )
+    amount = models.DecimalField(max_digits=10, decimal_places=2)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['id']
+        unique_together = ('payment', 'student_fee')
+        indexes = [
+            # "Which payments paid this fee", oldest first
+            models.Index(fields=['student_fee', 'created_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.payment.transaction_code} -> fee {self.student_fee_id}: {self.amount}"
+
+class CreditEntry(models.Model):
+    """
+    Ledger of money held for a student. An overpayment deposits a positive
+    entry; spending it on a later fee adds a negative entry for that fee
+    (plus a PaymentAllocation). A student's credit is the sum of entries.
+    """
+    school = models.ForeignKey(School, on_delete=models.CASCADE, related_name='credit_entries')
+    student = models.ForeignKey(
+        'academics.Student',
+        on_delete=models.CASCADE,
+        related_name='credit_entries'
+    )
+    payment = models.ForeignKey(Payment, on_delete=models.CASCADE, related_name='credit_entries')
+    student_fee = models.ForeignKey(
+        'academics.StudentFee',
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='credit_entries'
+    )
+    amount = models.DecimalField(max_digits=10, decimal_places=2)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['id']
+        indexes = [
+            # Remaining credit per (student, payment), oldest payment spent first
+            models.Index(fields=['student', 'payment']),
+        ]
+
+    def __str__(self):
+        return f"{self.student_id}: {self.amount} ({self.payment.transaction_code})"
+
+class UploadJob(models.Model):
+    """A queued M-Pesa statement upload, processed by the process_upload_jobs worker"""
+
+    STATUS_CHOICES = [
+        ('QUEUED', 'Queued'),
+        ('RUNNING', 'Running'),
+        ('COMPLETED', 'Completed'),
+        ('FAILED', 'Failed'),
+    ]
+
+    school = models.ForeignKey(School, on_delete=models.CASCADE, related_name='upload_jobs')
+    uploaded_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True)
+    file = models.FileField(upload_to='mpesa_uploads/%Y/%m/%d/')
+    original_filename = models.CharField(max_length=255)
+    content_hash = models.CharField(max_length=64)  # sha256 of the file bytes
+
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='QUEUED')
+
+    # Progress counters, updated as the worker runs
+    rows_parsed = models.PositiveIntegerField(default=0)
+    rows_created = models.PositiveIntegerField(default=0)
+    rows_duplicate = models.PositiveIntegerField(default=0)
+    rows_rejected = models.PositiveIntegerField(default=0)
+    rows_matched = models.PositiveIntegerField(default=0)
+    rows_failed = models.PositiveIntegerField(default=0)
+    errors = models.JSONField(default=list, blank=True)
+    error_message = models.TextField(blank=True, null=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'created_at']),
+            models.Index(fields=['school', 'content_hash']),
+        ]
+        constraints = [
+            # One live job per file and school; a FAILED upload can be retried
+            models.UniqueConstraint(
+                fields=['school', 'content_hash'],
+                name='uploadjob_active_file_uniq',
+                condition=models.Q(status__in=['QUEUED', 'RUNNING', 'COMPLETED']),
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.original_filename} - {self.status}"
+
+
+class DailyCollection(models.Model):
+    """
+    MATCHED payment totals per school per local calendar day.
+    Maintained by reconciliation; rebuild with `manage.py backfill_daily_collections`.
+    """
+    school = models.ForeignKey(School, on_delete=models.CASCADE, related_name='daily_collections')
+    date = models.DateField()
+    total_amount = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    payment_count = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['date']
+        unique_together = ('school', 'date')
+
+    def __str__(self):
+        return f"{self.school} {self.date}: {self.total_amount} ({self.payment_count})"
+
+
+class StatementJob(models.Model):
+    """A queued batch of fee statements, rendered by the process_statement_jobs worker"""
+
+    STATUS_CHOICES = [
+        ('QUEUED', 'Queued'),
+        ('RUNNING', 'Running'),
+        ('COMPLETED', 'Completed'),
+        ('FAILED', 'Failed'),
+    ]
+
+    school = models.ForeignKey(School, on_delete=models.CASCADE, related_name='statement_jobs')
+    requested_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True)
+
+    # Scope: one class or the whole school, optionally one year/term
+    student_class = models.ForeignKey(
+        'academics.Class',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='statement_jobs'
+    )
+    academic_year = models.ForeignKey(
+        'academics.AcademicYear',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='statement_jobs'
+    )
+    term = models.IntegerField(null=True, blank=True)
+
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='QUEUED')
+
+    # Progress counters, updated as the worker runs
+    total_students = models.PositiveIntegerField(default=0)
+    rendered_count = models.PositiveIntegerField(default=0)
+    archive = models.FileField(upload_to='statements/%Y/%m/%d/', blank=True)
+    error_message = models.TextField(blank=True, null=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['-created_at']
         indexes = [
-            models.Index(fields=['status']),
-            models.Index(fields=['student_admission_number']),
-            models.Index(fields=['transaction_code']),
+            models.Index(fields=['status', 'created_at']),
         ]
 
     def __str__(self):
-        return f"{self.transaction_code} - {self.amount} - {self.status}"
\ No newline at end of file
+        return f"Statements for {self.school} - {self.status}"
@@ -0,0 +1,179 @@
+import base64
+import json
+from collections import OrderedDict
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class StandardResultsSetPagination(PageNumberPagination):
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+
+
+class KeysetResultsSetPagination(StandardResultsSetPagination):
+    """
+    Page-number pagination by default; keyset pagination on request.
+
+    Clients opt in with `?pagination=cursor` and then follow the opaque
+    `next` / `previous` links, which carry a `cursor` parameter. Keyset pages
+    filter on (ordering field, id) instead of COUNT(*) + OFFSET, so late pages
+    cost the same as the first one.
+
+    Views set `keyset_ordering`, e.g. ('-transaction_date', '-id'): datetime
+    fields followed by `id` as the unique tiebreaker. Client `ordering` is
+    ignored in cursor mode.
+    """
+    cursor_query_param = 'cursor'
+    mode_query_param = 'pagination'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.use_keyset = (
+            self.cursor_query_param in request.query_params
+            or request.query_params.get(self.mode_query_param) == 'cursor'
+        )
+        if not self.use_keyset:
+            return super().paginate_queryset(queryset, request, view)
+
+        self.request = request
+        self.ordering = view.keyset_ordering
+        self.keyset_size = self.get_page_size(request)
+
+        cursor = self.decode_cursor(request)
+        reverse = cursor is not None and cursor['reverse']
+
+        ordering = self.ordering
+        if reverse:
+            ordering = [self._flip(field) for field in ordering]
+
+        queryset = queryset.order_by(*ordering)
+        if cursor is not None:
+            queryset = queryset.filter(self._after(ordering, cursor['position']))
+
+        # One extra row tells us whether there is another page in this direction
+        rows = list(queryset[:self.keyset_size + 1])
+        has_more = len(rows) > self.keyset_size
+        rows = rows[:self.keyset_size]
+
+        if reverse:
+            rows.reverse()
+            self.has_next = cursor is not None
+            self.has_previous = has_more
+        else:
+            self.has_next = has_more
+            self.has_previous = cursor is not None
+
+        self.page_rows = rows
+        return rows
+
+    def get_paginated_response(self, data):
+        if not self.use_keyset:
+            return super().get_paginated_response(data)
+
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ]))
+
+    def get_next_link(self):
+        if not self.use_keyset:
+            return super().get_next_link()
+        if not self.has_next or not self.page_rows:
+            return None
+        return self._link(self.page_rows[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.use_keyset:
+            return super().get_previous_link()
+        if not self.has_previous or not self.page_rows:
+            return None
+        return self._link(self.page_rows[0], reverse=True)
+
+    # ---- cursor encoding ----
+
+    def _link(self, row, reverse):
+        position = [self._field_value(row, field) for field in self.ordering]
+        payload = json.dumps({'p': position, 'r': reverse}, separators=(',', ':'))
+        cursor = base64.urlsafe_b64encode(payload.encode()).decode()
+
+        url = self.request.build_absolute_uri()
+        url = remove_query_param(url, self.mode_query_param)
+        return replace_query_param(url, self.cursor_query_param, cursor)
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(encoded.encode()).decode())
+            position = payload['p']
+            reverse = bool(payload['r'])
+        except (TypeError, ValueError, KeyError):
+            raise NotFound(self.invalid_cursor_message)
+
+        if not isinstance(position, list) or len(position) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+        return {'position': position, 'reverse': reverse}
+
+    @staticmethod
+    def _flip(field):
+        return field[1:] if field.startswith('-') else f'-{field}'
+
+    @staticmethod
+    def _field_value(row, field):
+        # Rows are model instances, or dicts on the values() read path
+        name = field.lstrip('-')
+        value = row[name] if isinstance(row, dict) else getattr(row, name)
+        if hasattr(value, 'isoformat'):
+            return value.isoformat()
+        return value
+
+    def _parse_datetime(self, value):
+        try:
+            # Well-formed but impossible values (month 13) raise ValueError
+            parsed = parse_datetime(value) if isinstance(value, str) else None
+        except ValueError:
+            parsed = None
+        if parsed is None:
+            raise NotFound(self.invalid_cursor_message)
+        return parsed
+
+    def _after(self, ordering, position):
+        """
+        Rows strictly after `position` in `ordering`, e.g. for
+        (-transaction_date, -id):
+        date <= d AND (date < d OR (date = d AND id < i)).
+
+        The leading bound is implied by the OR but lets Postgres read the
+        page as one range of the (school, date, id) index instead of
+        filtering every row before the cursor.
+        """
+        values = []
+        for field, value in zip(ordering, position):
+            name = field.lstrip('-')
+            if name == 'id':
+                if not isinstance(value, int) or isinstance(value, bool):
+                    raise NotFound(self.invalid_cursor_message)
+            else:
+                # The other keyset fields are datetimes, sent as ISO 8601 text
+                value = self._parse_datetime(value)
+            values.append((name, field.startswith('-'), value))
+
+        condition = Q()
+        for i, (name, descending, value) in enumerate(values):
+            lookup = 'lt' if descending else 'gt'
+            clause = Q(**{f'{name}__{lookup}': value})
+            for prev_name, _, prev_value in values[:i]:
+                clause &= Q(**{prev_name: prev_value})
+            condition |= clause
+
+        name, descending, value = values[0]
+        bound = Q(**{f'{name}__{"lte" if descending else "gte"}': value})
+        return bound & condition
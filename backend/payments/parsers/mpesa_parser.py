@@ -1,20 +1,187 @@
+import codecs
 import csv
 from datetime import datetime
+from decimal import Decimal, InvalidOperation
+
+from django.core.exceptions import ValidationError
+from django.core.validators import DecimalValidator
+from django.db import transaction
+from django.utils import timezone
+
 from payments.models import Payment
+from payments.services.dashboard import invalidate_dashboard_stats
+
+# Number of rows validated and written per bulk_create round-trip.
+CHUNK_SIZE = 2000
+
+# Bytes pulled from the upload per read while decoding.
+READ_SIZE = 64 * 1024
+
+# Cap on row errors kept in the summary so a broken file can't blow up memory.
+MAX_ERRORS = 100
+
+DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+_amount_field = Payment._meta.get_field("amount")
+# Rejects NaN/Infinity and amounts the column can't hold (Postgres would refuse them)
+validate_amount = DecimalValidator(_amount_field.max_digits, _amount_field.decimal_places)
+
+
+def iter_decoded_lines(file, encoding="utf-8-sig", read_size=READ_SIZE):
+    """
+    Decode an uploaded file incrementally and yield it line by line.
+    Only one read buffer plus a partial line is ever held in memory.
+    """
+    if hasattr(file, "chunks"):
+        blocks = file.chunks(read_size)
+    else:
+        blocks = iter(lambda: file.read(read_size), b"")
+
+    decoder = codecs.getincrementaldecoder(encoding)()
+    pending = ""
+    for block in blocks:
+        pending += decoder.decode(block)
+        lines = pending.splitlines(keepends=True)
+        # Hold back a trailing partial line until the next block arrives,
+        # including a bare "\r" whose "\n" may be at the start of that block
+        if lines and not lines[-1].endswith("\n"):
+            pending = lines.pop()
+        else:
+            pending = ""
+        yield from lines
+
+    pending += decoder.decode(b"", final=True)
+    if pending:
+        yield pending
+
+
+def build_payment(row, school, uploaded_by, upload_job=None):
+    """
+    Validate one CSV row and build an unsaved Payment.
+    Raises ValueError with a readable message if the row is invalid.
+    """
+    transaction_code = (row.get("Mpesa Receipt No") or "").strip()
+    admission_number = (row.get("Account") or "").strip()
+    raw_amount = (row.get("Amount") or "").strip().replace(",", "")
+    raw_date = (row.get("Transaction Date") or "").strip()
+
+    if not transaction_code:
+        raise ValueError("Missing 'Mpesa Receipt No'")
+    if not admission_number:
+        raise ValueError("Missing 'Account'")
+    for column, value, field in (
+        ("Mpesa Receipt No", transaction_code, "transaction_code"),
+        ("Account", admission_number, "student_admission_number"),
+    ):
+        max_length = Payment._meta.get_field(field).max_length
+        if len(value) > max_length:
+            raise ValueError(f"'{column}' is longer than {max_length} characters")
+
+    try:
+        amount = Decimal(raw_amount)
+        validate_amount(amount)
+    except (InvalidOperation, ValidationError):
+        raise ValueError(f"Invalid amount '{raw_amount}'")
 
-def parse_mpesa_csv(file, school, uploaded_by):
+    try:
+        transaction_date = datetime.strptime(raw_date, DATE_FORMAT)
+    except ValueError:
+        raise ValueError(f"Invalid transaction date '{raw_date}'")
+
+    return Payment(
+        school=school,
+        student_admission_number=admission_number,
+        transaction_code=transaction_code,
+        amount=amount,
+        transaction_date=timezone.make_aware(transaction_date),
+        uploaded_by=uploaded_by,
+        upload_job=upload_job,
+    )
+
+
+def _write_chunk(batch, summary, chunk_size, skip_duplicates):
+    """
+    Insert one chunk of payments. With skip_duplicates, receipt numbers that
+    are already stored (or repeated within the chunk) are dropped first using
+    a single set query.
+    """
+    if skip_duplicates:
+        unique = {}
+        for payment in batch:
+            unique.setdefault(payment.transaction_code, payment)
+
+        existing = set(
+            Payment.objects.filter(
+                transaction_code__in=unique.keys()
+            ).values_list('transaction_code', flat=True)
+        )
+        new_payments = [p for code, p in unique.items() if code not in existing]
+        new_codes = [p.transaction_code for p in new_payments]
+
+        # ignore_conflicts covers rows inserted by a concurrent upload since the
+        # check; those are dropped silently, so count what actually went in
+        with transaction.atomic():
+            before = Payment.objects.filter(transaction_code__in=new_codes).count() if new_codes else 0
+            Payment.objects.bulk_create(new_payments, batch_size=chunk_size, ignore_conflicts=True)
+            created = Payment.objects.filter(transaction_code__in=new_codes).count() - before if new_codes else 0
+        summary['created'] += created
+        summary['duplicates'] += len(batch) - created
+    else:
+        Payment.objects.bulk_create(batch, batch_size=chunk_size)
+        summary['created'] += len(batch)
+
+
+def parse_mpesa_csv(file, school, uploaded_by, chunk_size=CHUNK_SIZE, progress=None,
+                    skip_duplicates=True, upload_job=None):
     """
     Parse CSV file exported from M-Pesa Paybill statement.
     Expected columns: 'Transaction Date', 'Amount', 'Mpesa Receipt No', 'Account'
+
+    The file is streamed and rows are inserted with bulk_create in chunks of
+    `chunk_size`, so memory stays flat regardless of file size. Invalid rows
+    are skipped and reported in the returned summary. If given, `progress` is
+    called with the running summary after every chunk is written.
+
+    With `skip_duplicates` (the default) rows whose receipt number is already
+    stored are counted as duplicates instead of failing the upload, so an
+    overlapping statement can be re-uploaded safely.
+
+    New payments are linked to `upload_job` when given, so the job can
+    reconcile just the rows it created.
     """
-    reader = csv.DictReader(file.read().decode().splitlines())
+    reader = csv.DictReader(iter_decoded_lines(file))
+
+    summary = {
+        'parsed': 0,
+        'created': 0,
+        'duplicates': 0,
+        'rejected': 0,
+        'errors': [],
+    }
+    batch = []
+
     for row in reader:
-        Payment.objects.create(
-            school=school,
-            student_admission_number=row.get("Account"),
-            transaction_code=row.get("Mpesa Receipt No"),
-            amount=row.get("Amount"),
-            transaction_date=datetime.strptime(row.get("Transaction Date"), "%Y-%m-%d %H:%M:%S"),
-            uploaded_by=uploaded_by,
-        )
+        summary['parsed'] += 1
+        try:
+            batch.append(build_payment(row, school, uploaded_by, upload_job))
+        except ValueError as e:
+            summary['rejected'] += 1
+            if len(summary['errors']) < MAX_ERRORS:
+                summary['errors'].append({'line': reader.line_num, 'error': str(e)})
+            continue
+
+        if len(batch) >= chunk_size:
+            _write_chunk(batch, summary, chunk_size, skip_duplicates)
+            batch = []
+            if progress:
+                progress(summary)
+
+    if batch:
+        _write_chunk(batch, summary, chunk_size, skip_duplicates)
+
+    if summary['created']:
+        invalidate_dashboard_stats(school.pk)
 
+    if progress:
+        progress(summary)
+    return summary
@@ -0,0 +1,186 @@
+"""
+values()-based read path for hot list endpoints.
+
+A reader names the columns a list needs and how each one is turned into
+its JSON value. Views using ValuesListMixin query those columns with
+.values(), paginate the plain dicts and map each row through the reader,
+producing the same output as the view's ModelSerializer without building
+model instances or running DRF fields one by one.
+"""
+from functools import cached_property
+
+from django.db.models import CharField, OuterRef, Subquery, Value
+from django.db.models.functions import Concat
+from django.utils import timezone
+from rest_framework.response import Response
+
+from academics.models import Student
+
+
+def money(value):
+    """Model DecimalFields render as fixed-point strings, e.g. '5000.00'"""
+    return f'{value:.2f}'
+
+
+def datetime_iso(value, tz=None):
+    """Same text as DRF's DateTimeField: local time, ISO 8601, 'Z' for UTC"""
+    value = value.astimezone(tz or timezone.get_current_timezone()).isoformat()
+    if value.endswith('+00:00'):
+        value = value[:-6] + 'Z'
+    return value
+
+
+class RowReader:
+    """
+    Maps .values() rows to response dicts.
+
+    `columns` is a list of (output key, ORM lookup, converter or None);
+    converters only run on non-null values. `derived` is a list of (output
+    key, function of the raw row) for values built from several columns,
+    which fetch their inputs through `extra_lookups`. Output keys follow
+    `field_order` if given, else `columns` then `derived`.
+
+    The (key, getter) pairs are built once per reader; the request's
+    timezone is passed in per call for the datetime converters.
+    """
+
+    def __init__(self, columns, derived=(), extra_lookups=(), field_order=None):
+        self.columns = list(columns)
+        self.derived = list(derived)
+        self.lookups = [lookup for _, lookup, _ in self.columns] + list(extra_lookups)
+        self.field_order = field_order or [key for key, _, _ in self.columns] + [key for key, _ in self.derived]
+
+    def annotate(self, queryset):
+        """Hook for readers whose columns need annotations"""
+        return queryset
+
+    def values(self, queryset):
+        return self.annotate(queryset).values(*self.lookups)
+
+    @cached_property
+    def getters(self):
+        getters = {key: _column_getter(lookup, convert) for key, lookup, convert in self.columns}
+        getters.update((key, _derived_getter(build)) for key, build in self.derived)
+        return [(key, getters[key]) for key in self.field_order]
+
+    def map_rows(self, rows):
+        getters = self.getters
+        tz = timezone.get_current_timezone()
+        return [{key: get(row, tz) for key, get in getters} for row in rows]
+
+
+def _column_getter(lookup, convert):
+    if convert is None:
+        return lambda row, tz: row[lookup]
+    if convert is datetime_iso:
+        return lambda row, tz: None if row[lookup] is None else convert(row[lookup], tz)
+    return lambda row, tz: None if row[lookup] is None else convert(row[lookup])
+
+
+def _derived_getter(build):
+    return lambda row, tz: build(row)
+
+
+def _full_name(first_name, last_name):
+    def build(row):
+        if row[first_name] is None:
+            return None
+        return f'{row[first_name]} {row[last_name]}'
+    return build
+
+
+def _matched_fee_details(row):
+    if row['matched_fee'] is None:
+        return None
+    return {
+        'fee_item': row['matched_fee__fee_item__name'],
+        'academic_year': row['matched_fee__academic_year__name'],
+        'term': row['matched_fee__term'],
+    }
+
+
+class PaymentReader(RowReader):
+    """Same output as PaymentSerializer"""
+
+    def __init__(self):
+        super().__init__(
+            columns=[
+                ('id', 'id', None),
+                ('school', 'school', None),
+                ('school_name', 'school__name', None),
+                ('transaction_code', 'transaction_code', None),
+                ('student_admission_number', 'student_admission_number', None),
+                ('original_admission_number', 'original_admission_number', None),
+                ('student_name', 'student_name', None),
+                ('amount', 'amount', money),
+                ('transaction_date', 'transaction_date', datetime_iso),
+                ('status', 'status', None),
+                ('error_message', 'error_message', None),
+                ('matched_fee', 'matched_fee', None),
+                ('uploaded_by', 'uploaded_by', None),
+                ('created_at', 'created_at', datetime_iso),
+                ('updated_at', 'updated_at', datetime_iso),
+            ],
+            derived=[
+                ('matched_fee_details', _matched_fee_details),
+                ('uploaded_by_name', _full_name('uploaded_by__first_name', 'uploaded_by__last_name')),
+            ],
+            extra_lookups=[
+                'matched_fee__fee_item__name', 'matched_fee__academic_year__name', 'matched_fee__term',
+                'uploaded_by__first_name', 'uploaded_by__last_name',
+            ],
+            field_order=[
+                'id', 'school', 'school_name', 'transaction_code',
+                'student_admission_number', 'original_admission_number', 'student_name', 'amount',
+                'transaction_date', 'status', 'error_message',
+                'matched_fee', 'matched_fee_details', 'uploaded_by',
+                'uploaded_by_name', 'created_at', 'updated_at'
+            ],
+        )
+
+    def annotate(self, queryset):
+        student_name = Student.objects.filter(
+            school_id=OuterRef('school_id'),
+            student_id=OuterRef('student_admission_number'),
+        ).annotate(
+            full_name=Concat('first_name', Value(' '), 'last_name', output_field=CharField())
+        ).values('full_name')[:1]
+        return queryset.annotate(student_name=Subquery(student_name))
+
+
+class StudentListReader(RowReader):
+    """
+    Same output as StudentListSerializer, for a queryset annotated by
+    annotate_student_balances. outstanding_balance stays a Decimal, which
+    the renderer writes as a number like the serializer's method field.
+    """
+
+    def __init__(self):
+        super().__init__(columns=[
+            ('id', 'id', None),
+            ('first_name', 'first_name', None),
+            ('last_name', 'last_name', None),
+            ('student_id', 'student_id', None),
+            ('class_name', 'student_class__name', None),
+            ('outstanding_balance', 'outstanding_balance', None),
+            ('payment_status', 'payment_status', None),
+        ])
+
+
+class ValuesListMixin:
+    """
+    Serve a ListAPIView through its `row_reader` instead of its serializer.
+    Set `fast_read = False` on a view to go back to the serializer.
+    """
+    row_reader = None
+    fast_read = True
+
+    def list(self, request, *args, **kwargs):
+        if not self.fast_read or self.row_reader is None:
+            return super().list(request, *args, **kwargs)
+
+        queryset = self.row_reader.values(self.filter_queryset(self.get_queryset()))
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(self.row_reader.map_rows(page))
+        return Response(self.row_reader.map_rows(queryset))
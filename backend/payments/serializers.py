@@ -1,7 +1,52 @@
+from django.urls import reverse
 from rest_framework import serializers
-from payments.models import Payment
-from academics.models import Student, StudentFee, Class, AcademicYear, FeeItem
+from payments.models import Payment, PaymentAllocation, UploadJob, StatementJob
+from academics.models import Student, StudentFee, StudentBalance, Class, AcademicYear, FeeItem, FeeStructure
 from school.models import School
+from school.tenancy import get_current_school
+from payments.services.balances import get_payment_status
+
+
+def get_student_balance(student):
+    """
+    The student's StudentBalance summary. Falls back to aggregating fees
+    (unsaved row) if the summary hasn't been built for this student yet.
+    """
+    balance = getattr(student, 'balance', None)
+    if balance is not None:
+        return balance
+
+    from django.db.models import Sum, Count, Q
+    totals = student.fees.aggregate(
+        total_owed=Sum('fee_item__amount'),
+        total_paid=Sum('amount_paid'),
+        fee_count=Count('id'),
+        unpaid_fee_count=Count('id', filter=Q(is_paid=False)),
+    )
+    total_owed = totals['total_owed'] or 0
+    total_paid = totals['total_paid'] or 0
+    outstanding = total_owed - total_paid
+    return StudentBalance(
+        student=student,
+        total_owed=total_owed,
+        total_paid=total_paid,
+        outstanding=outstanding,
+        fee_count=totals['fee_count'],
+        unpaid_fee_count=totals['unpaid_fee_count'],
+        payment_status=get_payment_status(
+            outstanding, totals['unpaid_fee_count'], totals['fee_count']
+        ),
+    )
+
+
+def get_balance_value(student, annotation, field):
+    """
+    A balance figure for a student: the annotate_student_balances value
+    when the queryset carried it, else the StudentBalance field.
+    """
+    if hasattr(student, annotation):
+        return getattr(student, annotation)
+    return getattr(get_student_balance(student), field)
 
 
 class SchoolSerializer(serializers.ModelSerializer):
@@ -33,6 +78,29 @@ class FeeItemSerializer(serializers.ModelSerializer):
         fields = ['id', 'name', 'amount', 'school', 'created_at']
 
 
+class FeeStructureSerializer(serializers.ModelSerializer):
+    class_name = serializers.CharField(source='student_class.name', read_only=True)
+    fee_item_name = serializers.CharField(source='fee_item.name', read_only=True)
+    academic_year_name = serializers.CharField(source='academic_year.name', read_only=True)
+    
+    class Meta:
+        model = FeeStructure
+        fields = [
+            'id', 'academic_year', 'academic_year_name', 'term', 'student_class', 'class_name',
+            'fee_item', 'fee_item_name', 'created_at'
+        ]
+        read_only_fields = ['created_at']
+    
+    def validate(self, attrs):
+        school = get_current_school()
+        if school is None:
+            raise serializers.ValidationError("User must be associated with a school")
+        for field in ('academic_year', 'student_class', 'fee_item'):
+            if attrs[field].school_id != school.pk:
+                raise serializers.ValidationError({field: "Must belong to your school"})
+        return attrs
+
+
 class StudentFeeSerializer(serializers.ModelSerializer):
     fee_item_name = serializers.CharField(source='fee_item.name', read_only=True)
     fee_item_amount = serializers.DecimalField(
@@ -61,6 +129,7 @@ class StudentSerializer(serializers.ModelSerializer):
     total_fees_owed = serializers.SerializerMethodField()
     total_fees_paid = serializers.SerializerMethodField()
     outstanding_balance = serializers.SerializerMethodField()
+    credit_balance = serializers.SerializerMethodField()
     fees = StudentFeeSerializer(many=True, read_only=True)
     
     class Meta:
@@ -68,21 +137,20 @@ class StudentSerializer(serializers.ModelSerializer):
         fields = [
             'id', 'first_name', 'last_name', 'student_id', 'school',
             'student_class', 'class_name', 'total_fees_owed',
-            'total_fees_paid', 'outstanding_balance', 'fees', 'created_at'
+            'total_fees_paid', 'outstanding_balance', 'credit_balance', 'fees', 'created_at'
         ]
     
     def get_total_fees_owed(self, obj):
-        from django.db.models import Sum
-        total = obj.fees.aggregate(total=Sum('fee_item__amount'))['total']
-        return total or 0
+        return get_balance_value(obj, 'total_fees_owed', 'total_owed')
     
     def get_total_fees_paid(self, obj):
-        from django.db.models import Sum
-        total = obj.fees.aggregate(total=Sum('amount_paid'))['total']
-        return total or 0
+        return get_balance_value(obj, 'total_fees_paid', 'total_paid')
     
     def get_outstanding_balance(self, obj):
-        return self.get_total_fees_owed(obj) - self.get_total_fees_paid(obj)
+        return get_balance_value(obj, 'outstanding_balance', 'outstanding')
+    
+    def get_credit_balance(self, obj):
+        return get_balance_value(obj, 'credit_balance', 'credit')
 
 
 class StudentListSerializer(serializers.ModelSerializer):
@@ -99,24 +167,43 @@ class StudentListSerializer(serializers.ModelSerializer):
         ]
     
     def get_outstanding_balance(self, obj):
-        from django.db.models import Sum, F
-        balance = obj.fees.aggregate(
-            balance=Sum(F('fee_item__amount') - F('amount_paid'))
-        )['balance']
-        return balance or 0
+        return get_balance_value(obj, 'outstanding_balance', 'outstanding')
     
     def get_payment_status(self, obj):
-        balance = self.get_outstanding_balance(obj)
-        if balance == 0:
-            return 'PAID'
-        elif balance > 0:
-            unpaid_count = obj.fees.filter(is_paid=False).count()
-            total_count = obj.fees.count()
-            if unpaid_count == total_count:
-                return 'UNPAID'
-            else:
-                return 'PARTIAL'
-        return 'UNKNOWN'
+        return get_balance_value(obj, 'payment_status', 'payment_status')
+
+
+def get_student_names(payments):
+    """
+    Resolve student names for a page of payments with one query.
+    Returns {(school_id, admission_number): "First Last"}.
+    """
+    admission_numbers = {p.student_admission_number for p in payments}
+    school_ids = {p.school_id for p in payments}
+    if not admission_numbers:
+        return {}
+
+    students = Student.objects.filter(
+        school_id__in=school_ids,
+        student_id__in=admission_numbers
+    ).values_list('school_id', 'student_id', 'first_name', 'last_name')
+
+    return {
+        (school_id, student_id): f"{first_name} {last_name}"
+        for school_id, student_id, first_name, last_name in students
+    }
+
+
+class PaymentListSerializer(serializers.ListSerializer):
+    """Looks up every student name on the page up front instead of per row"""
+
+    def to_representation(self, data):
+        payments = list(data.all() if hasattr(data, 'all') else data)
+        self.child.student_names = get_student_names(payments)
+        try:
+            return super().to_representation(payments)
+        finally:
+            self.child.student_names = None
 
 
 class PaymentSerializer(serializers.ModelSerializer):
@@ -124,12 +211,16 @@ class PaymentSerializer(serializers.ModelSerializer):
     uploaded_by_name = serializers.SerializerMethodField()
     student_name = serializers.SerializerMethodField()
     matched_fee_details = serializers.SerializerMethodField()
+
+    # Filled in by PaymentListSerializer for the duration of a page
+    student_names = None
     
     class Meta:
         model = Payment
+        list_serializer_class = PaymentListSerializer
         fields = [
             'id', 'school', 'school_name', 'transaction_code',
-            'student_admission_number', 'student_name', 'amount',
+            'student_admission_number', 'original_admission_number', 'student_name', 'amount',
             'transaction_date', 'status', 'error_message',
             'matched_fee', 'matched_fee_details', 'uploaded_by',
             'uploaded_by_name', 'created_at', 'updated_at'
@@ -141,14 +232,9 @@ class PaymentSerializer(serializers.ModelSerializer):
         return None
     
     def get_student_name(self, obj):
-        try:
-            student = Student.objects.get(
-                student_id=obj.student_admission_number,
-                school=obj.school
-            )
-            return f"{student.first_name} {student.last_name}"
-        except Student.DoesNotExist:
-            return None
+        if self.student_names is not None:
+            return self.student_names.get((obj.school_id, obj.student_admission_number))
+        return get_student_names([obj]).get((obj.school_id, obj.student_admission_number))
     
     def get_matched_fee_details(self, obj):
         if obj.matched_fee:
@@ -160,6 +246,31 @@ class PaymentSerializer(serializers.ModelSerializer):
         return None
 
 
+class PaymentAllocationSerializer(serializers.ModelSerializer):
+    """One payment-to-fee split, with enough context for statements"""
+    transaction_code = serializers.CharField(source='payment.transaction_code', read_only=True)
+    transaction_date = serializers.DateTimeField(source='payment.transaction_date', read_only=True)
+    fee_item_name = serializers.CharField(source='student_fee.fee_item.name', read_only=True)
+    academic_year_name = serializers.CharField(source='student_fee.academic_year.name', read_only=True)
+    term = serializers.IntegerField(source='student_fee.term', read_only=True)
+
+    class Meta:
+        model = PaymentAllocation
+        fields = [
+            'id', 'payment', 'transaction_code', 'transaction_date',
+            'student_fee', 'fee_item_name', 'academic_year_name', 'term',
+            'amount', 'created_at'
+        ]
+
+
+class PaymentDetailSerializer(PaymentSerializer):
+    """Single payment with every fee it was applied to"""
+    allocations = PaymentAllocationSerializer(many=True, read_only=True)
+
+    class Meta(PaymentSerializer.Meta):
+        fields = PaymentSerializer.Meta.fields + ['allocations']
+
+
 class PaymentUploadSerializer(serializers.Serializer):
     """Serializer for CSV upload"""
     file = serializers.FileField()
@@ -167,4 +278,37 @@ class PaymentUploadSerializer(serializers.Serializer):
     def validate_file(self, value):
         if not value.name.endswith('.csv'):
             raise serializers.ValidationError("Only CSV files are allowed")
-        return value
\ No newline at end of file
+        return value
+
+
+class UploadJobSerializer(serializers.ModelSerializer):
+    """Progress of a queued CSV upload"""
+    class Meta:
+        model = UploadJob
+        fields = [
+            'id', 'original_filename', 'content_hash', 'status', 'rows_parsed',
+            'rows_created', 'rows_duplicate', 'rows_rejected', 'rows_matched', 'rows_failed', 'errors',
+            'error_message', 'created_at', 'started_at', 'finished_at'
+        ]
+        read_only_fields = fields
+
+
+class StatementJobSerializer(serializers.ModelSerializer):
+    """Progress of a bulk fee statement job, with the zip once it's ready"""
+    # Download link to the authenticated view; media files aren't served
+    archive = serializers.SerializerMethodField()
+    
+    class Meta:
+        model = StatementJob
+        fields = [
+            'id', 'student_class', 'academic_year', 'term', 'status', 'total_students',
+            'rendered_count', 'archive', 'error_message', 'created_at', 'started_at', 'finished_at'
+        ]
+        read_only_fields = fields
+    
+    def get_archive(self, obj):
+        if not obj.archive:
+            return None
+        url = reverse('payments:statement-download', args=[obj.pk])
+        request = self.context.get('request')
+        return request.build_absolute_uri(url) if request else url
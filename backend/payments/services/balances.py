@@ -0,0 +1,190 @@
+from decimal import Decimal
+from django.db.models import (
+    Sum, Count, Q, F, OuterRef, Subquery, Value, Case, When, CharField, DecimalField, IntegerField,
+    FilteredRelation
+)
+from django.db.models.functions import Coalesce
+from academics.models import Student, StudentFee, StudentBalance
+from payments.models import CreditEntry
+from payments.services.dashboard import invalidate_dashboard_stats
+
+# Students recomputed per aggregate + upsert round-trip.
+BALANCE_CHUNK_SIZE = 500
+
+BALANCE_UPDATE_FIELDS = [
+    'school', 'total_owed', 'total_paid', 'outstanding', 'credit',
+    'fee_count', 'unpaid_fee_count', 'payment_status', 'updated_at',
+]
+
+
+def get_payment_status(outstanding, unpaid_fee_count, fee_count):
+    """
+    PAID when nothing is outstanding, UNPAID when no fee has been settled,
+    PARTIAL otherwise.
+    """
+    if outstanding == 0:
+        return 'PAID'
+    elif outstanding > 0:
+        if unpaid_fee_count == fee_count:
+            return 'UNPAID'
+        return 'PARTIAL'
+    return 'UNKNOWN'
+
+
+def _refresh_chunk(student_ids):
+    totals = {
+        row['student_id']: row
+        for row in StudentFee.objects.filter(
+            student_id__in=student_ids
+        ).values('student_id').annotate(
+            total_owed=Sum('fee_item__amount'),
+            total_paid=Sum('amount_paid'),
+            fee_count=Count('id'),
+            unpaid_fee_count=Count('id', filter=Q(is_paid=False)),
+        ).order_by()
+    }
+    credits = dict(
+        CreditEntry.objects.filter(
+            student_id__in=student_ids
+        ).values('student_id').annotate(
+            credit=Sum('amount')
+        ).order_by().values_list('student_id', 'credit')
+    )
+
+    balances = []
+    school_ids = set()
+    for student_id, school_id in Student.objects.filter(
+        pk__in=student_ids
+    ).values_list('pk', 'school_id'):
+        school_ids.add(school_id)
+        row = totals.get(student_id, {})
+        total_owed = row.get('total_owed') or Decimal('0')
+        total_paid = row.get('total_paid') or Decimal('0')
+        outstanding = total_owed - total_paid
+        fee_count = row.get('fee_count', 0)
+        unpaid_fee_count = row.get('unpaid_fee_count', 0)
+
+        balances.append(StudentBalance(
+            student_id=student_id,
+            school_id=school_id,
+            total_owed=total_owed,
+            total_paid=total_paid,
+            outstanding=outstanding,
+            credit=credits.get(student_id) or Decimal('0'),
+            fee_count=fee_count,
+            unpaid_fee_count=unpaid_fee_count,
+            payment_status=get_payment_status(outstanding, unpaid_fee_count, fee_count),
+        ))
+
+    StudentBalance.objects.bulk_create(
+        balances,
+        update_conflicts=True,
+        unique_fields=['student'],
+        update_fields=BALANCE_UPDATE_FIELDS,
+    )
+    invalidate_dashboard_stats(*school_ids)
+
+
+def refresh_student_balances(student_ids):
+    """
+    Recompute StudentBalance rows for the given student pks.
+    Runs one aggregate and one upsert per BALANCE_CHUNK_SIZE students, inside
+    whatever transaction the caller has open.
+    """
+    student_ids = sorted(set(student_ids))
+    for start in range(0, len(student_ids), BALANCE_CHUNK_SIZE):
+        _refresh_chunk(student_ids[start:start + BALANCE_CHUNK_SIZE])
+
+
+def rebuild_student_balances(school=None):
+    """
+    Rebuild StudentBalance from scratch for every student (optionally one school).
+    Returns the number of students processed.
+    """
+    students = Student.objects.all()
+    if school:
+        students = students.filter(school=school)
+
+    student_ids = list(students.values_list('id', flat=True))
+    refresh_student_balances(student_ids)
+    return len(student_ids)
+
+
+def _fee_aggregate(aggregate, output_field, **filters):
+    """Correlated per-student aggregate over StudentFee"""
+    return Subquery(
+        StudentFee.objects.filter(student=OuterRef('pk'), **filters).values('student').annotate(
+            total=aggregate
+        ).values('total'),
+        output_field=output_field
+    )
+
+
+def annotate_student_balances(students):
+    """
+    Annotate a Student queryset with total_fees_owed, total_fees_paid,
+    outstanding_balance, credit_balance, fee_count, unpaid_fee_count and
+    payment_status, so serializers read them off the row and views can
+    filter and order by them.
+
+    Values come from the joined StudentBalance row. For a student whose
+    row hasn't been built yet, COALESCE falls through to correlated
+    aggregates over the fees, which only run for those students.
+    """
+    money = DecimalField(max_digits=12, decimal_places=2)
+    zero = Value(Decimal('0'), output_field=money)
+
+    # Joined on school as well as student, so the tenant's balance rows are
+    # read through the (school, ...) index rather than probed one by one
+    students = students.annotate(
+        school_balance=FilteredRelation('balance', condition=Q(balance__school=F('school'))),
+    ).annotate(
+        total_fees_owed=Coalesce(
+            F('school_balance__total_owed'), _fee_aggregate(Sum('fee_item__amount'), money), zero,
+            output_field=money
+        ),
+        total_fees_paid=Coalesce(
+            F('school_balance__total_paid'), _fee_aggregate(Sum('amount_paid'), money), zero,
+            output_field=money
+        ),
+        credit_balance=Coalesce(
+            F('school_balance__credit'),
+            Subquery(
+                CreditEntry.objects.filter(student=OuterRef('pk')).values('student').annotate(
+                    total=Sum('amount')
+                ).values('total'),
+                output_field=money
+            ),
+            zero,
+            output_field=money
+        ),
+        fee_count=Coalesce(
+            F('school_balance__fee_count'), _fee_aggregate(Count('id'), IntegerField()), Value(0),
+            output_field=IntegerField()
+        ),
+        unpaid_fee_count=Coalesce(
+            F('school_balance__unpaid_fee_count'),
+            _fee_aggregate(Count('id'), IntegerField(), is_paid=False),
+            Value(0),
+            output_field=IntegerField()
+        ),
+    ).annotate(
+        outstanding_balance=Coalesce(
+            F('school_balance__outstanding'), F('total_fees_owed') - F('total_fees_paid'),
+            output_field=money
+        ),
+    )
+
+    # Same rules as get_payment_status
+    return students.annotate(
+        payment_status=Coalesce(
+            F('school_balance__payment_status'),
+            Case(
+                When(outstanding_balance=0, then=Value('PAID')),
+                When(outstanding_balance__gt=0, unpaid_fee_count=F('fee_count'), then=Value('UNPAID')),
+                When(outstanding_balance__gt=0, then=Value('PARTIAL')),
+                default=Value('UNKNOWN'),
+            ),
+            output_field=CharField()
+        ),
+    )
@@ -0,0 +1,107 @@
+from decimal import Decimal
+from django.db.models import Case, Count, DecimalField, F, IntegerField, Sum, Value, When
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+from payments.models import Payment, DailyCollection
+
+
+def _matched_totals_by_day(school_id):
+    """
+    Sum a school's MATCHED payments per local day.
+    Returns {date: (total_amount, payment_count)}.
+    """
+    payments = Payment.objects.filter(school_id=school_id, status='MATCHED')
+
+    rows = payments.annotate(
+        date=TruncDate('transaction_date')
+    ).values('date').annotate(
+        total_amount=Sum('amount'),
+        payment_count=Count('id'),
+    ).order_by()
+    return {row['date']: (row['total_amount'], row['payment_count']) for row in rows}
+
+
+def _write_days(school_id, totals, days):
+    """Upsert the rollup rows for `days` from `totals`, removing emptied days"""
+    DailyCollection.objects.bulk_create(
+        [
+            DailyCollection(
+                school_id=school_id,
+                date=day,
+                total_amount=totals[day][0],
+                payment_count=totals[day][1],
+            )
+            for day in days if day in totals
+        ],
+        update_conflicts=True,
+        unique_fields=['school', 'date'],
+        update_fields=['total_amount', 'payment_count', 'updated_at'],
+    )
+    emptied = [day for day in days if day not in totals]
+    if emptied:
+        DailyCollection.objects.filter(school_id=school_id, date__in=emptied).delete()
+
+
+def _day_deltas(added, removed):
+    """{(school_id, local day): (amount, count)} for payments entering and leaving MATCHED"""
+    deltas = {}
+    for sign, payments in ((1, added), (-1, removed)):
+        for payment in payments:
+            key = (payment.school_id, timezone.localdate(payment.transaction_date))
+            amount, count = deltas.get(key, (Decimal('0'), 0))
+            deltas[key] = (amount + sign * payment.amount, count + sign)
+    return deltas
+
+
+def adjust_daily_collections(added=(), removed=()):
+    """
+    Move payments into (`added`, newly MATCHED) or out of (`removed`, no
+    longer MATCHED) the rollup by adding per-day deltas to the stored rows.
+
+    Nothing is re-aggregated and no school-wide lock is taken: concurrent
+    reconciliations only meet on the rows for the days they share, and the
+    additions commute. Emptied days are removed.
+    """
+    deltas = _day_deltas(added, removed)
+    if not deltas:
+        return
+
+    # Rows for new days first, in key order so concurrent workers lock alike
+    DailyCollection.objects.bulk_create(
+        [
+            DailyCollection(school_id=school_id, date=day)
+            for (school_id, day), (_, count) in sorted(deltas.items()) if count > 0
+        ],
+        ignore_conflicts=True,
+    )
+
+    days_by_school = {}
+    for (school_id, day), delta in sorted(deltas.items()):
+        days_by_school.setdefault(school_id, {})[day] = delta
+
+    money = DecimalField(max_digits=14, decimal_places=2)
+    for school_id, days in days_by_school.items():
+        DailyCollection.objects.filter(school_id=school_id, date__in=days).update(
+            total_amount=F('total_amount') + Case(
+                *[When(date=day, then=Value(amount, output_field=money)) for day, (amount, _) in days.items()],
+                output_field=money,
+            ),
+            payment_count=F('payment_count') + Case(
+                *[When(date=day, then=Value(count)) for day, (_, count) in days.items()],
+                output_field=IntegerField(),
+            ),
+            updated_at=timezone.now(),
+        )
+        if any(count < 0 for _, count in days.values()):
+            DailyCollection.objects.filter(school_id=school_id, date__in=days, payment_count=0).delete()
+
+
+def backfill_daily_collections(school):
+    """
+    Rebuild the whole rollup for one school from its MATCHED payments.
+    Returns the number of days written.
+    """
+    totals = _matched_totals_by_day(school.pk)
+    DailyCollection.objects.filter(school=school).delete()
+    _write_days(school.pk, totals, totals.keys())
+    return len(totals)
@@ -0,0 +1,103 @@
+from collections import defaultdict
+from decimal import Decimal
+from django.db import transaction
+from django.db.models import Sum
+from payments.models import CreditEntry, PaymentAllocation
+from academics.models import StudentFee
+from payments.services.balances import refresh_student_balances
+from payments.services.reconciliation import _load_open_fees, FEE_UPDATE_FIELDS
+
+
+def _available_credit(student_ids):
+    """{student pk: [[payment pk, school pk, remaining], ...]} oldest payment first"""
+    available = defaultdict(list)
+    rows = CreditEntry.objects.filter(
+        student_id__in=student_ids
+    ).values('student_id', 'payment_id', 'school_id').annotate(
+        remaining=Sum('amount')
+    ).filter(remaining__gt=0).order_by('student_id', 'payment__transaction_date', 'payment_id')
+    for row in rows:
+        available[row['student_id']].append([row['payment_id'], row['school_id'], row['remaining']])
+    return available
+
+
+def apply_student_credits(student_ids):
+    """
+    Spend held credit on the students' open fees, earliest fee first and
+    oldest credit first, in one pass for the whole set: one query for
+    credit, one for open fees (locked), then bulk writes for fees, ledger
+    entries and allocations. Returns the total amount applied.
+    """
+    student_ids = sorted(set(student_ids))
+    if not student_ids:
+        return Decimal('0')
+
+    with transaction.atomic():
+        # Lock the fees first so a concurrent pass can't spend the same credit
+        open_fees = _load_open_fees(student_ids)
+        available = _available_credit([pk for pk in student_ids if open_fees.get(pk)])
+
+        touched_fees = {}
+        entries = []
+        applied = defaultdict(Decimal)  # (payment pk, fee pk) -> amount
+
+        for student_id, credits in available.items():
+            for fee in open_fees[student_id]:
+                while credits and fee.amount_paid < fee.fee_item.amount:
+                    payment_id, school_id, remaining = credits[0]
+                    amount = min(remaining, fee.fee_item.amount - fee.amount_paid)
+
+                    fee.amount_paid += amount
+                    fee.is_paid = fee.amount_paid >= fee.fee_item.amount
+                    touched_fees[fee.pk] = fee
+                    entries.append(CreditEntry(
+                        school_id=school_id,
+                        student_id=student_id,
+                        payment_id=payment_id,
+                        student_fee=fee,
+                        amount=-amount,
+                    ))
+                    applied[(payment_id, fee.pk)] += amount
+
+                    if amount == remaining:
+                        credits.pop(0)
+                    else:
+                        credits[0][2] = remaining - amount
+
+        if not touched_fees:
+            return Decimal('0')
+
+        StudentFee.objects.bulk_update(touched_fees.values(), FEE_UPDATE_FIELDS)
+        CreditEntry.objects.bulk_create(entries)
+        _write_allocations(applied)
+        refresh_student_balances(fee.student_id for fee in touched_fees.values())
+
+    return sum(applied.values(), Decimal('0'))
+
+
+def _write_allocations(applied):
+    """
+    Record credit spending as allocations of the original payment. A
+    payment already allocated to the same fee (a fee that was reopened)
+    has its row topped up instead.
+    """
+    existing = {
+        (allocation.payment_id, allocation.student_fee_id): allocation
+        for allocation in PaymentAllocation.objects.filter(
+            payment_id__in={payment_id for payment_id, _ in applied},
+            student_fee_id__in={fee_id for _, fee_id in applied},
+        )
+    }
+
+    new_rows = []
+    topped_up = []
+    for (payment_id, fee_id), amount in applied.items():
+        allocation = existing.get((payment_id, fee_id))
+        if allocation is None:
+            new_rows.append(PaymentAllocation(payment_id=payment_id, student_fee_id=fee_id, amount=amount))
+        else:
+            allocation.amount += amount
+            topped_up.append(allocation)
+
+    PaymentAllocation.objects.bulk_create(new_rows)
+    PaymentAllocation.objects.bulk_update(topped_up, ['amount'])
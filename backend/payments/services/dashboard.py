@@ -0,0 +1,100 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Sum, Count, Q
+from django.utils import timezone
+from payments.models import Payment
+from academics.models import StudentBalance
+
+
+def _cache_key(school_id):
+    return f'dashboard:stats:{school_id}'
+
+
+def compute_dashboard_stats(school):
+    """
+    Payment, fee and student statistics for the dashboard, straight from the
+    database.
+    """
+    # Payment statistics
+    payment_stats = Payment.objects.filter(school=school).aggregate(
+        total_payments=Count('id'),
+        total_collected=Sum('amount', filter=Q(status='MATCHED')),
+        matched_count=Count('id', filter=Q(status='MATCHED')),
+        failed_count=Count('id', filter=Q(status='FAILED')),
+        unprocessed_count=Count('id', filter=Q(status='UNPROCESSED')),
+    )
+
+    # Fee and student statistics from the per-student balance summary
+    balance_stats = StudentBalance.objects.filter(school=school).aggregate(
+        total_expected=Sum('total_owed'),
+        total_paid=Sum('total_paid'),
+        fee_count=Sum('fee_count'),
+        unpaid_fees_count=Sum('unpaid_fee_count'),
+        total_students=Count('id'),
+        fully_paid=Count('id', filter=Q(payment_status='PAID')),
+        with_balance=Count('id', filter=Q(unpaid_fee_count__gt=0)),
+    )
+
+    total_expected = balance_stats['total_expected'] or 0
+    total_paid = balance_stats['total_paid'] or 0
+    outstanding_balance = total_expected - total_paid
+    unpaid_fees_count = balance_stats['unpaid_fees_count'] or 0
+
+    return {
+        "payments": {
+            "total_count": payment_stats['total_payments'],
+            "total_collected": float(payment_stats['total_collected'] or 0),
+            "matched_count": payment_stats['matched_count'],
+            "failed_count": payment_stats['failed_count'],
+            "unprocessed_count": payment_stats['unprocessed_count'],
+        },
+        "fees": {
+            "total_expected": float(total_expected),
+            "total_paid": float(total_paid),
+            "outstanding_balance": float(outstanding_balance),
+            "collection_rate": round(
+                (total_paid / total_expected * 100) if total_expected else 0,
+                2
+            ),
+            "paid_fees_count": (balance_stats['fee_count'] or 0) - unpaid_fees_count,
+            "unpaid_fees_count": unpaid_fees_count,
+        },
+        "students": {
+            "total_students": balance_stats['total_students'],
+            "fully_paid": balance_stats['fully_paid'],
+            "with_balance": balance_stats['with_balance'],
+        }
+    }
+
+
+def get_dashboard_stats(school):
+    """
+    Cached dashboard statistics for a school.
+    Returns (stats, cache_info) where cache_info says whether this was a hit
+    and when the cached numbers were computed.
+    """
+    key = _cache_key(school.pk if school else None)
+    cached = cache.get(key)
+    if cached is not None:
+        return cached['stats'], {'hit': True, 'generated_at': cached['generated_at']}
+
+    generated_at = timezone.now().isoformat()
+    stats = compute_dashboard_stats(school)
+    cache.set(
+        key,
+        {'stats': stats, 'generated_at': generated_at},
+        settings.DASHBOARD_CACHE_TIMEOUT,
+    )
+    return stats, {'hit': False, 'generated_at': generated_at}
+
+
+def invalidate_dashboard_stats(*school_ids):
+    """
+    Drop cached dashboard statistics for the given schools once the current
+    transaction commits (immediately if there is none), so a concurrent
+    request can't re-cache numbers from before the write.
+    """
+    keys = [_cache_key(school_id) for school_id in set(school_ids)]
+    if keys:
+        transaction.on_commit(lambda: cache.delete_many(keys))
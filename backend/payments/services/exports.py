@@ -0,0 +1,219 @@
+import csv
+import re
+import zipfile
+from datetime import date, datetime
+from decimal import Decimal
+from xml.sax.saxutils import escape
+
+from django.db.models import CharField, OuterRef, Subquery, Value
+from django.db.models.functions import Concat
+from django.utils import timezone
+
+from academics.models import Student
+
+# Rows fetched per round-trip from the server-side cursor.
+EXPORT_CHUNK_SIZE = 2000
+
+# Rows buffered before a piece of the file is handed to the response.
+FLUSH_ROWS = 500
+
+# C0 controls other than tab, newline and carriage return aren't legal in XML 1.0
+XML_ILLEGAL_CHARS = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+PAYMENT_EXPORT_COLUMNS = [
+    ('Transaction Code', 'transaction_code'),
+    ('Transaction Date', 'transaction_date'),
+    ('Admission Number', 'student_admission_number'),
+    ('Student Name', 'student_name'),
+    ('Amount', 'amount'),
+    ('Status', 'status'),
+    ('Message', 'error_message'),
+    ('Uploaded At', 'created_at'),
+]
+
+STUDENT_EXPORT_COLUMNS = [
+    ('Admission Number', 'student_id'),
+    ('First Name', 'first_name'),
+    ('Last Name', 'last_name'),
+    ('Class', 'student_class__name'),
+    ('Total Owed', 'total_fees_owed'),
+    ('Total Paid', 'total_fees_paid'),
+    ('Outstanding', 'outstanding_balance'),
+    ('Credit', 'credit_balance'),
+    ('Payment Status', 'payment_status'),
+]
+
+
+def payment_export_rows(payments):
+    """
+    Stream rows for PAYMENT_EXPORT_COLUMNS from a payment queryset. The
+    student name comes from a correlated subquery, so the whole export is a
+    single query read through a server-side cursor.
+    """
+    student_name = Student.objects.filter(
+        school_id=OuterRef('school_id'),
+        student_id=OuterRef('student_admission_number'),
+    ).annotate(
+        full_name=Concat('first_name', Value(' '), 'last_name', output_field=CharField())
+    ).values('full_name')[:1]
+
+    fields = [field for _, field in PAYMENT_EXPORT_COLUMNS]
+    return payments.annotate(
+        student_name=Subquery(student_name)
+    ).values_list(*fields).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+
+
+def student_export_rows(students):
+    """
+    Stream rows for STUDENT_EXPORT_COLUMNS from a student queryset annotated
+    by annotate_student_balances, so balances match the student list.
+    """
+    fields = [field for _, field in STUDENT_EXPORT_COLUMNS]
+    return students.values_list(*fields).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+
+
+def _cell_text(value):
+    if value is None:
+        return ''
+    if isinstance(value, Decimal):
+        # Every exported decimal is money; computed balances don't always carry the scale
+        return f'{value:.2f}'
+    if isinstance(value, datetime):
+        return timezone.localtime(value).strftime('%Y-%m-%d %H:%M:%S')
+    return str(value)
+
+
+def _csv_cell(value):
+    text = _cell_text(value)
+    # Account values are typed by payers; don't let a spreadsheet run them as formulas
+    if isinstance(value, str) and text[:1] in ('=', '+', '-', '@'):
+        return "'" + text
+    return text
+
+
+class _Pipe:
+    """Write-only file object whose contents are drained by the generator"""
+
+    def __init__(self):
+        self.parts = []
+        self.position = 0
+
+    def write(self, data):
+        self.parts.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self.parts)
+        self.parts = []
+        return data
+
+
+def stream_csv(columns, rows):
+    """Yield a CSV file (UTF-8 with BOM, for Excel) a few hundred rows at a time"""
+    class Buffer:
+        def write(self, value):
+            return value
+
+    writer = csv.writer(Buffer())
+    yield ('\ufeff' + writer.writerow([header for header, _ in columns])).encode()
+
+    pending = []
+    for row in rows:
+        pending.append(writer.writerow([_csv_cell(value) for value in row]))
+        if len(pending) >= FLUSH_ROWS:
+            yield ''.join(pending).encode()
+            pending = []
+    if pending:
+        yield ''.join(pending).encode()
+
+
+XLSX_CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/xl/workbook.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+    '<Override PartName="/xl/worksheets/sheet1.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+    '</Types>'
+)
+
+XLSX_ROOT_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+    'Target="xl/workbook.xml"/>'
+    '</Relationships>'
+)
+
+XLSX_WORKBOOK = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+    'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+    '<sheets><sheet name="{name}" sheetId="1" r:id="rId1"/></sheets>'
+    '</workbook>'
+)
+
+XLSX_WORKBOOK_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+    'Target="worksheets/sheet1.xml"/>'
+    '</Relationships>'
+)
+
+
+def _xlsx_row(values):
+    cells = []
+    for value in values:
+        if isinstance(value, (int, float, Decimal)) and not isinstance(value, bool):
+            cells.append(f'<c t="n"><v>{_cell_text(value)}</v></c>')
+        else:
+            if isinstance(value, date) and not isinstance(value, datetime):
+                value = value.isoformat()
+            text = XML_ILLEGAL_CHARS.sub('', _cell_text(value))
+            cells.append(f'<c t="inlineStr"><is><t>{escape(text)}</t></is></c>')
+    return '<row>' + ''.join(cells) + '</row>'
+
+
+def stream_xlsx(columns, rows, sheet_name='Sheet1'):
+    """
+    Yield a single-sheet XLSX workbook as it is written. The sheet XML is
+    deflated straight into the zip stream with inline strings, so no shared
+    string table or temp file is needed and memory stays flat.
+    """
+    pipe = _Pipe()
+    with zipfile.ZipFile(pipe, 'w', compression=zipfile.ZIP_DEFLATED) as workbook:
+        workbook.writestr('[Content_Types].xml', XLSX_CONTENT_TYPES)
+        workbook.writestr('_rels/.rels', XLSX_ROOT_RELS)
+        workbook.writestr('xl/workbook.xml', XLSX_WORKBOOK.format(name=escape(sheet_name)))
+        workbook.writestr('xl/_rels/workbook.xml.rels', XLSX_WORKBOOK_RELS)
+        yield pipe.drain()
+
+        with workbook.open('xl/worksheets/sheet1.xml', 'w', force_zip64=True) as sheet:
+            sheet.write((
+                '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+                '<sheetData>' + _xlsx_row([header for header, _ in columns])
+            ).encode())
+
+            pending = []
+            for row in rows:
+                pending.append(_xlsx_row(row))
+                if len(pending) >= FLUSH_ROWS:
+                    sheet.write(''.join(pending).encode())
+                    pending = []
+                    yield pipe.drain()
+            sheet.write((''.join(pending) + '</sheetData></worksheet>').encode())
+
+    yield pipe.drain()
@@ -0,0 +1,92 @@
+from decimal import Decimal
+from django.db import transaction
+from academics.models import FeeStructure, Student, StudentFee
+from payments.services.balances import refresh_student_balances
+from payments.services.credits import apply_student_credits
+from payments.services.dashboard import invalidate_dashboard_stats
+from payments.services.reconciliation import retry_failed_payments
+
+# StudentFee rows per INSERT statement.
+ASSIGN_BATCH_SIZE = 2000
+
+# Students per credit / retry pass after the fees are in.
+SETTLE_CHUNK_SIZE = 1000
+
+
+def assign_fees(school, academic_year, term=None, student_class=None, reconcile=False):
+    """
+    Bill every student for the fee items their class's FeeStructure lists
+    for `academic_year` (one term, or every term with a structure).
+
+    Rows are built in memory from two queries and written with bulk_create.
+    Fees a student already has are skipped up front, and ignore_conflicts on
+    StudentFee's unique_together covers rows a concurrent run inserted in
+    between, so running this twice is harmless.
+
+    bulk_create bypasses the StudentFee post_save signal, so what the signal
+    does for a single fee happens here: balances are refreshed and held
+    credit is spent on the new fees. With `reconcile`, FAILED payments for
+    the billed students are retried as well.
+    """
+    structures = FeeStructure.objects.filter(school=school, academic_year=academic_year)
+    if term:
+        structures = structures.filter(term=term)
+    if student_class:
+        structures = structures.filter(student_class=student_class)
+
+    items_by_class = {}
+    for class_id, fee_item_id, structure_term in structures.values_list(
+        'student_class_id', 'fee_item_id', 'term'
+    ):
+        items_by_class.setdefault(class_id, []).append((fee_item_id, structure_term))
+
+    students = Student.objects.filter(school=school, student_class_id__in=list(items_by_class))
+    student_fees = StudentFee.objects.filter(academic_year=academic_year, student__in=students.values('pk'))
+    existing = set(student_fees.values_list('student_id', 'fee_item_id', 'term'))
+    students = list(students.values_list('id', 'student_class_id', 'student_id').order_by('id'))
+
+    new_fees = []
+    skipped = 0
+    billed = {}
+    for student_pk, class_id, admission_number in students:
+        for fee_item_id, fee_term in items_by_class[class_id]:
+            if (student_pk, fee_item_id, fee_term) in existing:
+                skipped += 1
+                continue
+            new_fees.append(StudentFee(
+                student_id=student_pk,
+                fee_item_id=fee_item_id,
+                academic_year=academic_year,
+                term=fee_term,
+            ))
+            billed[student_pk] = admission_number
+
+    with transaction.atomic():
+        # ignore_conflicts doesn't say which rows went in, so count them
+        before = student_fees.count() if new_fees else 0
+        StudentFee.objects.bulk_create(new_fees, batch_size=ASSIGN_BATCH_SIZE, ignore_conflicts=True)
+        created = student_fees.count() - before if new_fees else 0
+        refresh_student_balances(billed)
+        invalidate_dashboard_stats(school.pk)
+
+    result = {
+        'students': len(students),
+        'created': created,
+        'skipped': skipped + len(new_fees) - created,
+        'students_billed': len(billed),
+        'credit_applied': Decimal('0'),
+    }
+    if reconcile:
+        result['reconciliation'] = {'total': 0, 'matched': 0, 'failed': 0}
+
+    student_pks = sorted(billed)
+    for start in range(0, len(student_pks), SETTLE_CHUNK_SIZE):
+        chunk = student_pks[start:start + SETTLE_CHUNK_SIZE]
+        # Held overpayments go first, then any payments that failed for lack of fees
+        result['credit_applied'] += apply_student_credits(chunk)
+        if reconcile:
+            retry = retry_failed_payments(school, [billed[pk] for pk in chunk])
+            for key in result['reconciliation']:
+                result['reconciliation'][key] += retry[key]
+
+    return result
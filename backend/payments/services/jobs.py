@@ -0,0 +1,154 @@
+import hashlib
+from datetime import timedelta
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from payments.models import UploadJob
+from payments.parsers.mpesa_parser import parse_mpesa_csv
+from payments.services.reconciliation import parallel_reconcile_payments
+
+
+def hash_file(file):
+    """sha256 hex digest of an uploaded file, read in chunks"""
+    digest = hashlib.sha256()
+    for chunk in file.chunks():
+        digest.update(chunk)
+    return digest.hexdigest()
+
+
+def enqueue_upload_job(file, school, uploaded_by):
+    """
+    Store an uploaded statement and queue it for the worker.
+
+    Returns (job, created). A byte-identical file that this school already
+    uploaded returns the existing job instead, unless that job failed.
+    """
+    content_hash = hash_file(file)
+
+    existing = _active_job(school, content_hash)
+    if existing:
+        return existing, False
+
+    job = UploadJob(
+        school=school,
+        uploaded_by=uploaded_by,
+        file=file,
+        original_filename=file.name,
+        content_hash=content_hash,
+    )
+    try:
+        with transaction.atomic():
+            job.save()
+    except IntegrityError:
+        # A concurrent request queued the same file first (uploadjob_active_file_uniq)
+        job.file.delete(save=False)
+        return _active_job(school, content_hash), False
+    return job, True
+
+
+def _active_job(school, content_hash):
+    return UploadJob.objects.filter(
+        school=school,
+        content_hash=content_hash,
+        status__in=['QUEUED', 'RUNNING', 'COMPLETED'],
+    ).order_by('-created_at').first()
+
+
+def claim_next_job():
+    """
+    Atomically claim the oldest QUEUED job, or return None.
+
+    On Postgres competing workers skip rows another worker has locked. The
+    conditional UPDATE makes the claim safe on SQLite too, where
+    select_for_update is a no-op.
+    """
+    with transaction.atomic():
+        job = UploadJob.objects.select_for_update(skip_locked=True).filter(
+            status='QUEUED'
+        ).order_by('created_at').first()
+
+        if job is None:
+            return None
+
+        now = timezone.now()
+        claimed = UploadJob.objects.filter(pk=job.pk, status='QUEUED').update(
+            status='RUNNING',
+            started_at=now,
+            updated_at=now,
+        )
+
+    if not claimed:
+        return None
+
+    job.status = 'RUNNING'
+    job.started_at = now
+    return job
+
+
+def fail_stale_jobs(minutes):
+    """
+    Mark RUNNING jobs with no progress for `minutes` as FAILED,
+    e.g. after a worker was killed mid-file.
+    """
+    cutoff = timezone.now() - timedelta(minutes=minutes)
+    return UploadJob.objects.filter(status='RUNNING', updated_at__lt=cutoff).update(
+        status='FAILED',
+        error_message='Worker stopped responding',
+        finished_at=timezone.now(),
+    )
+
+
+def _report_progress(job, **counters):
+    UploadJob.objects.filter(pk=job.pk).update(updated_at=timezone.now(), **counters)
+
+
+def run_upload_job(job):
+    """
+    Parse and reconcile a claimed job, reporting progress as it goes.
+    """
+    def on_parsed(summary):
+        _report_progress(
+            job,
+            rows_parsed=summary['parsed'],
+            rows_created=summary['created'],
+            rows_duplicate=summary['duplicates'],
+            rows_rejected=summary['rejected'],
+        )
+
+    def on_reconciled(summary):
+        _report_progress(job, rows_matched=summary['matched'], rows_failed=summary['failed'])
+
+    try:
+        with job.file.open('rb') as file:
+            upload = parse_mpesa_csv(
+                file, job.school, job.uploaded_by, progress=on_parsed, upload_job=job
+            )
+        # Only this file's payments; leftovers from other uploads aren't retried here
+        result = parallel_reconcile_payments(
+            school=job.school, upload_job=job, progress=on_reconciled
+        )
+
+        final = {
+            'rows_parsed': upload['parsed'],
+            'rows_created': upload['created'],
+            'rows_duplicate': upload['duplicates'],
+            'rows_rejected': upload['rejected'],
+            'errors': upload['errors'],
+            'rows_matched': result['matched'],
+            'rows_failed': result['failed'],
+            'status': 'COMPLETED',
+        }
+
+    except Exception as e:
+        final = {
+            'status': 'FAILED',
+            'error_message': f'Failed to process file: {str(e)}',
+        }
+
+    now = timezone.now()
+    # Conditional, so a worker that fail_stale_jobs already gave up on
+    # cannot overwrite FAILED with its late result
+    UploadJob.objects.filter(pk=job.pk, status='RUNNING').update(
+        finished_at=now, updated_at=now, **final
+    )
+    job.refresh_from_db()
+    return job
@@ -0,0 +1,228 @@
+import re
+from collections import defaultdict
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+from payments.models import Payment
+from academics.models import Student
+from payments.services.reconciliation import batch_reconcile_payments
+
+# Suggestions returned per payment.
+SUGGESTION_LIMIT = 3
+
+# Largest edit distance considered a plausible typo.
+MAX_EDIT_DISTANCE = 2
+
+# Default confidence a suggestion needs before auto-match applies it.
+AUTO_MATCH_THRESHOLD = 0.9
+
+NOT_FOUND_PREFIX = 'Student with ID '
+
+_NON_ALNUM = re.compile(r'[^0-9A-Z]')
+_NON_DIGIT = re.compile(r'\D')
+
+
+def normalize_admission_number(value):
+    """'na-2026 0012' -> 'NA20260012'"""
+    return _NON_ALNUM.sub('', (value or '').upper())
+
+
+def _deletions(key):
+    """Yield (variant, position): the key itself, then each one-character deletion"""
+    yield key, None
+    for i in range(len(key)):
+        yield key[:i] + key[i + 1:], i
+
+
+class DeletionIndex:
+    """
+    Symmetric-deletion index over normalized keys (as in SymSpell). Every
+    key is filed under itself and its one-character deletions, and a lookup
+    probes the same variants of the query, so candidates come from a handful
+    of dict probes instead of a scan over the school.
+
+    The edit distance falls out of which variants matched: the same key is
+    0, one key being a deletion of the other is 1, the same position deleted
+    from both is a one-character substitution, and different positions (e.g.
+    swapped digits) is 2.
+    """
+
+    def __init__(self):
+        self.variants = defaultdict(list)
+
+    def add(self, key):
+        for variant, position in _deletions(key):
+            self.variants[variant].append((key, position))
+
+    def search(self, key):
+        """
+        Returns {indexed key: edit distance} for keys that share a variant
+        with `key`: every key within one edit, plus the two-edit keys made
+        by deleting one character from each side, such as swapped neighbours
+        or a deletion and an insertion. Other keys two edits away (e.g. two
+        characters missing) are not found.
+        """
+        distances = {}
+        for variant, position in _deletions(key):
+            for candidate, candidate_position in self.variants.get(variant, ()):
+                if candidate == key:
+                    distance = 0
+                elif position is None or candidate_position is None or position == candidate_position:
+                    distance = 1
+                else:
+                    distance = 2
+                if distance < distances.get(candidate, 3):
+                    distances[candidate] = distance
+        return distances
+
+
+def _index_cache_key(school_id):
+    return f'matching:admission-index:{school_id}'
+
+
+class AdmissionNumberIndex:
+    """
+    Lookup structures over one school's students: normalized key, digits
+    only, and a deletion index for near misses. for_school() keeps the built
+    index in the cache until a student of that school is saved or deleted.
+    """
+
+    def __init__(self, students):
+        self.by_key = defaultdict(list)
+        self.by_digits = defaultdict(list)
+        self.near = DeletionIndex()
+
+        for student in students:
+            key = normalize_admission_number(student['student_id'])
+            self.by_key[key].append(student)
+            digits = _NON_DIGIT.sub('', key)
+            if digits:
+                self.by_digits[digits].append(student)
+        for key in self.by_key:
+            self.near.add(key)
+
+    @classmethod
+    def for_school(cls, school):
+        key = _index_cache_key(school.pk)
+        index = cache.get(key)
+        if index is None:
+            index = cls(Student.objects.filter(school=school).values(
+                'id', 'student_id', 'first_name', 'last_name'
+            ).order_by())
+            cache.set(key, index, settings.ADMISSION_INDEX_CACHE_TIMEOUT)
+        return index
+
+    def suggest(self, account, limit=SUGGESTION_LIMIT):
+        """
+        Ranked candidates for a typed account value. Scores run from 1.0
+        (same characters once separators and case are ignored) down through
+        the digits-only match to edit-distance matches.
+        """
+        key = normalize_admission_number(account)
+        if not key:
+            return []
+
+        candidates = {}
+
+        def offer(student, score, reason):
+            best = candidates.get(student['id'])
+            if best is None or score > best['score']:
+                candidates[student['id']] = {
+                    'student': student['id'],
+                    'student_id': student['student_id'],
+                    'student_name': f"{student['first_name']} {student['last_name']}",
+                    'score': round(score, 3),
+                    'reason': reason,
+                }
+
+        for student in self.by_key.get(key, []):
+            offer(student, 1.0, 'normalized')
+
+        digits = _NON_DIGIT.sub('', key)
+        if digits:
+            for student in self.by_digits.get(digits, []):
+                offer(student, 0.95, 'digits')
+
+        max_distance = min(MAX_EDIT_DISTANCE, len(key) // 4)
+        if max_distance:
+            for near_key, distance in self.near.search(key).items():
+                if not distance or distance > max_distance:
+                    continue
+                score = 0.9 * (1 - distance / max(len(key), len(near_key)))
+                for student in self.by_key[near_key]:
+                    offer(student, score, 'edit_distance')
+
+        ranked = sorted(candidates.values(), key=lambda c: (-c['score'], c['student_id']))
+        return ranked[:limit]
+
+
+def invalidate_admission_index(school_id):
+    """Drop a school's cached index once the current transaction commits"""
+    key = _index_cache_key(school_id)
+    transaction.on_commit(lambda: cache.delete(key))
+
+
+def unmatched_student_payments(school):
+    """FAILED payments whose admission number matched no student"""
+    return Payment.objects.filter(
+        school=school,
+        status='FAILED',
+        error_message__startswith=NOT_FOUND_PREFIX
+    )
+
+
+def suggest_matches(payments, school, index=None, limit=SUGGESTION_LIMIT):
+    """Returns {payment pk: [suggestion, ...]} best first"""
+    index = index or AdmissionNumberIndex.for_school(school)
+    return {
+        payment.pk: index.suggest(payment.student_admission_number, limit)
+        for payment in payments
+    }
+
+
+def auto_match_payments(school, threshold=AUTO_MATCH_THRESHOLD):
+    """
+    Re-point unmatched payments at the student their account value most
+    likely meant, then reconcile them.
+
+    A payment is only corrected when its best suggestion scores at least
+    `threshold` and no other student ties with it. The typed value is kept
+    in `original_admission_number`.
+    """
+    index = AdmissionNumberIndex.for_school(school)
+    corrected = []
+
+    payments = unmatched_student_payments(school).only(
+        'id', 'student_admission_number', 'original_admission_number'
+    )
+    for payment in payments:
+        suggestions = index.suggest(payment.student_admission_number, limit=2)
+        if not suggestions or suggestions[0]['score'] < threshold:
+            continue
+        if len(suggestions) > 1 and suggestions[1]['score'] == suggestions[0]['score']:
+            continue
+
+        if not payment.original_admission_number:
+            payment.original_admission_number = payment.student_admission_number
+        payment.student_admission_number = suggestions[0]['student_id']
+        payment.status = 'UNPROCESSED'
+        payment.error_message = None
+        payment.updated_at = timezone.now()
+        corrected.append(payment)
+
+    Payment.objects.bulk_update(corrected, [
+        'student_admission_number', 'original_admission_number',
+        'status', 'error_message', 'updated_at'
+    ])
+
+    result = batch_reconcile_payments(
+        school=school,
+        admission_numbers={payment.student_admission_number for payment in corrected}
+    ) if corrected else {'matched': 0, 'failed': 0}
+
+    return {
+        'corrected': len(corrected),
+        'matched': result['matched'],
+        'failed': result['failed']
+    }
@@ -1,111 +1,433 @@
+import threading
+import zlib
+from collections import defaultdict
 from decimal import Decimal
-from django.db import transaction
-from payments.models import Payment
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.db import connection, connections, transaction
+from django.utils import timezone
+from payments.models import Payment, PaymentAllocation, CreditEntry
 from academics.models import StudentFee, Student
+from payments.services.balances import refresh_student_balances
+from payments.services.dashboard import invalidate_dashboard_stats
+from payments.services.collections import adjust_daily_collections
 
+# Payments allocated per round of preload queries and bulk writes.
+RECONCILE_CHUNK_SIZE = 500
 
-def reconcile_payment(payment: Payment):
+# Passed as `school` by commands that work across every school. None is
+# refused, so a request whose user has no school can't reach other schools.
+ALL_SCHOOLS = object()
+
+PAYMENT_UPDATE_FIELDS = ['status', 'matched_fee', 'error_message', 'updated_at']
+FEE_UPDATE_FIELDS = ['amount_paid', 'is_paid']
+
+
+def _load_students(payments):
     """
-    Match a payment to student fees with overflow handling.
-    Applies payment across multiple fees if amount exceeds single fee.
+    Preload the students referenced by a chunk of payments.
+    Returns {(school_id, admission_number): Student}.
     """
-    from django.db.models import F
-    
-    # Already processed? Skip
-    if payment.status != 'UNPROCESSED':
-        return
-    
-    # Find student first
-    try:
-        student = Student.objects.get(
-            student_id=payment.student_admission_number,
-            school=payment.school
-        )
-    except Student.DoesNotExist:
-        payment.status = 'FAILED'
-        payment.error_message = f'Student with ID {payment.student_admission_number} not found'
-        payment.save()
-        return
-    
-    # Get unpaid fees in chronological order (earliest first)
-    remaining_amount = payment.amount
-    fees_updated = []
-    
+    students = Student.objects.filter(
+        student_id__in={payment.student_admission_number for payment in payments},
+        school_id__in={payment.school_id for payment in payments},
+    )
+    return {(student.school_id, student.student_id): student for student in students}
+
+
+def _load_open_fees(students, lock=True):
+    """
+    Preload unpaid fees for the given students, locked for the current
+    transaction unless `lock` is False. Returns {student pk: [StudentFee]}
+    earliest first.
+    """
+    open_fees = defaultdict(list)
     student_fees = StudentFee.objects.filter(
-        student=student,
+        student__in=students,
         is_paid=False
     ).select_related('fee_item', 'academic_year').order_by(
-        'academic_year__start_date', 'term'
+        'student_id', 'academic_year__start_date', 'term', 'id'
     )
-    
-    if not student_fees.exists():
+    if lock:
+        student_fees = student_fees.select_for_update(of=('self',))
+    for fee in student_fees:
+        open_fees[fee.student_id].append(fee)
+    return open_fees
+
+
+def _allocate_payment(payment, student, open_fees, touched_fees, allocations):
+    """
+    Apply one payment across a student's unpaid fees in memory.
+    Updates the payment's status fields, records every fee it touched and
+    appends an unsaved PaymentAllocation for each non-zero split.
+    """
+    if student is None:
+        payment.status = 'FAILED'
+        payment.error_message = f'Student with ID {payment.student_admission_number} not found'
+        return
+
+    student_fees = open_fees.get(student.pk)
+    if not student_fees:
         payment.status = 'FAILED'
         payment.error_message = 'No unpaid fees found for this student'
-        payment.save()
         return
-    
-    # Apply payment across fees
-    with transaction.atomic():
-        for fee in student_fees:
-            if remaining_amount <= 0:
-                break
-                
-            amount_owed = fee.fee_item.amount - fee.amount_paid
-            amount_to_apply = min(remaining_amount, amount_owed)
-            
-            fee.amount_paid = F('amount_paid') + amount_to_apply
-            fee.save()
-            
-            # Refresh to get actual value after F() expression
-            fee.refresh_from_db()
-            
-            if fee.amount_paid >= fee.fee_item.amount:
-                fee.is_paid = True
-                fee.save()
-            
-            fees_updated.append(fee)
-            remaining_amount -= amount_to_apply
-        
-        # Update payment status
-        if fees_updated:
-            payment.status = 'MATCHED'
-            payment.matched_fee = fees_updated[0]  # Link to primary fee
-            
-            if remaining_amount > 0:
-                payment.error_message = f'Overpayment of KES {remaining_amount:.2f}. All fees cleared.'
-            else:
-                payment.error_message = None
+
+    remaining_amount = payment.amount
+    fees_updated = []
+
+    for fee in student_fees:
+        if remaining_amount <= 0:
+            break
+
+        amount_owed = fee.fee_item.amount - fee.amount_paid
+        amount_to_apply = min(remaining_amount, amount_owed)
+
+        fee.amount_paid += amount_to_apply
+        if fee.amount_paid >= fee.fee_item.amount:
+            fee.is_paid = True
+
+        touched_fees[fee.pk] = fee
+        fees_updated.append(fee)
+        if amount_to_apply > 0:
+            allocations.append(PaymentAllocation(
+                payment=payment, student_fee=fee, amount=amount_to_apply
+            ))
+        remaining_amount -= amount_to_apply
+
+    # Later payments for this student only see fees that are still open
+    open_fees[student.pk] = [fee for fee in student_fees if not fee.is_paid]
+
+    if fees_updated:
+        payment.status = 'MATCHED'
+        payment.matched_fee = fees_updated[0]  # Link to primary fee
+
+        if remaining_amount > 0:
+            payment.error_message = f'Overpayment of KES {remaining_amount:.2f}. All fees cleared.'
         else:
-            payment.status = 'FAILED'
-            payment.error_message = 'Unable to apply payment'
-        
-        payment.save()
+            payment.error_message = None
+    else:
+        payment.status = 'FAILED'
+        payment.error_message = 'Unable to apply payment'
 
 
-def batch_reconcile_payments(school=None):
+def _overpayment_credit(payment, student, allocations):
     """
-    Process all UNPROCESSED payments.
-    Optional: filter by school.
+    Unsaved CreditEntry holding whatever a MATCHED payment had left after
+    `allocations` (its own splits), or None if it was fully applied.
     """
-    payments = Payment.objects.filter(status='UNPROCESSED')
-    if school:
-        payments = payments.filter(school=school)
-    
-    total = payments.count()
+    if payment.status != 'MATCHED':
+        return None
+    excess = payment.amount - sum((allocation.amount for allocation in allocations), Decimal('0'))
+    if excess <= 0:
+        return None
+    return CreditEntry(
+        school_id=payment.school_id,
+        student=student,
+        payment=payment,
+        amount=excess,
+    )
+
+
+def _claim_payments(payment_ids):
+    """
+    Lock the payments among `payment_ids` that are still UNPROCESSED, in the
+    given order. Rows another transaction is already reconciling are skipped
+    rather than waited on, so no payment is ever applied twice.
+    """
+    claimed = {
+        payment.pk: payment
+        for payment in Payment.objects.select_for_update(
+            skip_locked=True, of=('self',)
+        ).filter(pk__in=payment_ids, status='UNPROCESSED')
+    }
+    return [claimed[pk] for pk in payment_ids if pk in claimed]
+
+
+def _reconcile_chunk(payment_ids):
+    """
+    Claim and reconcile a chunk of payments with a fixed number of queries:
+    one to claim payments, one for students, one for their open fees, one
+    bulk_update each for fees and payments, one bulk_create each for
+    allocations and overpayment credit, one balance refresh, and one
+    daily-collection insert and delta update. Returns the payments that
+    were reconciled.
+    """
+    with transaction.atomic():
+        payments = _claim_payments(payment_ids)
+        if not payments:
+            return []
+
+        students = _load_students(payments)
+        open_fees = _load_open_fees(list(students.values()))
+        touched_fees = {}
+        allocations = []
+        credits = []
+        now = timezone.now()
+
+        for payment in payments:
+            student = students.get((payment.school_id, payment.student_admission_number))
+            first = len(allocations)
+            _allocate_payment(payment, student, open_fees, touched_fees, allocations)
+            credit = _overpayment_credit(payment, student, allocations[first:])
+            if credit:
+                credits.append(credit)
+            payment.updated_at = now
+
+        Payment.objects.bulk_update(payments, PAYMENT_UPDATE_FIELDS)
+        PaymentAllocation.objects.bulk_create(allocations)
+        CreditEntry.objects.bulk_create(credits)
+        if touched_fees:
+            StudentFee.objects.bulk_update(touched_fees.values(), FEE_UPDATE_FIELDS)
+            refresh_student_balances(fee.student_id for fee in touched_fees.values())
+        adjust_daily_collections(added=[payment for payment in payments if payment.status == 'MATCHED'])
+        invalidate_dashboard_stats(*(payment.school_id for payment in payments))
+
+    return payments
+
+
+def _reconcile_ids(payment_ids, progress=None):
+    """Reconcile `payment_ids` chunk by chunk and count the outcomes"""
     matched = 0
     failed = 0
-    
-    for payment in payments:
-        reconcile_payment(payment)
-        payment.refresh_from_db()
-        
-        if payment.status == 'MATCHED':
-            matched += 1
-        elif payment.status == 'FAILED':
-            failed += 1
-    
+
+    for start in range(0, len(payment_ids), RECONCILE_CHUNK_SIZE):
+        for payment in _reconcile_chunk(payment_ids[start:start + RECONCILE_CHUNK_SIZE]):
+            if payment.status == 'MATCHED':
+                matched += 1
+            elif payment.status == 'FAILED':
+                failed += 1
+
+        if progress:
+            progress({'total': len(payment_ids), 'matched': matched, 'failed': failed})
+
+    return matched, failed
+
+
+def reconcile_payment(payment: Payment):
+    """
+    Match a payment to student fees with overflow handling.
+    Applies payment across multiple fees if amount exceeds single fee.
+    """
+    # Already processed? Skip
+    if payment.status != 'UNPROCESSED':
+        return
+
+    if _reconcile_chunk([payment.pk]):
+        payment.refresh_from_db(fields=PAYMENT_UPDATE_FIELDS)
+
+
+def _pending_payments(school=None, upload_job=None, admission_numbers=None):
+    if school is None:
+        # A request without a school must never fall through to every school's payments
+        raise ValueError('No school given; pass ALL_SCHOOLS to process every school')
+    payments = Payment.objects.filter(status='UNPROCESSED')
+    if school is not ALL_SCHOOLS:
+        payments = payments.filter(school=school)
+    if upload_job:
+        payments = payments.filter(upload_job=upload_job)
+    if admission_numbers is not None:
+        payments = payments.filter(student_admission_number__in=admission_numbers)
+    # Keep the default -transaction_date order so allocations match one-by-one processing
+    return payments
+
+
+def batch_reconcile_payments(school=None, progress=None, upload_job=None, admission_numbers=None):
+    """
+    Process all UNPROCESSED payments of `school` (ALL_SCHOOLS for every school).
+    Optional: filter by the upload job that created them or by
+    student admission numbers, and a `progress` callable that receives the
+    running totals after every chunk.
+
+    Pending ids are read in one pass, then payments are allocated in chunks
+    of RECONCILE_CHUNK_SIZE against preloaded students and fees, so the
+    query count grows with the number of chunks rather than payments x fees.
+    """
+    payment_ids = list(_pending_payments(
+        school, upload_job, admission_numbers
+    ).values_list('id', flat=True))
+    matched, failed = _reconcile_ids(payment_ids, progress)
+
+    return {
+        'total': len(payment_ids),
+        'matched': matched,
+        'failed': failed
+    }
+
+
+def _reconcile_shard(payment_ids, progress):
+    try:
+        return _reconcile_ids(payment_ids, progress)
+    finally:
+        # Worker threads get their own connections; don't leak them
+        connections.close_all()
+
+
+def parallel_reconcile_payments(school=None, workers=None, progress=None, upload_job=None,
+                                admission_numbers=None):
+    """
+    Process all UNPROCESSED payments across `workers` threads. Takes the
+    same filters as batch_reconcile_payments.
+
+    Payments are sharded by student so every payment for one student is
+    handled by the same worker, in the same order as batch_reconcile_payments,
+    which keeps allocations identical. Chunks are claimed with
+    SELECT ... FOR UPDATE SKIP LOCKED and each student's fees stay locked
+    until the chunk commits, so running alongside another reconciliation
+    (an upload job, a manual trigger) never applies a payment or a fee twice.
+
+    Falls back to batch_reconcile_payments on databases without SKIP LOCKED
+    (SQLite), when only one worker is requested, or inside a transaction,
+    whose uncommitted rows the worker connections could not see.
+    """
+    if workers is None:
+        workers = settings.RECONCILE_WORKERS
+    if (workers <= 1 or connection.in_atomic_block
+            or not connection.features.has_select_for_update_skip_locked):
+        return batch_reconcile_payments(
+            school=school,
+            progress=progress,
+            upload_job=upload_job,
+            admission_numbers=admission_numbers,
+        )
+
+    pending = list(_pending_payments(school, upload_job, admission_numbers).values_list(
+        'id', 'school_id', 'student_admission_number'
+    ))
+    shards = [[] for _ in range(workers)]
+    for pk, school_id, admission_number in pending:
+        shard = zlib.crc32(f'{school_id}:{admission_number}'.encode()) % workers
+        shards[shard].append(pk)
+
+    totals = {'total': len(pending), 'matched': 0, 'failed': 0}
+    shard_totals = [(0, 0)] * workers
+    lock = threading.Lock()
+
+    def shard_progress(index):
+        def report(summary):
+            with lock:
+                shard_totals[index] = (summary['matched'], summary['failed'])
+                if progress:
+                    progress({
+                        'total': totals['total'],
+                        'matched': sum(matched for matched, _ in shard_totals),
+                        'failed': sum(failed for _, failed in shard_totals),
+                    })
+        return report
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(
+            _reconcile_shard,
+            shards,
+            [shard_progress(index) for index in range(workers)],
+        ))
+
+    for matched, failed in results:
+        totals['matched'] += matched
+        totals['failed'] += failed
+    return totals
+
+
+def _allocation_diff(allocation):
+    """Describe one in-memory allocation, right after its payment was applied"""
+    fee = allocation.student_fee
+    return {
+        'student_fee': fee.pk,
+        'fee_item': fee.fee_item.name,
+        'academic_year': fee.academic_year.name,
+        'term': fee.term,
+        'amount': allocation.amount,
+        'amount_paid_before': fee.amount_paid - allocation.amount,
+        'amount_paid_after': fee.amount_paid,
+        'is_paid': fee.is_paid,
+    }
+
+
+def simulate_reconciliation(school=None, upload_job=None, admission_numbers=None):
+    """
+    Dry run of batch_reconcile_payments: the same allocation, in memory,
+    against a snapshot of StudentFee balances. Nothing is locked or written.
+
+    Fees are loaded once per student and carried across chunks, so later
+    payments see the effect of earlier ones exactly as a real run would.
+    Returns {'summary': {...}, 'payments': [per-payment diff]}.
+    """
+    payment_ids = list(_pending_payments(
+        school, upload_job, admission_numbers
+    ).values_list('id', flat=True))
+
+    students = {}
+    open_fees = {}
+    diffs = []
+    summary = {
+        'total': len(payment_ids),
+        'matched': 0,
+        'failed': 0,
+        'allocated_amount': Decimal('0'),
+        'fees_cleared': 0,
+    }
+
+    for start in range(0, len(payment_ids), RECONCILE_CHUNK_SIZE):
+        chunk_ids = payment_ids[start:start + RECONCILE_CHUNK_SIZE]
+        by_id = Payment.objects.in_bulk(chunk_ids)
+        payments = [by_id[pk] for pk in chunk_ids if pk in by_id]
+
+        new_students = _load_students([
+            payment for payment in payments
+            if (payment.school_id, payment.student_admission_number) not in students
+        ])
+        students.update(new_students)
+        open_fees.update(_load_open_fees(list(new_students.values()), lock=False))
+
+        for payment in payments:
+            student = students.get((payment.school_id, payment.student_admission_number))
+            allocations = []
+            _allocate_payment(payment, student, open_fees, {}, allocations)
+            credit = _overpayment_credit(payment, student, allocations)
+
+            diff = [_allocation_diff(allocation) for allocation in allocations]
+            summary['allocated_amount'] += sum(row['amount'] for row in diff)
+            summary['fees_cleared'] += sum(1 for row in diff if row['is_paid'])
+            if payment.status == 'MATCHED':
+                summary['matched'] += 1
+            elif payment.status == 'FAILED':
+                summary['failed'] += 1
+
+            diffs.append({
+                'payment': payment.pk,
+                'transaction_code': payment.transaction_code,
+                'student_admission_number': payment.student_admission_number,
+                'amount': payment.amount,
+                'status': payment.status,
+                'error_message': payment.error_message,
+                'allocations': diff,
+                'credit': credit.amount if credit else Decimal('0'),
+            })
+
+    return {'summary': summary, 'payments': diffs}
+
+
+def retry_failed_payments(school, admission_numbers):
+    """
+    Re-run the FAILED payments for `admission_numbers`, e.g. after those
+    students or their fees were added. Only the matching payments are
+    touched, so the cost follows the change rather than the school size.
+    """
+    payment_ids = list(Payment.objects.filter(
+        school=school,
+        status='FAILED',
+        student_admission_number__in=admission_numbers
+    ).values_list('id', flat=True))
+
+    if payment_ids:
+        Payment.objects.filter(pk__in=payment_ids, status='FAILED').update(
+            status='UNPROCESSED',
+            error_message=None,
+            updated_at=timezone.now()
+        )
+    matched, failed = _reconcile_ids(payment_ids)
+
     return {
-        'total': total,
+        'total': len(payment_ids),
         'matched': matched,
         'failed': failed
     }
@@ -0,0 +1,106 @@
+from datetime import datetime, time, timedelta
+from django.db import transaction
+from django.db.models import Case, When, Value, F, Sum, OuterRef, Subquery, BooleanField
+from django.utils import timezone
+from payments.models import Payment, PaymentAllocation, CreditEntry
+from academics.models import StudentFee, FeeItem
+from payments.services.balances import refresh_student_balances
+from payments.services.collections import adjust_daily_collections
+from payments.services.dashboard import invalidate_dashboard_stats
+
+REVERSAL_MESSAGE = 'Reversed'
+
+
+def reverse_payments(payments, requeue=False):
+    """
+    Unapply a set of payments from the fees they paid, in one transaction.
+
+    Every step is a set-based statement over the selection: fee credits
+    are rolled back by one UPDATE using a correlated sum of the reversed
+    allocations, is_paid is recomputed by a second UPDATE, and allocations
+    and payments are deleted and updated in bulk. Reversed payments become REVERSED, or UNPROCESSED with `requeue`
+    so the next reconciliation allocates them again (requeue also reopens
+    REVERSED and FAILED payments).
+
+    MATCHED payments from before allocations were recorded can't be rolled
+    back precisely; they are left untouched and counted as `skipped`.
+    Returns counts plus the admission numbers involved, for re-reconciling.
+    """
+    with transaction.atomic():
+        # Requeue also brings REVERSED payments back; a plain reversal skips them
+        selected = payments.exclude(status='UNPROCESSED' if requeue else 'REVERSED')
+
+        locked = list(Payment.objects.select_for_update(of=('self',)).filter(
+            pk__in=selected.values('pk')
+        ).order_by('id').only(
+            'id', 'school_id', 'status', 'amount', 'transaction_date', 'student_admission_number'
+        ))
+        allocated = set(PaymentAllocation.objects.filter(
+            payment_id__in=[p.pk for p in locked]
+        ).values_list('payment_id', flat=True))
+
+        skipped = [p for p in locked if p.status == 'MATCHED' and p.pk not in allocated]
+        reversing = [p for p in locked if not (p.status == 'MATCHED' and p.pk not in allocated)]
+        payment_ids = [p.pk for p in reversing]
+
+        allocations = PaymentAllocation.objects.filter(payment_id__in=payment_ids)
+        fee_ids = list(StudentFee.objects.select_for_update(of=('self',)).filter(
+            pk__in=allocations.values('student_fee')
+        ).order_by('student_id', 'id').values_list('id', flat=True))
+
+        if fee_ids:
+            reversed_amount = allocations.filter(
+                student_fee=OuterRef('pk')
+            ).values('student_fee').annotate(total=Sum('amount')).values('total')
+            fee_amount = FeeItem.objects.filter(pk=OuterRef('fee_item_id')).values('amount')
+
+            fees = StudentFee.objects.filter(pk__in=fee_ids)
+            fees.update(amount_paid=F('amount_paid') - Subquery(reversed_amount))
+            fees.update(is_paid=Case(
+                When(amount_paid__gte=Subquery(fee_amount), then=Value(True)),
+                default=Value(False),
+                output_field=BooleanField(),
+            ))
+
+        allocations.delete()
+        # Overpayment credit (held or already spent via allocations above) goes too
+        CreditEntry.objects.filter(payment_id__in=payment_ids).delete()
+        Payment.objects.filter(pk__in=payment_ids).update(
+            status='UNPROCESSED' if requeue else 'REVERSED',
+            matched_fee=None,
+            error_message=None if requeue else REVERSAL_MESSAGE,
+            updated_at=timezone.now(),
+        )
+
+        refresh_student_balances(
+            StudentFee.objects.filter(pk__in=fee_ids).values_list('student_id', flat=True).distinct()
+        )
+        adjust_daily_collections(removed=[p for p in reversing if p.status == 'MATCHED'])
+        invalidate_dashboard_stats(*{p.school_id for p in locked})
+
+    return {
+        'reversed': len(reversing),
+        'fees_updated': len(fee_ids),
+        'skipped': len(skipped),
+        'admission_numbers': sorted({p.student_admission_number for p in reversing}),
+    }
+
+
+def reverse_payment(payment, requeue=False):
+    """Unapply a single payment"""
+    return reverse_payments(Payment.objects.filter(pk=payment.pk), requeue=requeue)
+
+
+def reverse_upload(upload_job, requeue=False):
+    """Unapply every payment created by one upload"""
+    return reverse_payments(upload_job.payments.all(), requeue=requeue)
+
+
+def reverse_date_range(school, start_date, end_date, requeue=False):
+    """Unapply a school's payments with a transaction date in [start_date, end_date]"""
+    payments = Payment.objects.filter(
+        school=school,
+        transaction_date__gte=timezone.make_aware(datetime.combine(start_date, time.min)),
+        transaction_date__lt=timezone.make_aware(datetime.combine(end_date + timedelta(days=1), time.min)),
+    )
+    return reverse_payments(payments, requeue=requeue)
@@ -0,0 +1,206 @@
+"""
+Text-only PDF rendering for fee statements.
+
+Writes PDF objects directly with the standard Helvetica and Courier fonts,
+so no font files or PDF library are needed. This module has no Django
+imports: process-pool workers only need it and the plain-dict statements
+they are handed.
+"""
+import zlib
+from decimal import Decimal
+
+# A4 in points
+PAGE_WIDTH = 595
+PAGE_HEIGHT = 842
+MARGIN = 50
+LINE_HEIGHT = 14
+
+FONTS = {
+    'F1': 'Helvetica',
+    'F2': 'Helvetica-Bold',
+    'F3': 'Courier',
+}
+
+# Courier glyphs are 0.6 em wide, which lets amounts be right-aligned
+COURIER_WIDTH = 0.6
+
+
+def _pdf_string(value):
+    text = str(value).encode('latin-1', 'replace').decode('latin-1')
+    return text.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+
+
+class PDFDocument:
+    """Pages of positioned text and rules, rendered to bytes in one go"""
+
+    def __init__(self):
+        self.pages = []
+        self.add_page()
+
+    def add_page(self):
+        self.ops = []
+        self.pages.append(self.ops)
+
+    def text(self, x, y, value, size=10, font='F1'):
+        self.ops.append(f'BT /{font} {size} Tf {x:.2f} {y:.2f} Td ({_pdf_string(value)}) Tj ET')
+
+    def amount(self, right, y, value, size=10):
+        """Right-aligned monospaced amount ending at x=right"""
+        text = f'{value:,.2f}'
+        self.text(right - len(text) * size * COURIER_WIDTH, y, text, size=size, font='F3')
+
+    def rule(self, y, x1=MARGIN, x2=PAGE_WIDTH - MARGIN):
+        self.ops.append(f'0.5 w {x1} {y:.2f} m {x2} {y:.2f} l S')
+
+    def render(self):
+        objects = []
+
+        def add(body):
+            objects.append(body)
+            return len(objects)
+
+        catalog = add(None)
+        pages = add(None)
+        fonts = {
+            name: add(f'<< /Type /Font /Subtype /Type1 /BaseFont /{base} /Encoding /WinAnsiEncoding >>'.encode())
+            for name, base in FONTS.items()
+        }
+        font_resources = ' '.join(f'/{name} {number} 0 R' for name, number in fonts.items())
+
+        page_numbers = []
+        for ops in self.pages:
+            content = zlib.compress('\n'.join(ops).encode('latin-1'))
+            stream = add(
+                f'<< /Length {len(content)} /Filter /FlateDecode >>\nstream\n'.encode()
+                + content + b'\nendstream'
+            )
+            page_numbers.append(add((
+                f'<< /Type /Page /Parent {pages} 0 R /MediaBox [0 0 {PAGE_WIDTH} {PAGE_HEIGHT}] '
+                f'/Resources << /Font << {font_resources} >> >> /Contents {stream} 0 R >>'
+            ).encode()))
+
+        objects[catalog - 1] = f'<< /Type /Catalog /Pages {pages} 0 R >>'.encode()
+        kids = ' '.join(f'{number} 0 R' for number in page_numbers)
+        objects[pages - 1] = f'<< /Type /Pages /Kids [{kids}] /Count {len(page_numbers)} >>'.encode()
+
+        output = bytearray(b'%PDF-1.4\n')
+        offsets = []
+        for number, body in enumerate(objects, 1):
+            offsets.append(len(output))
+            output += f'{number} 0 obj\n'.encode() + body + b'\nendobj\n'
+
+        xref = len(output)
+        output += f'xref\n0 {len(objects) + 1}\n0000000000 65535 f \n'.encode()
+        for offset in offsets:
+            output += f'{offset:010d} 00000 n \n'.encode()
+        output += (
+            f'trailer\n<< /Size {len(objects) + 1} /Root {catalog} 0 R >>\n'
+            f'startxref\n{xref}\n%%EOF\n'
+        ).encode()
+        return bytes(output)
+
+
+class _Cursor:
+    """Tracks the baseline and starts a new page when the current one fills up"""
+
+    def __init__(self, document, header):
+        self.document = document
+        self.header = header
+        self.y = PAGE_HEIGHT - MARGIN
+
+    def next_line(self, lines=1):
+        self.y -= LINE_HEIGHT * lines
+        if self.y < MARGIN:
+            self.document.add_page()
+            self.y = PAGE_HEIGHT - MARGIN
+            self.header(self)
+        return self.y
+
+
+# Column positions for the fee table (amount columns are right edges)
+FEE_COLUMNS = {'item': MARGIN, 'period': 230, 'amount': 390, 'paid': 465, 'balance': PAGE_WIDTH - MARGIN}
+
+
+def _fee_header(cursor):
+    document, y = cursor.document, cursor.y
+    document.text(FEE_COLUMNS['item'], y, 'Fee item', font='F2')
+    document.text(FEE_COLUMNS['period'], y, 'Period', font='F2')
+    document.text(FEE_COLUMNS['amount'] - 38, y, 'Billed', font='F2')
+    document.text(FEE_COLUMNS['paid'] - 26, y, 'Paid', font='F2')
+    document.text(FEE_COLUMNS['balance'] - 44, y, 'Balance', font='F2')
+    document.rule(y - 4)
+    cursor.next_line()
+
+
+def _payment_header(cursor):
+    document, y = cursor.document, cursor.y
+    document.text(MARGIN, y, 'Date', font='F2')
+    document.text(200, y, 'M-Pesa receipt', font='F2')
+    document.text(FEE_COLUMNS['balance'] - 44, y, 'Amount', font='F2')
+    document.rule(y - 4)
+    cursor.next_line()
+
+
+def render_statement(statement):
+    """
+    Render one statement dict (see payments.services.statements) to PDF
+    bytes. Returns (archive path, pdf bytes) so pool results can be written
+    straight into the zip.
+    """
+    document = PDFDocument()
+    cursor = _Cursor(document, header=lambda cursor: None)
+
+    document.text(MARGIN, cursor.y, statement['school'], size=16, font='F2')
+    document.text(PAGE_WIDTH - MARGIN - 110, cursor.y, 'FEE STATEMENT', size=12, font='F2')
+    cursor.next_line(2)
+    document.text(MARGIN, cursor.y, f"Student: {statement['name']} ({statement['student_id']})")
+    document.text(330, cursor.y, f"Class: {statement['class_name'] or '-'}")
+    cursor.next_line()
+    document.text(MARGIN, cursor.y, f"Period: {statement['period']}")
+    document.text(330, cursor.y, f"Issued: {statement['issued_on']}")
+    cursor.next_line(2)
+
+    cursor.header = _fee_header
+    _fee_header(cursor)
+    total_owed = total_paid = Decimal('0')
+    for item, period, amount, paid in statement['fees']:
+        y = cursor.y
+        document.text(FEE_COLUMNS['item'], y, item)
+        document.text(FEE_COLUMNS['period'], y, period)
+        document.amount(FEE_COLUMNS['amount'], y, amount)
+        document.amount(FEE_COLUMNS['paid'], y, paid)
+        document.amount(FEE_COLUMNS['balance'], y, amount - paid)
+        total_owed += amount
+        total_paid += paid
+        cursor.next_line()
+    if not statement['fees']:
+        document.text(MARGIN, cursor.y, 'No fees billed for this period.')
+        cursor.next_line()
+
+    cursor.header = lambda cursor: None
+    cursor.next_line()
+    cursor.header = _payment_header
+    _payment_header(cursor)
+    for paid_on, receipt, amount in statement['payments']:
+        y = cursor.y
+        document.text(MARGIN, y, paid_on)
+        document.text(200, y, receipt)
+        document.amount(FEE_COLUMNS['balance'], y, amount)
+        cursor.next_line()
+    if not statement['payments']:
+        document.text(MARGIN, cursor.y, 'No payments received for this period.')
+        cursor.next_line()
+
+    cursor.header = lambda cursor: None
+    cursor.next_line()
+    for label, value in (
+        ('Total billed', total_owed),
+        ('Total paid', total_paid),
+        ('Balance due', total_owed - total_paid),
+        ('Credit held', statement['credit']),
+    ):
+        document.text(330, cursor.y, label, font='F2')
+        document.amount(FEE_COLUMNS['balance'], cursor.y, value)
+        cursor.next_line()
+
+    return statement['path'], document.render()
@@ -0,0 +1,196 @@
+import os
+import tempfile
+import zipfile
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+from django.conf import settings
+from django.core.files import File
+from django.db import transaction
+from django.utils import timezone
+from payments.models import Payment, StatementJob
+from academics.models import Student, StudentFee
+from payments.services.statement_pdf import render_statement
+
+# Statements handed to a pool worker per task; large enough to amortise pickling
+STATEMENT_CHUNK_SIZE = 50
+
+# Rendered statements between progress updates on the job row
+PROGRESS_EVERY = 200
+
+
+def enqueue_statement_job(school, requested_by, student_class=None, academic_year=None, term=None):
+    return StatementJob.objects.create(
+        school=school,
+        requested_by=requested_by,
+        student_class=student_class,
+        academic_year=academic_year,
+        term=term,
+    )
+
+
+def claim_next_statement_job():
+    """Atomically claim the oldest QUEUED statement job, or return None"""
+    with transaction.atomic():
+        job = StatementJob.objects.select_for_update(skip_locked=True).filter(
+            status='QUEUED'
+        ).order_by('created_at').first()
+
+        if job is None:
+            return None
+
+        now = timezone.now()
+        claimed = StatementJob.objects.filter(pk=job.pk, status='QUEUED').update(
+            status='RUNNING',
+            started_at=now,
+            updated_at=now,
+        )
+
+    if not claimed:
+        return None
+
+    job.status = 'RUNNING'
+    job.started_at = now
+    return job
+
+
+def _period_label(job):
+    if job.academic_year_id and job.term:
+        return f'{job.academic_year.name} Term {job.term}'
+    if job.academic_year_id:
+        return job.academic_year.name
+    if job.term:
+        return f'Term {job.term} (all years)'
+    return 'All periods'
+
+
+def load_statement_data(job):
+    """
+    Everything the job's statements need, in three queries: students (with
+    class and held credit), their fees and their MATCHED payments. Returns
+    plain dicts, so they pickle cheaply to pool workers, ordered by class
+    then admission number.
+    """
+    students = Student.objects.filter(school_id=job.school_id)
+    if job.student_class_id:
+        students = students.filter(student_class_id=job.student_class_id)
+
+    fees = StudentFee.objects.filter(student__in=students.values('pk'))
+    if job.academic_year_id:
+        fees = fees.filter(academic_year_id=job.academic_year_id)
+    if job.term:
+        fees = fees.filter(term=job.term)
+
+    fees_by_student = defaultdict(list)
+    for row in fees.values_list(
+        'student_id', 'fee_item__name', 'academic_year__name', 'term', 'fee_item__amount', 'amount_paid'
+    ).order_by('student_id', 'academic_year__start_date', 'term', 'id'):
+        student_id, item, year, term, amount, paid = row
+        fees_by_student[student_id].append((item, f'{year} Term {term}', amount, paid))
+
+    # Payments carry no term, so only an academic year narrows them (by date)
+    payments = Payment.objects.filter(
+        school_id=job.school_id,
+        status='MATCHED',
+        student_admission_number__in=students.values('student_id'),
+    )
+    if job.academic_year_id:
+        year = job.academic_year
+        payments = payments.filter(
+            transaction_date__gte=timezone.make_aware(datetime.combine(year.start_date, time.min)),
+            transaction_date__lt=timezone.make_aware(datetime.combine(year.end_date + timedelta(days=1), time.min)),
+        )
+
+    payments_by_admission = defaultdict(list)
+    for admission_number, paid_at, code, amount in payments.values_list(
+        'student_admission_number', 'transaction_date', 'transaction_code', 'amount'
+    ).order_by('transaction_date', 'id'):
+        payments_by_admission[admission_number].append((
+            timezone.localtime(paid_at).strftime('%Y-%m-%d'), code, amount
+        ))
+
+    school_name = job.school.name
+    period = _period_label(job)
+    issued_on = timezone.localdate().isoformat()
+
+    statements = []
+    for student in students.values(
+        'id', 'student_id', 'first_name', 'last_name', 'student_class__name', 'balance__credit'
+    ).order_by('student_class__name', 'student_id'):
+        class_name = student['student_class__name']
+        statements.append({
+            'path': f"{_safe_name(class_name or 'No class')}/{_safe_name(student['student_id'])}.pdf",
+            'school': school_name,
+            'student_id': student['student_id'],
+            'name': f"{student['first_name']} {student['last_name']}",
+            'class_name': class_name,
+            'period': period,
+            'issued_on': issued_on,
+            'credit': student['balance__credit'] or Decimal('0'),
+            'fees': fees_by_student.get(student['id'], []),
+            'payments': payments_by_admission.get(student['student_id'], []),
+        })
+    return statements
+
+
+def _safe_name(value):
+    return ''.join(c if c.isalnum() or c in '-_.' else '_' for c in value)
+
+
+def _report_progress(job, rendered):
+    StatementJob.objects.filter(pk=job.pk).update(rendered_count=rendered, updated_at=timezone.now())
+
+
+def render_statements(statements, workers=None):
+    """
+    Yield (archive path, pdf bytes) for each statement, in order. With more
+    than one worker the rendering is spread over a process pool; the workers
+    only run statement_pdf, so they never touch the database.
+    """
+    if workers is None:
+        workers = getattr(settings, 'STATEMENT_WORKERS', None) or os.cpu_count() or 1
+    workers = min(workers, max(1, len(statements) // STATEMENT_CHUNK_SIZE))
+
+    if workers <= 1:
+        yield from map(render_statement, statements)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        yield from pool.map(render_statement, statements, chunksize=STATEMENT_CHUNK_SIZE)
+
+
+def generate_statements(job, workers=None):
+    """
+    Build a claimed job's zip of statements (one PDF per student, filed by
+    class) and attach it to the job, reporting progress as it goes.
+    """
+    try:
+        statements = load_statement_data(job)
+        job.total_students = len(statements)
+        StatementJob.objects.filter(pk=job.pk).update(
+            total_students=job.total_students, updated_at=timezone.now()
+        )
+
+        with tempfile.TemporaryFile() as archive:
+            # PDF content streams are already deflated; storing avoids paying twice
+            with zipfile.ZipFile(archive, 'w', compression=zipfile.ZIP_STORED) as bundle:
+                for rendered, (path, pdf) in enumerate(render_statements(statements, workers), 1):
+                    bundle.writestr(path, pdf)
+                    if rendered % PROGRESS_EVERY == 0:
+                        _report_progress(job, rendered)
+
+            archive.seek(0)
+            job.archive.save(f'statements-{job.pk}.zip', File(archive), save=False)
+
+        job.rendered_count = job.total_students
+        job.status = 'COMPLETED'
+
+    except Exception as e:
+        job.refresh_from_db(fields=['rendered_count'])
+        job.status = 'FAILED'
+        job.error_message = f'Failed to generate statements: {str(e)}'
+
+    job.finished_at = timezone.now()
+    job.save()
+    return job
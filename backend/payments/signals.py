@@ -0,0 +1,66 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from academics.models import Student, StudentFee, FeeItem
+from payments.models import Payment
+from payments.services.balances import refresh_student_balances
+from payments.services.dashboard import invalidate_dashboard_stats
+from payments.services.matching import invalidate_admission_index
+from payments.services.reconciliation import retry_failed_payments
+from payments.services.credits import apply_student_credits
+
+
+def schedule_payment_retry(school_id, admission_number):
+    """Retry this student's FAILED payments once the new rows are committed"""
+    transaction.on_commit(lambda: retry_failed_payments(school_id, [admission_number]))
+
+
+@receiver(post_save, sender=Student)
+def student_saved(sender, instance, created, **kwargs):
+    refresh_student_balances([instance.pk])
+    invalidate_admission_index(instance.school_id)
+    if created:
+        schedule_payment_retry(instance.school_id, instance.student_id)
+
+
+@receiver(post_delete, sender=Student)
+def student_deleted(sender, instance, **kwargs):
+    invalidate_dashboard_stats(instance.school_id)
+    invalidate_admission_index(instance.school_id)
+
+
+@receiver(post_save, sender=StudentFee)
+def student_fee_saved(sender, instance, created, **kwargs):
+    refresh_student_balances([instance.student_id])
+    if created:
+        # Held overpayments go first, then any payments that failed for lack of fees
+        student_pk = instance.student_id
+        transaction.on_commit(lambda: apply_student_credits([student_pk]))
+        student = instance.student
+        schedule_payment_retry(student.school_id, student.student_id)
+
+
+@receiver(post_delete, sender=StudentFee)
+def student_fee_deleted(sender, instance, **kwargs):
+    # Wait for commit: when a whole student is being deleted, refreshing here
+    # would re-create the balance row the cascade just removed.
+    student_id = instance.student_id
+    transaction.on_commit(lambda: refresh_student_balances([student_id]))
+
+
+@receiver(post_save, sender=FeeItem)
+def fee_item_saved(sender, instance, created, **kwargs):
+    if created:
+        return
+    # A changed amount moves the totals of everyone billed for this item
+    student_ids = StudentFee.objects.filter(
+        fee_item=instance
+    ).values_list('student_id', flat=True).distinct()
+    refresh_student_balances(list(student_ids))
+
+
+@receiver(post_save, sender=Payment)
+@receiver(post_delete, sender=Payment)
+def payment_changed(sender, instance, **kwargs):
+    invalidate_dashboard_stats(instance.school_id)
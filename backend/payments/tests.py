@@ -1,3 +1,1792 @@
-from django.test import TestCase
+import base64
+import csv
+import io
+import json
+import os
+import tempfile
+import zipfile
+import threading
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from unittest import mock, skipUnless
+from xml.etree import ElementTree
 
-# Create your tests here.
+from django.conf import settings
+from django.db import connection, connections, transaction
+from django.db.migrations.executor import MigrationExecutor
+from django.db.models import F, Sum
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.cache import cache
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from school.models import School
+from school.tenancy import get_school
+from accounts.models import User
+from academics.models import (
+    Class, Student, AcademicYear, FeeItem, StudentFee, StudentBalance, FeeStructure
+)
+from payments.models import Payment, PaymentAllocation, CreditEntry, UploadJob, DailyCollection, StatementJob
+from payments.services.reconciliation import (
+    ALL_SCHOOLS, batch_reconcile_payments, parallel_reconcile_payments, simulate_reconciliation,
+    retry_failed_payments, get_reconciliation_report
+)
+from payments.services.jobs import claim_next_job, fail_stale_jobs, run_upload_job
+from payments.parsers.mpesa_parser import iter_decoded_lines, parse_mpesa_csv
+from payments.services.matching import AdmissionNumberIndex
+from payments.services.reversals import reverse_date_range, reverse_payments, reverse_upload, reverse_payment
+from payments.services.credits import apply_student_credits
+from payments.services.fee_assignment import assign_fees
+from payments.services.balances import rebuild_student_balances
+from payments.renderers import FastJSONRenderer
+from payments.readers import PaymentReader
+from payments.views import PaymentListView, UnmatchedPaymentsView, AuditTrailView, StudentListView
+from payments.services.statements import load_statement_data, render_statements, generate_statements
+
+
+class PaymentFixturesMixin:
+    """Small school with students, term fees and an authenticated API client"""
+
+    def setUp(self):
+        # A private in-memory cache, so cached indexes and stats don't leak between tests
+        caches = override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+        caches.enable()
+        self.addCleanup(caches.disable)
+        cache.clear()
+
+        self.school = School.objects.create(name="Test Academy", paybill_number="123456")
+        self.user = User.objects.create_user(
+            username='bursar', password='bursar123', role='ADMIN', school=self.school
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        # As after the school's first request, so query counts are steady-state
+        get_school(self.school.pk)
+
+        self.student_class = Class.objects.create(name="Form 1A", school=self.school)
+        self.academic_year = AcademicYear.objects.create(
+            name="2026", start_date=date(2026, 1, 6), end_date=date(2026, 11, 30), school=self.school
+        )
+        self.fee_item = FeeItem.objects.create(name="Tuition", amount=Decimal("10000.00"), school=self.school)
+        self.payment_count = 0
+
+    def login_without_school(self):
+        """Authenticate as a user who isn't attached to any school"""
+        user = User.objects.create_user(username='newcomer', password='newcomer123', role='ADMIN')
+        self.client.force_authenticate(user)
+        return user
+
+    def make_students(self, count, start=0):
+        students = []
+        for i in range(start, start + count):
+            student = Student.objects.create(
+                first_name=f"Student{i}",
+                last_name="Test",
+                student_id=f"TA2026{i:04d}",
+                school=self.school,
+                student_class=self.student_class,
+            )
+            for term in (1, 2):
+                StudentFee.objects.create(
+                    student=student, fee_item=self.fee_item,
+                    academic_year=self.academic_year, term=term,
+                )
+            students.append(student)
+        return students
+
+    def make_payment(self, admission_number, amount):
+        self.payment_count += 1
+        return Payment.objects.create(
+            school=self.school,
+            transaction_code=f"TST{self.payment_count:06d}",
+            student_admission_number=admission_number,
+            amount=Decimal(amount),
+            transaction_date=timezone.now(),
+            uploaded_by=self.user,
+        )
+
+
+class MpesaParserTests(PaymentFixturesMixin, TestCase):
+
+    def statement(self, *rows):
+        lines = ["Transaction Date,Amount,Mpesa Receipt No,Account"]
+        lines += [",".join(row) for row in rows]
+        return io.BytesIO(("\n".join(lines) + "\n").encode())
+
+    def test_rejects_amounts_and_values_the_columns_cant_hold(self):
+        when = "2026-02-01 10:00:00"
+        summary = parse_mpesa_csv(self.statement(
+            (when, "5000", "QA00000001", "TA20260001"),
+            (when, "NaN", "QA00000002", "TA20260001"),
+            (when, "Infinity", "QA00000003", "TA20260001"),
+            (when, "1e12", "QA00000004", "TA20260001"),
+            (when, "10.001", "QA00000005", "TA20260001"),
+            (when, "5000", "QA00000006", "X" * 21),
+            (when, "5000", "Q" * 51, "TA20260001"),
+        ), self.school, self.user)
+
+        self.assertEqual((summary['created'], summary['rejected']), (1, 6))
+        self.assertEqual([error['line'] for error in summary['errors']], [3, 4, 5, 6, 7, 8])
+        self.assertEqual(summary['errors'][0]['error'], "Invalid amount 'NaN'")
+        self.assertEqual(summary['errors'][4]['error'], "'Account' is longer than 20 characters")
+        self.assertEqual(list(Payment.objects.values_list('transaction_code', flat=True)), ['QA00000001'])
+
+    def test_counts_rows_lost_to_a_concurrent_upload_as_duplicates(self):
+        when = "2026-02-01 10:00:00"
+        atomic = transaction.atomic
+
+        def concurrent_upload_first():
+            # Another upload saved the same receipt between our check and insert
+            Payment.objects.create(
+                school=self.school, transaction_code="QC00000001", amount=Decimal("5000"),
+                student_admission_number="TA20260001", transaction_date=timezone.now(),
+            )
+            return atomic()
+
+        with mock.patch('payments.parsers.mpesa_parser.transaction', mock.Mock(atomic=concurrent_upload_first)):
+            summary = parse_mpesa_csv(self.statement(
+                (when, "5000", "QC00000001", "TA20260001"),
+                (when, "6000", "QC00000002", "TA20260002"),
+            ), self.school, self.user)
+
+        self.assertEqual((summary['created'], summary['duplicates']), (1, 1))
+        self.assertEqual(Payment.objects.count(), 2)
+
+    def test_lines_survive_read_boundaries(self):
+        text = "Transaction Date,Account\r\n2026-02-01,Wanjik\u0169\r\n2026-02-02,\u00c9l\u00e8ve\n2026-02-03,last"
+        data = ("\ufeff" + text).encode()
+        # Small reads split the BOM, the multi-byte characters and the CRLF pairs
+        for read_size in (1, 2, 3, 5, 7):
+            lines = list(iter_decoded_lines(io.BytesIO(data), read_size=read_size))
+            self.assertEqual("".join(lines), text, read_size)
+            self.assertEqual([line.rstrip("\r\n") for line in lines], text.splitlines(), read_size)
+
+    def test_streams_in_chunks_and_reports_invalid_rows(self):
+        when = "2026-02-01 10:00:00"
+        progress = []
+        with mock.patch('payments.parsers.mpesa_parser.MAX_ERRORS', 3):
+            summary = parse_mpesa_csv(self.statement(
+                (when, '"1,500.00"', "QB00000001", "TA20260001"),
+                (when, "200", "", "TA20260001"),
+                (when, "300", "QB00000003", "TA20260001"),
+                ("01/02/2026", "400", "QB00000004", "TA20260001"),
+                (when, "500", "QB00000005", " "),
+                (when, "600", "QB00000006", "TA20260002"),
+                (when, "abc", "QB00000007", "TA20260002"),
+                (when, "800", "QB00000008", "TA20260002"),
+            ), self.school, self.user, chunk_size=2, progress=lambda s: progress.append(dict(s, errors=None)))
+
+        self.assertEqual(
+            {key: summary[key] for key in ('parsed', 'created', 'duplicates', 'rejected')},
+            {'parsed': 8, 'created': 4, 'duplicates': 0, 'rejected': 4},
+        )
+        # Only MAX_ERRORS are kept, with the file line each came from
+        self.assertEqual(summary['errors'], [
+            {'line': 3, 'error': "Missing 'Mpesa Receipt No'"},
+            {'line': 5, 'error': "Invalid transaction date '01/02/2026'"},
+            {'line': 6, 'error': "Missing 'Account'"},
+        ])
+        # Progress after each full chunk, then once at the end
+        self.assertEqual([p['created'] for p in progress], [2, 4, 4])
+        self.assertEqual(Payment.objects.get(transaction_code="QB00000001").amount, Decimal("1500.00"))
+
+
+class PaymentListQueryCountTests(PaymentFixturesMixin, TestCase):
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries.captured_queries), response.json()
+
+    def test_query_count_does_not_grow_with_page_size(self):
+        students = self.make_students(3)
+        for student in students:
+            self.make_payment(student.student_id, "15000.00")
+        batch_reconcile_payments(school=self.school)
+
+        small, _ = self.count_queries('/api/payments/list/?page_size=3')
+
+        more = self.make_students(27, start=3)
+        for student in more:
+            self.make_payment(student.student_id, "15000.00")
+        self.make_payment("UNKNOWN", "100.00")
+        batch_reconcile_payments(school=self.school)
+
+        for url in ('/api/payments/list/?page_size=200', '/api/payments/audit-trail/?page_size=200'):
+            large, data = self.count_queries(url)
+            self.assertEqual(large, small)
+            self.assertEqual(len(data['results']), 31)
+
+    def test_student_names_and_fee_details(self):
+        student = self.make_students(1)[0]
+        self.make_payment(student.student_id, "5000.00")
+        self.make_payment("UNKNOWN", "100.00")
+        batch_reconcile_payments(school=self.school)
+
+        _, data = self.count_queries('/api/payments/list/')
+        by_account = {row['student_admission_number']: row for row in data['results']}
+
+        self.assertEqual(by_account[student.student_id]['student_name'], "Student0 Test")
+        self.assertEqual(by_account[student.student_id]['matched_fee_details'], {
+            'fee_item': 'Tuition', 'academic_year': '2026', 'term': 1,
+        })
+        self.assertIsNone(by_account['UNKNOWN']['student_name'])
+        self.assertIsNone(by_account['UNKNOWN']['matched_fee_details'])
+
+
+class KeysetPaginationTests(PaymentFixturesMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        # Five payments share one timestamp, so pages split inside a tie
+        tied = timezone.now()
+        for i in range(7):
+            payment = self.make_payment("TA20260001", "100.00")
+            if 1 <= i <= 5:
+                Payment.objects.filter(pk=payment.pk).update(transaction_date=tied)
+        self.expected = list(Payment.objects.order_by('-transaction_date', '-id').values_list('id', flat=True))
+
+    def page(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        return [row['id'] for row in data['results']], data
+
+    def test_pages_cover_ties_once_in_both_directions(self):
+        pages = []
+        url = '/api/payments/list/?pagination=cursor&page_size=2'
+        while url:
+            ids, data = self.page(url)
+            pages.append(ids)
+            url = data['next']
+        self.assertEqual([pk for ids in pages for pk in ids], self.expected)
+        self.assertEqual(len(pages), 4)
+
+        # Walk back from the last page with the `previous` links
+        backwards = []
+        url = data['previous']
+        while url:
+            ids, data = self.page(url)
+            backwards.append(ids)
+            url = data['previous']
+        self.assertEqual(backwards, pages[-2::-1])
+
+    def test_bad_cursors_are_not_found(self):
+        def encode(payload):
+            return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode()
+
+        cursors = [
+            'not-a-cursor',
+            encode({'p': ['2026-13-45T00:00:00', 1], 'r': False}),
+            encode({'p': ['yesterday', 1], 'r': False}),
+            encode({'p': [20260101, 1], 'r': False}),
+            encode({'p': [['2026-01-01T00:00:00'], 1], 'r': False}),
+            encode({'p': ['2026-01-01T00:00:00', True], 'r': False}),
+            encode({'p': ['2026-01-01T00:00:00'], 'r': False}),
+        ]
+        for cursor in cursors:
+            with self.subTest(cursor=cursor):
+                response = self.client.get('/api/payments/list/', {'cursor': cursor})
+                self.assertEqual(response.status_code, 404)
+
+
+class PaymentAllocationTests(PaymentFixturesMixin, TestCase):
+
+    def test_split_payment_records_one_allocation_per_fee(self):
+        student = self.make_students(1)[0]
+        first = self.make_payment(student.student_id, "15000.00")
+        batch_reconcile_payments(school=self.school)
+        second = self.make_payment(student.student_id, "2000.00")
+        batch_reconcile_payments(school=self.school)
+
+        term1, term2 = StudentFee.objects.filter(student=student).order_by('term')
+        self.assertEqual(
+            list(first.allocations.values_list('student_fee', 'amount')),
+            [(term1.pk, Decimal("10000.00")), (term2.pk, Decimal("5000.00"))],
+        )
+        self.assertEqual(
+            list(term2.allocations.order_by('id').values_list('payment', 'amount')),
+            [(first.pk, Decimal("5000.00")), (second.pk, Decimal("2000.00"))],
+        )
+
+        # Allocations always add up to what the fees were credited
+        allocated = PaymentAllocation.objects.aggregate(total=Sum('amount'))['total']
+        self.assertEqual(allocated, term1.amount_paid + term2.amount_paid)
+
+        response = self.client.get(f'/api/payments/{first.pk}/')
+        self.assertEqual(
+            [(row['term'], row['amount']) for row in response.json()['allocations']],
+            [(1, "10000.00"), (2, "5000.00")],
+        )
+
+        response = self.client.get(f'/api/payments/fees/{term2.pk}/allocations/')
+        self.assertEqual(
+            [row['transaction_code'] for row in response.json()['results']],
+            [first.transaction_code, second.transaction_code],
+        )
+
+        response = self.client.get(f'/api/payments/students/{student.pk}/allocations/')
+        self.assertEqual(response.json()['count'], 3)
+
+    def test_overpayment_only_allocates_what_was_owed(self):
+        student = self.make_students(1)[0]
+        payment = self.make_payment(student.student_id, "25000.00")
+        batch_reconcile_payments(school=self.school)
+
+        self.assertEqual(payment.allocations.aggregate(total=Sum('amount'))['total'], Decimal("20000.00"))
+
+
+class BatchReconciliationTests(PaymentFixturesMixin, TestCase):
+    """The set-based engine against the per-payment loop it replaced"""
+
+    def reconcile_one_by_one(self):
+        """The previous batch_reconcile_payments: one payment at a time, newest first"""
+        for payment in Payment.objects.filter(school=self.school, status='UNPROCESSED'):
+            student = Student.objects.filter(
+                student_id=payment.student_admission_number, school=payment.school
+            ).first()
+            if student is None:
+                payment.status = 'FAILED'
+                payment.error_message = f'Student with ID {payment.student_admission_number} not found'
+                payment.save()
+                continue
+            student_fees = StudentFee.objects.filter(student=student, is_paid=False).select_related(
+                'fee_item'
+            ).order_by('academic_year__start_date', 'term')
+            if not student_fees.exists():
+                payment.status = 'FAILED'
+                payment.error_message = 'No unpaid fees found for this student'
+                payment.save()
+                continue
+
+            remaining_amount = payment.amount
+            fees_updated = []
+            for fee in student_fees:
+                if remaining_amount <= 0:
+                    break
+                amount_to_apply = min(remaining_amount, fee.fee_item.amount - fee.amount_paid)
+                fee.amount_paid += amount_to_apply
+                fee.is_paid = fee.amount_paid >= fee.fee_item.amount
+                fee.save()
+                fees_updated.append(fee)
+                remaining_amount -= amount_to_apply
+
+            payment.status = 'MATCHED'
+            payment.matched_fee = fees_updated[0]
+            payment.error_message = (
+                f'Overpayment of KES {remaining_amount:.2f}. All fees cleared.' if remaining_amount > 0 else None
+            )
+            payment.save()
+
+    def outcome(self):
+        return (
+            list(Payment.objects.order_by('id').values_list('status', 'matched_fee', 'error_message')),
+            list(StudentFee.objects.order_by('id').values_list('amount_paid', 'is_paid')),
+        )
+
+    def test_matches_one_by_one_allocation(self):
+        next_year = AcademicYear.objects.create(
+            name="2027", start_date=date(2027, 1, 5), end_date=date(2027, 11, 30), school=self.school
+        )
+        students = self.make_students(4)
+        # Next year's fee is created first but must still be paid last
+        StudentFee.objects.create(student=students[0], fee_item=self.fee_item, academic_year=next_year, term=1)
+        StudentFee.objects.filter(student=students[3]).update(is_paid=True, amount_paid=Decimal("10000.00"))
+        for admission_number, amount in [
+            (students[0].student_id, "4000.00"), (students[0].student_id, "12000.00"),
+            (students[0].student_id, "9000.00"), (students[1].student_id, "25000.00"),
+            (students[2].student_id, "10000.00"), (students[2].student_id, "0.50"),
+            (students[3].student_id, "500.00"), ("NOBODY", "100.00"),
+            (students[1].student_id, "1.00"),
+        ]:
+            self.make_payment(admission_number, amount)
+
+        with transaction.atomic():
+            self.reconcile_one_by_one()
+            expected = self.outcome()
+            transaction.set_rollback(True)
+
+        batch_reconcile_payments(school=self.school)
+        self.assertEqual(self.outcome(), expected)
+        self.assertIn(('FAILED', None, 'No unpaid fees found for this student'), expected[0])
+
+    def test_query_count_does_not_grow_with_the_batch(self):
+        def queries_for(students):
+            for student in students:
+                self.make_payment(student.student_id, "12000.00")
+            self.make_payment("NOBODY", "100.00")
+            with CaptureQueriesContext(connection) as queries:
+                result = batch_reconcile_payments(school=self.school)
+            self.assertEqual(result['failed'], 1)
+            return len(queries)
+
+        small = queries_for(self.make_students(2))
+        self.assertEqual(queries_for(self.make_students(40, start=2)), small)
+
+
+class ReconciliationPreviewTests(PaymentFixturesMixin, TestCase):
+
+    def test_preview_matches_real_run_without_writing(self):
+        students = self.make_students(3)
+        for student in students:
+            self.make_payment(student.student_id, "6000.00")
+            self.make_payment(student.student_id, "12000.00")
+        self.make_payment("UNKNOWN", "100.00")
+
+        response = self.client.get('/api/payments/reconcile/preview/')
+        preview = response.json()
+
+        self.assertEqual(Payment.objects.filter(status='UNPROCESSED').count(), 7)
+        self.assertFalse(PaymentAllocation.objects.exists())
+        self.assertFalse(StudentFee.objects.filter(amount_paid__gt=0).exists())
+
+        batch_reconcile_payments(school=self.school)
+        real = {
+            (allocation.payment_id, allocation.student_fee_id): float(allocation.amount)
+            for allocation in PaymentAllocation.objects.all()
+        }
+        simulated = {
+            (payment['payment'], allocation['student_fee']): allocation['amount']
+            for payment in preview['payments']
+            for allocation in payment['allocations']
+        }
+        self.assertEqual(simulated, real)
+        self.assertEqual(preview['summary']['matched'], 6)
+        self.assertEqual(preview['summary']['failed'], 1)
+        self.assertEqual(preview['summary']['fees_cleared'], 3)
+
+    def test_later_payments_see_earlier_ones(self):
+        student = self.make_students(1)[0]
+        self.make_payment(student.student_id, "4000.00")
+        self.make_payment(student.student_id, "8000.00")
+
+        rows = [
+            [(a['term'], a['amount_paid_before'], a['amount_paid_after']) for a in payment['allocations']]
+            for payment in simulate_reconciliation(school=self.school)['payments']
+        ]
+        # Newest payment first, as in batch_reconcile_payments
+        self.assertEqual(rows, [
+            [(1, Decimal("0.00"), Decimal("8000.00"))],
+            [(1, Decimal("8000.00"), Decimal("10000.00")), (2, Decimal("0.00"), Decimal("2000.00"))],
+        ])
+
+    def test_user_without_school_sees_no_other_school(self):
+        student = self.make_students(1)[0]
+        self.make_payment(student.student_id, "4000.00")
+        self.login_without_school()
+
+        self.assertEqual(self.client.get('/api/payments/reconcile/preview/').status_code, 400)
+        self.assertEqual(self.client.post('/api/payments/reconcile/').status_code, 400)
+        self.assertFalse(Payment.objects.exclude(status='UNPROCESSED').exists())
+        with self.assertRaises(ValueError):
+            simulate_reconciliation(school=None)
+        with self.assertRaises(ValueError):
+            batch_reconcile_payments(school=None)
+
+
+class ReversalTests(PaymentFixturesMixin, TestCase):
+
+    def fee_state(self, student):
+        return list(StudentFee.objects.filter(student=student).order_by('term').values_list(
+            'amount_paid', 'is_paid'
+        ))
+
+    def test_reverse_and_requeue_restore_fee_state(self):
+        student = self.make_students(1)[0]
+        first = self.make_payment(student.student_id, "15000.00")
+        batch_reconcile_payments(school=self.school)
+        second = self.make_payment(student.student_id, "2000.00")
+        batch_reconcile_payments(school=self.school)
+        self.assertEqual(self.fee_state(student), [
+            (Decimal("10000.00"), True), (Decimal("7000.00"), False)
+        ])
+
+        response = self.client.post('/api/payments/reversals/', {'payment': first.pk}, format='json')
+        self.assertEqual(response.json()['summary'], {'reversed': 1, 'fees_updated': 2, 'skipped': 0})
+
+        self.assertEqual(self.fee_state(student), [
+            (Decimal("0.00"), False), (Decimal("2000.00"), False)
+        ])
+        first.refresh_from_db()
+        self.assertEqual((first.status, first.matched_fee_id), ('REVERSED', None))
+        self.assertFalse(first.allocations.exists())
+        self.assertEqual(StudentBalance.objects.get(student=student).total_paid, Decimal("2000.00"))
+        self.assertEqual(DailyCollection.objects.get().total_amount, Decimal("2000.00"))
+
+        # Reversing again is a no-op; requeue + reconcile applies it afresh
+        self.assertEqual(
+            self.client.post('/api/payments/reversals/', {'payment': first.pk}, format='json').json()['summary']['reversed'],
+            0,
+        )
+        response = self.client.post(
+            '/api/payments/reversals/', {'payment': first.pk, 'reconcile': True}, format='json'
+        )
+        self.assertEqual(response.json()['summary']['reconciliation']['matched'], 1)
+        self.assertEqual(self.fee_state(student), [
+            (Decimal("10000.00"), True), (Decimal("7000.00"), False)
+        ])
+
+    def test_reverse_date_range_and_upload(self):
+        students = self.make_students(2)
+        payments = [self.make_payment(student.student_id, "12000.00") for student in students]
+        job = UploadJob.objects.create(
+            school=self.school, uploaded_by=self.user, file='statement.csv',
+            original_filename='statement.csv', content_hash='x', status='COMPLETED',
+        )
+        Payment.objects.filter(pk=payments[1].pk).update(upload_job=job)
+        batch_reconcile_payments(school=self.school)
+        self.assertEqual(reverse_upload(job)['reversed'], 1)
+        self.assertEqual(self.fee_state(students[1]), [(Decimal("0.00"), False), (Decimal("0.00"), False)])
+        self.assertEqual(self.fee_state(students[0]), [
+            (Decimal("10000.00"), True), (Decimal("2000.00"), False)
+        ])
+
+        today = timezone.localdate()
+        result = reverse_date_range(self.school, today, today)
+        self.assertEqual(result['reversed'], 1)
+        self.assertFalse(StudentFee.objects.filter(amount_paid__gt=0).exists())
+        self.assertFalse(PaymentAllocation.objects.exists())
+        self.assertFalse(DailyCollection.objects.exists())
+
+    def test_requires_a_selection(self):
+        response = self.client.post('/api/payments/reversals/', {}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+
+class OverpaymentCreditTests(PaymentFixturesMixin, TestCase):
+
+    def new_term_fee(self, student, term=3):
+        return StudentFee.objects.create(
+            student=student, fee_item=self.fee_item, academic_year=self.academic_year, term=term,
+        )
+
+    def test_overpayment_is_held_and_spent_on_new_fees(self):
+        student = self.make_students(1)[0]
+        payment = self.make_payment(student.student_id, "26000.00")
+        batch_reconcile_payments(school=self.school)
+
+        self.assertEqual(StudentBalance.objects.get(student=student).credit, Decimal("6000.00"))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            fee = self.new_term_fee(student)
+
+        fee.refresh_from_db()
+        self.assertEqual((fee.amount_paid, fee.is_paid), (Decimal("6000.00"), False))
+        self.assertEqual(StudentBalance.objects.get(student=student).credit, Decimal("0.00"))
+        self.assertEqual(
+            payment.allocations.aggregate(total=Sum('amount'))['total'], Decimal("26000.00")
+        )
+
+        # Reversing the payment takes back both its fees and the credit it funded
+        reverse_payment(payment)
+        fee.refresh_from_db()
+        self.assertEqual(fee.amount_paid, Decimal("0.00"))
+        self.assertFalse(CreditEntry.objects.exists())
+
+    def test_one_pass_across_students(self):
+        students = self.make_students(3)
+        for student, amount in zip(students, ("35000.00", "21000.00", "20000.00")):
+            self.make_payment(student.student_id, amount)
+        batch_reconcile_payments(school=self.school)
+
+        # Creating fees inside one transaction; credit is applied explicitly in one pass
+        fees = [self.new_term_fee(student) for student in students]
+        with self.assertNumQueries(12):
+            applied = apply_student_credits([student.pk for student in students])
+
+        self.assertEqual(applied, Decimal("11000.00"))
+        paid = [StudentFee.objects.get(pk=fee.pk).amount_paid for fee in fees]
+        self.assertEqual(paid, [Decimal("10000.00"), Decimal("1000.00"), Decimal("0.00")])
+        self.assertEqual(StudentBalance.objects.get(student=students[0]).credit, Decimal("5000.00"))
+
+    def test_preview_reports_credit(self):
+        student = self.make_students(1)[0]
+        self.make_payment(student.student_id, "20500.00")
+        preview = simulate_reconciliation(school=self.school)
+        self.assertEqual(preview['payments'][0]['credit'], Decimal("500.00"))
+
+
+class ExportTests(PaymentFixturesMixin, TestCase):
+
+    def download(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return response, b''.join(response.streaming_content)
+
+    def test_payment_csv_uses_list_filters(self):
+        student = self.make_students(1)[0]
+        self.make_payment(student.student_id, "5000.00")
+        self.make_payment("=HYPERLINK(1)", "100.00")
+        batch_reconcile_payments(school=self.school)
+
+        response, body = self.download('/api/payments/export/')
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        rows = list(csv.reader(io.StringIO(body.decode('utf-8-sig'))))
+        self.assertEqual(rows[0][:4], ['Transaction Code', 'Transaction Date', 'Admission Number', 'Student Name'])
+        self.assertEqual(len(rows), 3)
+        self.assertIn("'=HYPERLINK(1)", [row[2] for row in rows])
+
+        _, body = self.download('/api/payments/export/?status=MATCHED')
+        rows = list(csv.reader(io.StringIO(body.decode('utf-8-sig'))))
+        self.assertEqual([row[3:6] for row in rows[1:]], [["Student0 Test", "5000.00", "MATCHED"]])
+
+    def test_student_xlsx(self):
+        self.make_students(2)
+        response, body = self.download('/api/payments/students/export/?file_type=xlsx')
+        self.assertIn('.xlsx', response['Content-Disposition'])
+
+        workbook = zipfile.ZipFile(io.BytesIO(body))
+        self.assertIsNone(workbook.testzip())
+        sheet = workbook.read('xl/worksheets/sheet1.xml').decode()
+        self.assertEqual(sheet.count('<row>'), 3)
+        self.assertIn('<t>TA20260001</t>', sheet)
+        self.assertIn('<c t="n"><v>20000.00</v></c>', sheet)
+
+        self.assertEqual(self.client.get('/api/payments/students/export/?file_type=pdf').status_code, 400)
+
+    def test_xlsx_drops_control_characters(self):
+        payment = self.make_payment("TA2026\x1b0001", "100.00")
+        Payment.objects.filter(pk=payment.pk).update(error_message="Bell\x07 and\ttab\x0c")
+
+        _, body = self.download('/api/payments/export/?file_type=xlsx')
+        sheet = zipfile.ZipFile(io.BytesIO(body)).read('xl/worksheets/sheet1.xml')
+        # Would raise on any character XML 1.0 doesn't allow
+        texts = [node.text for node in ElementTree.fromstring(sheet).iter('{http://schemas.openxmlformats.org/spreadsheetml/2006/main}t')]
+        self.assertIn('TA20260001', texts)
+        self.assertIn('Bell and\ttab', texts)
+
+    def test_student_csv_matches_list_balances(self):
+        paid, partial, unbuilt = self.make_students(3)
+        self.make_payment(paid.student_id, "20000.00")
+        self.make_payment(partial.student_id, "12500.00")
+        batch_reconcile_payments(school=self.school)
+        # No StudentBalance row yet: the export must fall back like the list does
+        StudentBalance.objects.filter(student=unbuilt).delete()
+
+        _, body = self.download('/api/payments/students/export/')
+        rows = list(csv.reader(io.StringIO(body.decode('utf-8-sig'))))
+        listed = self.client.get('/api/payments/students/').json()['results']
+        self.assertEqual(
+            [(row[0], float(row[6]), row[8]) for row in rows[1:]],
+            [(s['student_id'], s['outstanding_balance'], s['payment_status']) for s in listed]
+        )
+        self.assertEqual(
+            [row[4:9] for row in rows[1:]],
+            [["20000.00", "20000.00", "0.00", "0.00", "PAID"],
+             ["20000.00", "12500.00", "7500.00", "0.00", "PARTIAL"],
+             ["20000.00", "0.00", "20000.00", "0.00", "UNPAID"]]
+        )
+
+
+class UploadJobTests(PaymentFixturesMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        self.enterContext(self.settings(MEDIA_ROOT=media_root.name))
+
+    def csv_file(self, *rows, name='statement.csv'):
+        lines = ["Transaction Date,Amount,Mpesa Receipt No,Account"]
+        lines += [",".join(row) for row in rows]
+        return SimpleUploadedFile(name, ("\n".join(lines) + "\n").encode(), content_type='text/csv')
+
+    def upload(self, file):
+        return self.client.post('/api/payments/upload/', {'file': file}, format='multipart')
+
+    def test_upload_is_queued_claimed_and_completed(self):
+        student = self.make_students(1)[0]
+        response = self.upload(self.csv_file(
+            ("2026-02-01 10:00:00", "5000", "UP0001", student.student_id),
+            ("2026-02-01 11:00:00", "700", "UP0002", "NOBODY"),
+            ("not a date", "700", "UP0003", "NOBODY"),
+        ))
+        self.assertEqual(response.status_code, 202)
+        job_url = f"/api/payments/upload/jobs/{response.json()['job']['id']}/"
+        self.assertEqual(self.client.get(job_url).json()['status'], 'QUEUED')
+        self.assertFalse(Payment.objects.exists())
+
+        job = claim_next_job()
+        self.assertEqual(job.status, 'RUNNING')
+        self.assertIsNotNone(job.started_at)
+        # A claimed job can't be claimed again
+        self.assertIsNone(claim_next_job())
+
+        run_upload_job(job)
+        data = self.client.get(job_url).json()
+        self.assertEqual(data['status'], 'COMPLETED')
+        self.assertEqual(
+            [data[key] for key in ('rows_parsed', 'rows_created', 'rows_rejected', 'rows_matched', 'rows_failed')],
+            [3, 2, 1, 1, 1]
+        )
+        self.assertEqual(data['errors'], [{'line': 4, 'error': "Invalid transaction date 'not a date'"}])
+        self.assertIsNotNone(data['finished_at'])
+
+        # Jobs are only visible to their own school
+        other = School.objects.create(name="Other Academy")
+        User.objects.filter(pk=self.user.pk).update(school=other)
+        self.user.refresh_from_db()
+        self.client.force_authenticate(self.user)
+        self.assertEqual(self.client.get(job_url).status_code, 404)
+
+    def test_jobs_are_claimed_oldest_first(self):
+        first = self.upload(self.csv_file(("2026-02-01 10:00:00", "5000", "UP0001", "X"))).json()['job']
+        second = self.upload(self.csv_file(("2026-02-01 10:00:00", "5000", "UP0002", "X"))).json()['job']
+        self.assertEqual([claim_next_job().pk, claim_next_job().pk], [first['id'], second['id']])
+        self.assertIsNone(claim_next_job())
+
+    def test_failure_keeps_progress_and_reports_the_error(self):
+        self.upload(self.csv_file(("2026-02-01 10:00:00", "5000", "UP0001", "NOBODY")))
+        job = claim_next_job()
+        with mock.patch('payments.services.jobs.parallel_reconcile_payments', side_effect=RuntimeError("boom")):
+            job = run_upload_job(job)
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'FAILED')
+        self.assertEqual(job.error_message, 'Failed to process file: boom')
+        self.assertEqual((job.rows_parsed, job.rows_created), (1, 1))
+        self.assertIsNotNone(job.finished_at)
+
+    def test_identical_file_returns_the_earlier_job(self):
+        rows = [("2026-02-01 10:00:00", "5000", "UP0001", "NOBODY")]
+        first = self.upload(self.csv_file(*rows))
+        again = self.upload(self.csv_file(*rows, name='renamed.csv'))
+        self.assertEqual((again.status_code, again.json()['cached']), (200, True))
+        self.assertEqual(again.json()['job']['id'], first.json()['job']['id'])
+        self.assertEqual(UploadJob.objects.count(), 1)
+
+        # A failed job doesn't block uploading the same file again
+        UploadJob.objects.update(status='FAILED')
+        retry = self.upload(self.csv_file(*rows))
+        self.assertEqual((retry.status_code, retry.json()['cached']), (202, False))
+
+        # Another school uploading the same bytes gets its own job
+        other = School.objects.create(name="Other Academy")
+        User.objects.filter(pk=self.user.pk).update(school=other)
+        self.user.refresh_from_db()
+        self.client.force_authenticate(self.user)
+        self.assertEqual(self.upload(self.csv_file(*rows)).status_code, 202)
+
+    def test_overlapping_statement_counts_duplicates(self):
+        when = "2026-02-01 10:00:00"
+        self.upload(self.csv_file((when, "100", "UP0001", "X"), (when, "200", "UP0002", "X")))
+        run_upload_job(claim_next_job())
+
+        self.upload(self.csv_file(
+            (when, "200", "UP0002", "X"), (when, "300", "UP0003", "X"), (when, "300", "UP0003", "X"),
+        ))
+        job = run_upload_job(claim_next_job())
+        self.assertEqual((job.rows_parsed, job.rows_created, job.rows_duplicate), (3, 1, 2))
+        self.assertEqual(Payment.objects.count(), 3)
+        self.assertEqual(job.payments.get().transaction_code, "UP0003")
+
+    def test_stale_running_jobs_are_failed(self):
+        self.upload(self.csv_file(("2026-02-01 10:00:00", "5000", "UP0001", "X")))
+        self.upload(self.csv_file(("2026-02-01 10:00:00", "5000", "UP0002", "X")))
+        stale, fresh = claim_next_job(), claim_next_job()
+        UploadJob.objects.filter(pk=stale.pk).update(updated_at=timezone.now() - timedelta(minutes=31))
+
+        self.assertEqual(fail_stale_jobs(30), 1)
+        stale.refresh_from_db()
+        fresh.refresh_from_db()
+        self.assertEqual((stale.status, stale.error_message), ('FAILED', 'Worker stopped responding'))
+        self.assertEqual(fresh.status, 'RUNNING')
+
+
+    def test_late_worker_cannot_overwrite_a_failed_job(self):
+        self.upload(self.csv_file(("2026-02-01 10:00:00", "5000", "UP0001", "X")))
+        job = claim_next_job()
+
+        def stall_then_finish(**kwargs):
+            # The worker stalls long enough for another to give up on it
+            UploadJob.objects.filter(pk=job.pk).update(updated_at=timezone.now() - timedelta(minutes=31))
+            fail_stale_jobs(30)
+            return {'total': 1, 'matched': 0, 'failed': 1}
+
+        with mock.patch('payments.services.jobs.parallel_reconcile_payments', side_effect=stall_then_finish):
+            job = run_upload_job(job)
+
+        self.assertEqual((job.status, job.error_message), ('FAILED', 'Worker stopped responding'))
+        self.assertEqual(job.rows_matched, 0)
+
+    def test_concurrent_identical_uploads_share_one_job(self):
+        rows = [("2026-02-01 10:00:00", "5000", "UP0001", "NOBODY")]
+        first = self.upload(self.csv_file(*rows)).json()['job']
+
+        # The second request checked before the first job was saved
+        earlier = UploadJob.objects.get()
+        with mock.patch('payments.services.jobs._active_job', side_effect=[None, earlier]):
+            again = self.upload(self.csv_file(*rows))
+
+        self.assertEqual((again.status_code, again.json()['job']['id']), (200, first['id']))
+        self.assertEqual(UploadJob.objects.count(), 1)
+        # The losing request's copy of the file is removed
+        stored = [name for _, _, names in os.walk(settings.MEDIA_ROOT) for name in names]
+        self.assertEqual(len(stored), 1)
+
+
+class IncrementalReconciliationTests(PaymentFixturesMixin, TestCase):
+
+    def test_upload_job_only_reconciles_its_own_payments(self):
+        student = self.make_students(1)[0]
+        leftover = self.make_payment(student.student_id, "1000.00")
+
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        self.enterContext(self.settings(MEDIA_ROOT=media_root.name))
+
+        job = UploadJob.objects.create(
+            school=self.school,
+            uploaded_by=self.user,
+            file=SimpleUploadedFile('statement.csv', (
+                "Transaction Date,Amount,Mpesa Receipt No,Account\n"
+                f"2026-02-01 10:00:00,5000,JOB0001,{student.student_id}\n"
+                "2026-02-01 11:00:00,700,JOB0002,NOBODY\n"
+            ).encode()),
+            original_filename='statement.csv',
+            content_hash='x',
+            status='RUNNING',
+        )
+        job = run_upload_job(job)
+
+        self.assertEqual((job.rows_created, job.rows_matched, job.rows_failed), (2, 1, 1))
+        self.assertEqual(set(job.payments.values_list('transaction_code', flat=True)), {'JOB0001', 'JOB0002'})
+        leftover.refresh_from_db()
+        self.assertEqual(leftover.status, 'UNPROCESSED')
+
+    def test_new_student_and_fee_retry_failed_payments(self):
+        self.make_payment("TA20260007", "3000.00")
+        other = self.make_payment("TA20260099", "3000.00")
+        batch_reconcile_payments(school=self.school)
+        self.assertEqual(Payment.objects.filter(status='FAILED').count(), 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            student = Student.objects.create(
+                first_name="Late", last_name="Joiner", student_id="TA20260007",
+                school=self.school, student_class=self.student_class,
+            )
+        payment = Payment.objects.get(student_admission_number="TA20260007")
+        self.assertEqual(payment.status, 'FAILED')
+        self.assertEqual(payment.error_message, 'No unpaid fees found for this student')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            fee = StudentFee.objects.create(
+                student=student, fee_item=self.fee_item, academic_year=self.academic_year, term=1,
+            )
+        payment.refresh_from_db()
+        fee.refresh_from_db()
+        self.assertEqual((payment.status, payment.matched_fee_id), ('MATCHED', fee.pk))
+        self.assertEqual(fee.amount_paid, Decimal("3000.00"))
+
+        # Payments for other admission numbers are left alone
+        other.refresh_from_db()
+        self.assertEqual(other.status, 'FAILED')
+
+
+class FuzzyMatchingTests(PaymentFixturesMixin, TestCase):
+
+    def test_index_ranks_normalized_digits_and_typos(self):
+        index = AdmissionNumberIndex([
+            {'id': 1, 'student_id': 'NA20260012', 'first_name': 'Amani', 'last_name': 'Otieno'},
+            {'id': 2, 'student_id': 'NA20260013', 'first_name': 'Baraka', 'last_name': 'Kamau'},
+            {'id': 3, 'student_id': 'KB20260012', 'first_name': 'Chebet', 'last_name': 'Rotich'},
+        ])
+
+        self.assertEqual(index.suggest('na2026 0012')[0]['student'], 1)
+        self.assertEqual(index.suggest('NA-20260012')[0]['score'], 1.0)
+
+        # Digits alone fit two schools' prefixes equally well
+        digits_only = index.suggest('20260012')
+        self.assertEqual([s['student'] for s in digits_only[:2]], [3, 1])
+        self.assertEqual(digits_only[0]['score'], digits_only[1]['score'])
+
+        # Transposed digits are two edits away, a wrong last digit one
+        self.assertEqual(index.suggest('NA20260021')[0]['student'], 1)
+        self.assertEqual(
+            [(s['student'], s['reason']) for s in index.suggest('NA20260014')][:2],
+            [(1, 'edit_distance'), (2, 'edit_distance')],
+        )
+        self.assertEqual(index.suggest('???'), [])
+
+    def test_index_is_cached_until_a_student_changes(self):
+        student = self.make_students(1)[0]
+        AdmissionNumberIndex.for_school(self.school)
+        with self.assertNumQueries(0):
+            index = AdmissionNumberIndex.for_school(self.school)
+        self.assertEqual(index.suggest(student.student_id)[0]['student'], student.pk)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            student.student_id = "KB20260099"
+            student.save()
+        index = AdmissionNumberIndex.for_school(self.school)
+        self.assertEqual(index.suggest("KB20260099")[0]['student'], student.pk)
+        self.assertEqual(index.suggest("TA20260000"), [])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            student.delete()
+        self.assertEqual(AdmissionNumberIndex.for_school(self.school).suggest("KB20260099"), [])
+
+    def test_user_without_school_is_refused(self):
+        self.login_without_school()
+        self.assertEqual(self.client.get('/api/payments/unmatched/suggestions/').status_code, 400)
+        self.assertEqual(self.client.post('/api/payments/unmatched/auto-match/', {}, format='json').status_code, 400)
+
+    def test_suggestions_and_auto_match(self):
+        student, other = self.make_students(2)
+        typed = self.make_payment(student.student_id.lower()[:6] + " " + student.student_id[6:], "4000.00")
+        typo = self.make_payment(other.student_id[:-1] + "9", "4000.00")
+        batch_reconcile_payments(school=self.school)
+
+        response = self.client.get('/api/payments/unmatched/suggestions/')
+        rows = {row['id']: row for row in response.json()['results']}
+        self.assertEqual(rows[typed.pk]['suggestions'][0]['student_id'], student.student_id)
+        self.assertEqual(rows[typo.pk]['suggestions'][0]['reason'], 'edit_distance')
+
+        response = self.client.post('/api/payments/unmatched/auto-match/', {}, format='json')
+        self.assertEqual(response.json()['summary'], {'corrected': 1, 'matched': 1, 'failed': 0})
+
+        typed.refresh_from_db()
+        self.assertEqual(typed.status, 'MATCHED')
+        self.assertEqual(typed.student_admission_number, student.student_id)
+        self.assertEqual(typed.original_admission_number, "ta2026 0000")
+
+        # A one-character typo scores below the default threshold
+        typo.refresh_from_db()
+        self.assertEqual(typo.status, 'FAILED')
+
+        response = self.client.post('/api/payments/unmatched/auto-match/', {'threshold': 'x'}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+
+class FeeAssignmentTests(PaymentFixturesMixin, TestCase):
+
+    def add_structure(self, term, student_class=None, fee_item=None):
+        return FeeStructure.objects.create(
+            school=self.school, academic_year=self.academic_year, term=term,
+            student_class=student_class or self.student_class, fee_item=fee_item or self.fee_item,
+        )
+
+    def test_bills_each_class_once_and_skips_existing_fees(self):
+        # make_students already bills Tuition for terms 1 and 2
+        students = self.make_students(3)
+        lunch = FeeItem.objects.create(name="Lunch", amount=Decimal("3000.00"), school=self.school)
+        other_class = Class.objects.create(name="Form 2B", school=self.school)
+        Student.objects.create(
+            first_name="Other", last_name="Class", student_id="TB20260001",
+            school=self.school, student_class=other_class,
+        )
+        for term in (1, 2, 3):
+            self.add_structure(term)
+        self.add_structure(3, fee_item=lunch)
+
+        result = assign_fees(self.school, self.academic_year)
+
+        self.assertEqual((result['students'], result['created'], result['skipped']), (3, 6, 6))
+        self.assertEqual(StudentFee.objects.filter(term=3).count(), 6)
+        self.assertEqual(StudentBalance.objects.get(student=students[0]).total_owed, Decimal("33000.00"))
+
+        again = assign_fees(self.school, self.academic_year, term=3)
+        self.assertEqual((again['created'], again['skipped']), (0, 6))
+
+    def test_spends_held_credit_without_reconcile(self):
+        holder = self.make_students(1)[0]
+        self.make_payment(holder.student_id, "24000.00")
+        batch_reconcile_payments(school=self.school)
+
+        self.add_structure(3)
+        result = assign_fees(self.school, self.academic_year, term=3)
+
+        self.assertEqual(result['credit_applied'], Decimal("4000.00"))
+        self.assertNotIn('reconciliation', result)
+        self.assertEqual(StudentBalance.objects.get(student=holder).credit, Decimal("0.00"))
+        self.assertEqual(StudentFee.objects.get(student=holder, term=3).amount_paid, Decimal("4000.00"))
+
+    def test_counts_only_rows_actually_inserted(self):
+        students = self.make_students(2)
+        self.add_structure(3)
+        atomic = transaction.atomic
+
+        def concurrent_run_first():
+            # Another run billed the first student between our check and insert
+            StudentFee.objects.create(
+                student=students[0], fee_item=self.fee_item, academic_year=self.academic_year, term=3
+            )
+            return atomic()
+
+        with mock.patch('payments.services.fee_assignment.transaction', mock.Mock(atomic=concurrent_run_first)):
+            result = assign_fees(self.school, self.academic_year, term=3)
+
+        self.assertEqual((result['created'], result['skipped']), (1, 1))
+        self.assertEqual(StudentFee.objects.filter(term=3).count(), 2)
+
+    def test_reconcile_spends_credit_and_retries_failed_payments(self):
+        holder = self.make_students(1)[0]
+        self.make_payment(holder.student_id, "24000.00")
+        newcomer = Student.objects.create(
+            first_name="No", last_name="Fees", student_id="TA20269000",
+            school=self.school, student_class=self.student_class,
+        )
+        waiting = self.make_payment(newcomer.student_id, "4000.00")
+        batch_reconcile_payments(school=self.school)
+        waiting.refresh_from_db()
+        self.assertEqual(waiting.status, 'FAILED')
+
+        self.add_structure(3)
+        result = assign_fees(self.school, self.academic_year, term=3, reconcile=True)
+
+        self.assertEqual(result['credit_applied'], Decimal("4000.00"))
+        self.assertEqual(result['reconciliation']['matched'], 1)
+        waiting.refresh_from_db()
+        self.assertEqual(waiting.status, 'MATCHED')
+        self.assertEqual(StudentBalance.objects.get(student=holder).credit, Decimal("0.00"))
+        self.assertEqual(
+            StudentFee.objects.get(student=holder, term=3).amount_paid, Decimal("4000.00")
+        )
+
+    def test_fee_structure_and_assign_api(self):
+        self.make_students(2)
+        response = self.client.post('/api/payments/fee-structures/', {
+            'academic_year': self.academic_year.pk, 'term': 3,
+            'student_class': self.student_class.pk, 'fee_item': self.fee_item.pk,
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['class_name'], "Form 1A")
+
+        foreign = School.objects.create(name="Other School")
+        foreign_item = FeeItem.objects.create(name="Tuition", amount=Decimal("1.00"), school=foreign)
+        response = self.client.post('/api/payments/fee-structures/', {
+            'academic_year': self.academic_year.pk, 'term': 3,
+            'student_class': self.student_class.pk, 'fee_item': foreign_item.pk,
+        }, format='json')
+        self.assertEqual(response.status_code, 400)
+
+        response = self.client.post('/api/payments/fees/assign/', {
+            'academic_year': self.academic_year.pk, 'term': 3
+        }, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['summary']['created'], 2)
+
+        loner = User.objects.create_user(username='loner', password='loner123', role='ADMIN')
+        self.client.force_authenticate(loner)
+        response = self.client.post('/api/payments/fee-structures/', {
+            'academic_year': self.academic_year.pk, 'term': 2,
+            'student_class': self.student_class.pk, 'fee_item': self.fee_item.pk,
+        }, format='json')
+        self.assertEqual(response.status_code, 400)
+
+
+class StudentListTests(PaymentFixturesMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.students = self.make_students(3)
+        # Fully paid, one of two fees paid, nothing paid
+        for student, amount in zip(self.students, ("20000.00", "10000.00")):
+            self.make_payment(student.student_id, amount)
+        batch_reconcile_payments(school=self.school)
+
+    def statuses(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return [(row['student_id'], row['payment_status']) for row in response.json()['results']]
+
+    def test_payment_status_filter_uses_whole_balance(self):
+        paid, partial, unpaid = (s.student_id for s in self.students)
+        self.assertEqual(self.statuses('/api/payments/students/?payment_status=PAID'), [(paid, 'PAID')])
+        self.assertEqual(self.statuses('/api/payments/students/?payment_status=PARTIAL'), [(partial, 'PARTIAL')])
+        self.assertEqual(self.statuses('/api/payments/students/?payment_status=UNPAID'), [(unpaid, 'UNPAID')])
+        self.assertEqual(
+            self.statuses('/api/payments/students/?ordering=-outstanding_balance'),
+            [(unpaid, 'UNPAID'), (partial, 'PARTIAL'), (paid, 'PAID')]
+        )
+        response = self.client.get('/api/payments/students/?payment_status=SOME')
+        self.assertEqual(response.status_code, 400)
+
+    def test_query_count_does_not_grow_with_students(self):
+        with CaptureQueriesContext(connection) as small:
+            self.client.get('/api/payments/students/')
+        self.make_students(10, start=3)
+        with CaptureQueriesContext(connection) as large:
+            response = self.client.get('/api/payments/students/')
+        self.assertEqual(response.json()['count'], 13)
+        self.assertEqual(len(large.captured_queries), len(small.captured_queries))
+
+    def test_falls_back_to_fees_without_a_balance_row(self):
+        partial = self.students[1]
+        StudentBalance.objects.filter(student=partial).delete()
+
+        self.assertEqual(
+            self.statuses('/api/payments/students/?payment_status=PARTIAL'),
+            [(partial.student_id, 'PARTIAL')]
+        )
+        data = self.client.get(f'/api/payments/students/{partial.pk}/').json()
+        self.assertEqual(
+            (data['total_fees_owed'], data['total_fees_paid'], data['outstanding_balance']),
+            (20000.0, 10000.0, 10000.0)
+        )
+
+
+class FastReadPathTests(PaymentFixturesMixin, TestCase):
+    """The values() readers and orjson renderer must give byte-for-byte serializer output"""
+
+    def setUp(self):
+        super().setUp()
+        students = self.make_students(3)
+        self.make_payment(students[0].student_id, "15000.50")
+        self.make_payment(students[1].student_id, "2500.00")
+        self.make_payment("TA2026O001", "100.00")
+        payment = self.make_payment("NOBODY", "7.25")
+        payment.uploaded_by = None
+        payment.save()
+        batch_reconcile_payments(school=self.school)
+        self.user.first_name, self.user.last_name = "Jane", "Bursar"
+        self.user.save()
+
+    def assertSameAsSerializer(self, view, url):
+        fast = self.client.get(url)
+        with mock.patch.object(view, 'fast_read', False):
+            slow = self.client.get(url)
+        self.assertEqual(fast.status_code, 200)
+        self.assertEqual(fast.content, slow.content)
+        return fast.json()
+
+    def test_payment_lists_match_serializer(self):
+        data = self.assertSameAsSerializer(PaymentListView, '/api/payments/list/')
+        self.assertEqual(len(data['results']), 4)
+        self.assertSameAsSerializer(PaymentListView, '/api/payments/list/?ordering=amount&status=MATCHED')
+        data = self.assertSameAsSerializer(PaymentListView, '/api/payments/list/?pagination=cursor&page_size=2')
+        self.assertSameAsSerializer(PaymentListView, data['next'])
+        self.assertSameAsSerializer(UnmatchedPaymentsView, '/api/payments/unmatched/')
+        self.assertSameAsSerializer(AuditTrailView, '/api/payments/audit-trail/?pagination=cursor')
+
+    def test_student_list_matches_serializer(self):
+        data = self.assertSameAsSerializer(StudentListView, '/api/payments/students/?ordering=-outstanding_balance')
+        self.assertEqual(data['results'][0]['outstanding_balance'], 20000.0)
+        self.assertSameAsSerializer(StudentListView, '/api/payments/students/?payment_status=PARTIAL')
+
+    def test_rows_follow_the_request_timezone(self):
+        reader = PaymentReader()
+        rows = list(reader.values(Payment.objects.order_by('id')))
+        nairobi = reader.map_rows(rows)
+        with timezone.override('UTC'):
+            utc = reader.map_rows(rows)
+        self.assertTrue(nairobi[0]['transaction_date'].endswith('+03:00'))
+        self.assertTrue(utc[0]['transaction_date'].endswith('Z'))
+
+    def test_renderer_matches_drf(self):
+        data = {
+            'amount': Decimal("10.50"), 'when': timezone.now(), 'day': date(2026, 3, 1),
+            'name': "Wanjik\u0169 \u2028", 'rows': [{'id': 1, 'ok': True, 'none': None}],
+        }
+        self.assertEqual(FastJSONRenderer().render(data), JSONRenderer().render(data))
+
+
+class ClassBalancesTests(PaymentFixturesMixin, TestCase):
+    url = '/api/payments/dashboard/class-balances/'
+
+    def setUp(self):
+        super().setUp()
+        self.first, self.second = self.make_students(2)
+        self.other_class = Class.objects.create(name="Form 2B", school=self.school)
+        self.third = self.make_students(1, start=2)[0]
+        Student.objects.filter(pk=self.third.pk).update(student_class=self.other_class)
+        Class.objects.create(name="Form 4 (empty)", school=self.school)
+        self.activity = FeeItem.objects.create(name="Activity", amount=Decimal("1500.00"), school=self.school)
+        self.next_year = AcademicYear.objects.create(
+            name="2027", start_date=date(2027, 1, 5), end_date=date(2027, 11, 30), school=self.school
+        )
+        StudentFee.objects.create(
+            student=self.first, fee_item=self.activity, academic_year=self.next_year, term=1,
+            amount_paid=Decimal("500.00"),
+        )
+        StudentFee.objects.filter(student=self.second, term=1, fee_item=self.fee_item).update(
+            amount_paid=Decimal("4000.00")
+        )
+
+    def balances(self, query=''):
+        response = self.client.get(self.url + query)
+        self.assertEqual(response.status_code, 200)
+        return {
+            row['name']: (
+                row['student_count'], row['total_expected'], row['total_paid'],
+                [(item['name'], item['outstanding_balance']) for item in row['fee_items']],
+            )
+            for row in response.json()
+        }
+
+    def test_breakdown_per_class_and_fee_item(self):
+        self.assertEqual(self.balances(), {
+            "Form 1A": (2, 41500.0, 4500.0, [("Activity", 1000.0), ("Tuition", 36000.0)]),
+            "Form 2B": (1, 20000.0, 0.0, [("Tuition", 20000.0)]),
+            "Form 4 (empty)": (0, 0.0, 0.0, []),
+        })
+
+    def test_year_and_term_filters(self):
+        self.assertEqual(
+            self.balances(f'?academic_year={self.next_year.pk}')["Form 1A"],
+            (2, 1500.0, 500.0, [("Activity", 1000.0)]),
+        )
+        self.assertEqual(
+            self.balances(f'?academic_year={self.academic_year.pk}&term=1')["Form 1A"],
+            (2, 20000.0, 4000.0, [("Tuition", 16000.0)]),
+        )
+        self.assertEqual(self.client.get(self.url + '?term=4').status_code, 400)
+        self.assertEqual(self.client.get(self.url + '?academic_year=x').status_code, 400)
+
+    def test_query_count_does_not_grow_with_classes(self):
+        with CaptureQueriesContext(connection) as few:
+            self.client.get(self.url)
+        for i in range(5):
+            student_class = Class.objects.create(name=f"Form 3{i}", school=self.school)
+            student = self.make_students(1, start=10 + i)[0]
+            Student.objects.filter(pk=student.pk).update(student_class=student_class)
+        with CaptureQueriesContext(connection) as many:
+            self.assertEqual(len(self.client.get(self.url).json()), 8)
+        self.assertEqual(len(many), len(few))
+        # Every class's fee totals come from one grouped aggregate
+        self.assertEqual(sum('academics_studentfee' in query['sql'] for query in many.captured_queries), 1)
+
+
+class DashboardCacheTests(PaymentFixturesMixin, TestCase):
+    url = '/api/payments/dashboard/stats/'
+
+    def stats(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        return response['X-Cache'], response.json()
+
+    def test_second_request_is_served_from_cache(self):
+        self.make_students(1)
+        self.assertEqual(self.stats()[0], 'MISS')
+        with self.assertNumQueries(0):
+            cache_status, data = self.stats()
+        self.assertEqual(cache_status, 'HIT')
+        self.assertEqual(data['fees']['total_expected'], 20000.0)
+        self.assertTrue(data['cache']['hit'])
+
+    def test_payment_writes_invalidate_the_cache(self):
+        student = self.make_students(1)[0]
+        self.stats()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.make_payment(student.student_id, "12000.00")
+        cache_status, data = self.stats()
+        self.assertEqual((cache_status, data['payments']['unprocessed_count']), ('MISS', 1))
+
+        self.stats()
+        with self.captureOnCommitCallbacks(execute=True):
+            batch_reconcile_payments(school=self.school)
+        cache_status, data = self.stats()
+        self.assertEqual(cache_status, 'MISS')
+        self.assertEqual((data['payments']['total_collected'], data['fees']['total_paid']), (12000.0, 12000.0))
+
+    def test_fee_writes_invalidate_the_cache(self):
+        student = self.make_students(1)[0]
+        self.stats()
+        with self.captureOnCommitCallbacks(execute=True):
+            StudentFee.objects.create(
+                student=student, fee_item=self.fee_item, academic_year=self.academic_year, term=3,
+            )
+        cache_status, data = self.stats()
+        self.assertEqual((cache_status, data['fees']['total_expected']), ('MISS', 30000.0))
+
+        self.stats()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.fee_item.amount = Decimal("12000.00")
+            self.fee_item.save()
+        cache_status, data = self.stats()
+        self.assertEqual((cache_status, data['fees']['total_expected']), ('MISS', 36000.0))
+
+    def test_cache_is_per_school(self):
+        self.make_students(1)
+        self.stats()
+        other = School.objects.create(name="Other Academy")
+        User.objects.filter(pk=self.user.pk).update(school=other)
+        self.user.refresh_from_db()
+        self.client.force_authenticate(self.user)
+        cache_status, data = self.stats()
+        self.assertEqual((cache_status, data['fees']['total_expected']), ('MISS', 0.0))
+
+
+class CollectionTrendsTests(PaymentFixturesMixin, TestCase):
+    url = '/api/payments/dashboard/trends/'
+
+    def setUp(self):
+        super().setUp()
+        students = self.make_students(2)
+        # Mon 2 Feb, Wed 4 Feb, Mon 9 Feb and Thu 5 Mar, local time
+        for day, amount in ((2, "1000.00"), (2, "500.00"), (4, "2000.00"), (9, "3000.00"), (33, "4000.00")):
+            payment = self.make_payment(students[0].student_id, amount)
+            payment.transaction_date = timezone.make_aware(datetime(2026, 2, 1, 8, 0)) + timedelta(days=day - 1)
+            payment.save()
+        failed = self.make_payment("NOBODY", "999.00")
+        failed.transaction_date = timezone.make_aware(datetime(2026, 2, 2, 9, 0))
+        failed.save()
+        batch_reconcile_payments(school=self.school)
+
+    def trends(self, query):
+        response = self.client.get(self.url + query)
+        self.assertEqual(response.status_code, 200)
+        return [(row['date'], row['total_amount'], row['payment_count']) for row in response.json()['collections']]
+
+    def test_daily_totals_only_count_matched_payments(self):
+        rows = self.trends('')
+        self.assertEqual(rows[:2], [("2026-02-02", 1500.00, 2), ("2026-02-04", 2000.00, 1)])
+        self.assertEqual(len(rows), 4)
+        # The original response key is kept for day granularity
+        self.assertEqual(len(self.client.get(self.url).json()['daily_collections']), 4)
+
+    def test_week_and_month_granularity(self):
+        self.assertEqual(self.trends('?granularity=week'), [
+            ("2026-02-02", 3500.00, 3), ("2026-02-09", 3000.00, 1), ("2026-03-02", 4000.00, 1),
+        ])
+        self.assertEqual(self.trends('?granularity=month'), [
+            ("2026-02-01", 6500.00, 4), ("2026-03-01", 4000.00, 1),
+        ])
+        self.assertNotIn('daily_collections', self.client.get(self.url + '?granularity=month').json())
+
+    def test_date_range_is_inclusive(self):
+        self.assertEqual(self.trends('?start_date=2026-02-04&end_date=2026-02-09'), [
+            ("2026-02-04", 2000.00, 1), ("2026-02-09", 3000.00, 1),
+        ])
+        self.assertEqual(self.trends('?start_date=2026-02-03&granularity=month'), [
+            ("2026-02-01", 5000.00, 2), ("2026-03-01", 4000.00, 1),
+        ])
+
+    def test_rollup_moves_by_per_day_deltas(self):
+        student = self.make_students(1, start=5)[0]
+        # A day between the two below, whose rollup row must not be rewritten
+        DailyCollection.objects.filter(date=date(2026, 2, 9)).update(total_amount=Decimal("1.00"))
+        for day in (datetime(2025, 1, 15, 9, 0), datetime(2027, 6, 1, 9, 0), datetime(2026, 2, 4, 9, 0)):
+            payment = self.make_payment(student.student_id, "100.00")
+            payment.transaction_date = timezone.make_aware(day)
+            payment.save()
+        with CaptureQueriesContext(connection) as queries:
+            batch_reconcile_payments(school=self.school)
+
+        # No re-aggregation over payments and no school-wide lock
+        sql = [q['sql'] for q in queries.captured_queries]
+        self.assertFalse([q for q in sql if 'SUM(' in q and 'FROM "payments_payment"' in q])
+        self.assertFalse([q for q in sql if 'FROM "school_school"' in q and 'FOR' in q])
+
+        def rollup():
+            return list(DailyCollection.objects.filter(school=self.school).values_list(
+                'date', 'total_amount', 'payment_count'
+            ))
+
+        self.assertEqual(rollup(), [
+            (date(2025, 1, 15), Decimal("100.00"), 1), (date(2026, 2, 2), Decimal("1500.00"), 2),
+            (date(2026, 2, 4), Decimal("2100.00"), 2), (date(2026, 2, 9), Decimal("1.00"), 1),
+            (date(2026, 3, 5), Decimal("4000.00"), 1), (date(2027, 6, 1), Decimal("100.00"), 1),
+        ])
+
+        reverse_payments(Payment.objects.filter(transaction_date__year__in=(2025, 2026), amount=Decimal("100.00")))
+        self.assertEqual(rollup(), [
+            (date(2026, 2, 2), Decimal("1500.00"), 2), (date(2026, 2, 4), Decimal("2000.00"), 1),
+            (date(2026, 2, 9), Decimal("1.00"), 1), (date(2026, 3, 5), Decimal("4000.00"), 1),
+            (date(2027, 6, 1), Decimal("100.00"), 1),
+        ])
+
+    def test_rejects_bad_parameters(self):
+        for query in ('?granularity=year', '?start_date=04/02/2026', '?end_date=2026-02-30'):
+            self.assertEqual(self.client.get(self.url + query).status_code, 400, query)
+
+
+class StatementTests(PaymentFixturesMixin, TestCase):
+
+    def make_job(self, **scope):
+        job = StatementJob.objects.create(school=self.school, requested_by=self.user, **scope)
+        return StatementJob.objects.select_related('school', 'student_class', 'academic_year').get(pk=job.pk)
+
+    def test_user_without_school_cannot_queue_statements(self):
+        self.login_without_school()
+        self.assertEqual(self.client.post('/api/payments/statements/', {}, format='json').status_code, 400)
+        self.assertFalse(StatementJob.objects.exists())
+
+    def test_statement_data_loads_in_three_queries(self):
+        students = self.make_students(3)
+        self.make_payment(students[0].student_id, "12000.00")
+        batch_reconcile_payments(school=self.school)
+        other_class = Class.objects.create(name="Form 2B", school=self.school)
+        Student.objects.create(
+            first_name="Other", last_name="Class", student_id="TB20260001",
+            school=self.school, student_class=other_class,
+        )
+
+        job = self.make_job(student_class=self.student_class, academic_year=self.academic_year, term=1)
+        with self.assertNumQueries(3):
+            statements = load_statement_data(job)
+
+        self.assertEqual([s['student_id'] for s in statements], [s.student_id for s in students])
+        first = statements[0]
+        self.assertEqual(first['path'], f'Form_1A/{students[0].student_id}.pdf')
+        self.assertEqual(first['period'], '2026 Term 1')
+        self.assertEqual(first['fees'], [('Tuition', '2026 Term 1', Decimal('10000.00'), Decimal('10000.00'))])
+        self.assertEqual([p[2] for p in first['payments']], [Decimal('12000.00')])
+        self.assertEqual(statements[1]['payments'], [])
+
+    def test_generate_statements_writes_a_zip_of_pdfs(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        self.enterContext(self.settings(MEDIA_ROOT=media_root.name))
+
+        students = self.make_students(2)
+        job = self.make_job()
+        job.status = 'RUNNING'
+        job = generate_statements(job, workers=1)
+
+        self.assertEqual(job.status, 'COMPLETED', job.error_message)
+        self.assertEqual((job.total_students, job.rendered_count), (2, 2))
+        with job.archive.open('rb') as archive, zipfile.ZipFile(archive) as bundle:
+            self.assertEqual(
+                sorted(bundle.namelist()),
+                [f'Form_1A/{student.student_id}.pdf' for student in students]
+            )
+            pdf = bundle.read(f'Form_1A/{students[0].student_id}.pdf')
+        self.assertTrue(pdf.startswith(b'%PDF-1.4'))
+        self.assertTrue(pdf.rstrip().endswith(b'%%EOF'))
+
+        # The zip is only reachable through the authenticated, school-scoped view
+        response = self.client.get(f'/api/payments/statements/{job.pk}/')
+        self.assertEqual(response.data['archive'], f'http://testserver/api/payments/statements/{job.pk}/download/')
+        response = self.client.get(response.data['archive'])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/zip')
+        with zipfile.ZipFile(io.BytesIO(b''.join(response.streaming_content))) as bundle:
+            self.assertEqual(len(bundle.namelist()), 2)
+
+        outsider = User.objects.create_user(
+            username='outsider', password='outsider123', role='ADMIN',
+            school=School.objects.create(name="Other School")
+        )
+        self.client.force_authenticate(outsider)
+        self.assertEqual(self.client.get(f'/api/payments/statements/{job.pk}/download/').status_code, 404)
+
+    def test_process_pool_renders_in_order(self):
+        statements = [{
+            'path': f'Form_1A/S{i:04d}.pdf', 'school': 'Test Academy', 'student_id': f'S{i:04d}',
+            'name': 'Pool Student', 'class_name': 'Form 1A', 'period': 'All periods',
+            'issued_on': '2026-04-01', 'credit': Decimal('0'),
+            # Enough rows to spill onto a second page
+            'fees': [('Tuition', '2026 Term 1', Decimal('100.00'), Decimal('0'))] * 60,
+            'payments': [],
+        } for i in range(120)]
+
+        serial = list(render_statements(statements, workers=1))
+        pooled = list(render_statements(statements, workers=2))
+
+        self.assertEqual([path for path, _ in pooled], [s['path'] for s in statements])
+        self.assertEqual(pooled, serial)
+        self.assertIn(b'/Count 2', serial[0][1])
+
+    def test_statement_job_api(self):
+        response = self.client.post('/api/payments/statements/', {
+            'student_class': self.student_class.pk, 'term': 2
+        }, format='json')
+        self.assertEqual(response.status_code, 202)
+        job = StatementJob.objects.get(pk=response.data['job']['id'])
+        self.assertEqual((job.student_class, job.term, job.status), (self.student_class, 2, 'QUEUED'))
+
+        response = self.client.get(f'/api/payments/statements/{job.pk}/')
+        self.assertEqual((response.data['status'], response.data['archive']), ('QUEUED', None))
+        self.assertEqual(self.client.get(f'/api/payments/statements/{job.pk}/download/').status_code, 404)
+
+        response = self.client.post('/api/payments/statements/', {'term': 5}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+
+@skipUnless(connection.features.has_select_for_update_skip_locked, 'Needs SELECT ... SKIP LOCKED')
+class ConcurrentReconciliationTests(PaymentFixturesMixin, TransactionTestCase):
+
+    def run_concurrently(self, *targets):
+        errors = []
+        barrier = threading.Barrier(len(targets))
+
+        def run(target):
+            try:
+                barrier.wait()
+                target()
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=run, args=(target,)) for target in targets]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+
+    def test_overlapping_runs_apply_each_payment_once(self):
+        students = self.make_students(40)
+        for student in students:
+            for amount in ("4000.00", "9000.00", "9000.00"):
+                self.make_payment(student.student_id, amount)
+        self.make_payment("UNKNOWN", "100.00")
+
+        self.run_concurrently(
+            lambda: parallel_reconcile_payments(school=self.school, workers=4),
+            lambda: parallel_reconcile_payments(school=self.school, workers=3),
+            lambda: batch_reconcile_payments(school=self.school),
+        )
+
+        payments = Payment.objects.filter(school=self.school)
+        self.assertFalse(payments.filter(status='UNPROCESSED').exists())
+        self.assertEqual(payments.filter(status='MATCHED').count(), 120)
+        self.assertEqual(payments.filter(status='FAILED').count(), 1)
+
+        fees = StudentFee.objects.filter(student__school=self.school)
+        self.assertFalse(fees.filter(amount_paid__gt=F('fee_item__amount')).exists())
+        # 22,000 per student against 20,000 of fees: both terms cleared, nothing double-applied
+        self.assertEqual(fees.filter(is_paid=False).count(), 0)
+        self.assertEqual(fees.aggregate(total=Sum('amount_paid'))['total'], Decimal("800000.00"))
+
+        rollup = DailyCollection.objects.filter(school=self.school).aggregate(
+            total=Sum('total_amount'), count=Sum('payment_count')
+        )
+        self.assertEqual(rollup, {'total': Decimal("880000.00"), 'count': 120})
+
+    def test_parallel_matches_batch_allocation(self):
+        students = self.make_students(20)
+        for i, student in enumerate(students):
+            self.make_payment(student.student_id, f"{3000 + i * 500}.00")
+            self.make_payment(student.student_id, "7000.00")
+
+        result = parallel_reconcile_payments(school=self.school, workers=4)
+
+        self.assertEqual(result, {'total': 40, 'matched': 40, 'failed': 0})
+        for i, student in enumerate(students):
+            paid = sorted(
+                StudentFee.objects.filter(student=student).values_list('term', 'amount_paid')
+            )
+            first = min(Decimal(3000 + i * 500) + Decimal(7000), Decimal(10000))
+            second = Decimal(3000 + i * 500) + Decimal(7000) - first
+            self.assertEqual(paid, [(1, first), (2, second)])
+
+
+@skipUnless(connection.vendor == 'postgresql', 'Query plans are checked on PostgreSQL')
+class QueryPlanTests(TestCase):
+    """
+    EXPLAIN every query the hot endpoints and reconciliation run against
+    a multi-school dataset, and fail on a sequential scan of a large table:
+    a tenant query that isn't led by an index reads every school's rows.
+    """
+
+    SCHOOLS = 200
+    STUDENTS_PER_SCHOOL = 50
+
+    LARGE_TABLES = {
+        'academics_student', 'academics_studentfee', 'academics_studentbalance',
+        'payments_payment', 'payments_paymentallocation',
+    }
+
+    @classmethod
+    def setUpTestData(cls):
+        now = timezone.now()
+        students, fees, payments = [], [], []
+        billing = {}
+        for i in range(cls.SCHOOLS):
+            school = School.objects.create(name=f"School {i}")
+            student_class = Class.objects.create(name="Form 1", school=school)
+            year = AcademicYear.objects.create(
+                name=f"{i}-2026", start_date=date(2026, 1, 6), end_date=date(2026, 11, 30), school=school
+            )
+            billing[school.pk] = (year, FeeItem.objects.create(
+                name="Tuition", amount=Decimal("10000.00"), school=school
+            ))
+            for j in range(cls.STUDENTS_PER_SCHOOL):
+                students.append(Student(
+                    first_name=f"Student{j}", last_name="Test", student_id=f"S{i:03d}{j:03d}",
+                    school=school, student_class=student_class,
+                ))
+            if i == 0:
+                cls.school, cls.student_class = school, student_class
+        students = Student.objects.bulk_create(students)
+
+        for n, student in enumerate(students):
+            year, fee_item = billing[student.school_id]
+            for term in (1, 2):
+                fees.append(StudentFee(
+                    student=student, fee_item=fee_item, academic_year=year, term=term,
+                    is_paid=term == 1, amount_paid=Decimal("10000.00") if term == 1 else 0,
+                ))
+            # Matched, failed and still queued payments, most of them settled
+            for k, payment_status in enumerate(('MATCHED', 'FAILED' if n % 50 else 'UNPROCESSED')):
+                payments.append(Payment(
+                    school_id=student.school_id, transaction_code=f"PLN{n:05d}{k}",
+                    student_admission_number=student.student_id, amount=Decimal("10000.00"),
+                    transaction_date=now - timedelta(hours=n), status=payment_status,
+                ))
+        fees = StudentFee.objects.bulk_create(fees)
+        payments = Payment.objects.bulk_create(payments)
+        PaymentAllocation.objects.bulk_create([
+            PaymentAllocation(payment=payment, student_fee=fee, amount=payment.amount)
+            for payment, fee in zip(payments[::2], fees[::2])
+        ])
+        rebuild_student_balances()
+
+        cls.student = students[0]
+        cls.user = User.objects.create_user(
+            username='bursar', password='bursar123', role='ADMIN', school=cls.school
+        )
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def seq_scans(self, plan):
+        """Large tables read by a Seq Scan anywhere in an EXPLAIN (FORMAT JSON) plan"""
+        found = []
+        if plan.get('Node Type') == 'Seq Scan' and plan.get('Relation Name') in self.LARGE_TABLES:
+            found.append(plan['Relation Name'])
+        for child in plan.get('Plans', []):
+            found.extend(self.seq_scans(child))
+        return found
+
+    def plan_nodes(self, plan):
+        yield plan
+        for child in plan.get('Plans', []):
+            yield from self.plan_nodes(child)
+
+    def assertIndexLed(self, queries):
+        checked = 0
+        with connection.cursor() as cursor:
+            for query in queries:
+                sql = query['sql']
+                if not sql.startswith('SELECT'):
+                    continue
+                cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}')
+                plan = cursor.fetchone()[0][0]['Plan']
+                self.assertEqual(self.seq_scans(plan), [], sql)
+                checked += 1
+        self.assertGreater(checked, 0)
+
+    def test_list_and_detail_endpoints(self):
+        student = self.student
+        urls = [
+            '/api/payments/list/',
+            '/api/payments/list/?status=FAILED',
+            '/api/payments/audit-trail/',
+            '/api/payments/unmatched/',
+            '/api/payments/unmatched/suggestions/',
+            '/api/payments/students/',
+            f'/api/payments/students/?class_id={self.student_class.pk}',
+            '/api/payments/students/?payment_status=UNPAID',
+            f'/api/payments/students/{student.pk}/',
+            f'/api/payments/students/{student.pk}/fees/',
+            f'/api/payments/students/{student.pk}/allocations/',
+            '/api/payments/dashboard/class-balances/',
+        ]
+        for url in urls:
+            with self.subTest(url=url):
+                with CaptureQueriesContext(connection) as queries:
+                    response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+                self.assertIndexLed(queries.captured_queries)
+
+    def test_cursor_pages_are_index_ranges(self):
+        # (url, keyset field) for each list paged by cursor
+        lists = [
+            ('/api/payments/list/', 'transaction_date'),
+            ('/api/payments/unmatched/', 'transaction_date'),
+            ('/api/payments/audit-trail/', 'created_at'),
+        ]
+        for url, field in lists:
+            with self.subTest(url=url):
+                next_url = self.client.get(f'{url}?pagination=cursor&page_size=10').json()['next']
+                with CaptureQueriesContext(connection) as queries:
+                    response = self.client.get(next_url)
+                self.assertEqual(response.status_code, 200)
+                sql = next(q['sql'] for q in queries.captured_queries if 'FROM "payments_payment"' in q['sql'])
+                with connection.cursor() as cursor:
+                    cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}')
+                    nodes = list(self.plan_nodes(cursor.fetchone()[0][0]['Plan']))
+
+                # Read as one range in index order: no OR of bitmaps, no re-sort
+                node_types = {node['Node Type'] for node in nodes}
+                self.assertFalse(node_types & {'BitmapOr', 'Sort', 'Incremental Sort'}, sql)
+                self.assertTrue(
+                    any(field in node.get('Index Cond', '') for node in nodes
+                        if node.get('Relation Name') == 'payments_payment'),
+                    sql
+                )
+
+    def test_reconciliation_queries(self):
+        failed = list(Payment.objects.filter(
+            school=self.school, status='FAILED'
+        ).values_list('student_admission_number', flat=True)[:20])
+
+        with CaptureQueriesContext(connection) as queries:
+            batch_reconcile_payments(school=ALL_SCHOOLS)
+            retry_failed_payments(self.school, failed)
+            batch_reconcile_payments(school=self.school)
+            get_reconciliation_report(self.school)
+            apply_student_credits([self.student.pk])
+        self.assertIndexLed(queries.captured_queries)
+
+
+class BackfillMigrationTests(TransactionTestCase):
+    """The rollup tables are filled from existing data when they are created"""
+
+    before = [('academics', '0003_academicyear_feeitem_studentfee'), ('payments', '0003_uploadjob_content_hash')]
+    after = [('payments', '0005_dailycollection')]
+
+    def tearDown(self):
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate(executor.loader.graph.leaf_nodes())
+        super().tearDown()
+
+    def migrate(self, targets):
+        executor = MigrationExecutor(connection)
+        executor.migrate(targets)
+        executor.loader.build_graph()
+        return executor.loader.project_state(targets).apps
+
+    def test_balances_and_daily_collections_are_backfilled(self):
+        apps = self.migrate(self.before)
+        school = apps.get_model('school', 'School').objects.create(name="Old Academy")
+        year = apps.get_model('academics', 'AcademicYear').objects.create(
+            name="2025", start_date=date(2025, 1, 6), end_date=date(2025, 11, 30), school=school
+        )
+        fee_item = apps.get_model('academics', 'FeeItem').objects.create(
+            name="Tuition", amount=Decimal("10000.00"), school=school
+        )
+        Student = apps.get_model('academics', 'Student')
+        owing = Student.objects.create(first_name="Owing", last_name="Student", student_id="OA0001", school=school)
+        Student.objects.create(first_name="No", last_name="Fees", student_id="OA0002", school=school)
+        StudentFee = apps.get_model('academics', 'StudentFee')
+        for term, paid in ((1, "10000.00"), (2, "2500.00")):
+            StudentFee.objects.create(
+                student=owing, fee_item=fee_item, academic_year=year, term=term,
+                amount_paid=Decimal(paid), is_paid=paid == "10000.00",
+            )
+        Payment = apps.get_model('payments', 'Payment')
+        paid_at = timezone.make_aware(datetime(2025, 2, 3, 10, 0))
+        for code, amount, status in (("OLD1", "10000.00", 'MATCHED'), ("OLD2", "2500.00", 'MATCHED'),
+                                     ("OLD3", "99.00", 'FAILED')):
+            Payment.objects.create(
+                school=school, transaction_code=code, student_admission_number="OA0001",
+                amount=Decimal(amount), transaction_date=paid_at, status=status,
+            )
+
+        apps = self.migrate(self.after)
+
+        balances = apps.get_model('academics', 'StudentBalance').objects.order_by('student__student_id')
+        self.assertEqual(
+            [(b.total_owed, b.total_paid, b.outstanding, b.payment_status) for b in balances],
+            [(Decimal("20000.00"), Decimal("12500.00"), Decimal("7500.00"), 'PARTIAL'),
+             (Decimal("0.00"), Decimal("0.00"), Decimal("0.00"), 'PAID')]
+        )
+        days = apps.get_model('payments', 'DailyCollection').objects.all()
+        self.assertEqual(
+            [(day.date, day.total_amount, day.payment_count) for day in days],
+            [(date(2025, 2, 3), Decimal("12500.00"), 2)]
+        )
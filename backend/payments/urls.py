@@ -2,20 +2,36 @@ from django.urls import path
 from .views import (
     # Payment endpoints
     UploadMpesaCSV,
+    UploadJobDetailView,
     PaymentListView,
+    PaymentExportView,
     PaymentDetailView,
     ReconcilePaymentsView,
+    ReconcilePreviewView,
+    ReversePaymentsView,
     UnmatchedPaymentsView,
+    PaymentMatchSuggestionsView,
+    AutoMatchPaymentsView,
     
     # Student endpoints
     StudentListView,
+    StudentExportView,
     StudentDetailView,
     StudentFeesView,
+    StudentAllocationsView,
+    FeeAllocationsView,
+    
+    # Fee structure
+    FeeStructureListView,
+    AssignFeesView,
     
     # Dashboard & Reports
     DashboardStatsView,
     CollectionTrendsView,
     ClassBalancesView,
+    StatementJobView,
+    StatementJobDetailView,
+    StatementArchiveView,
     AuditTrailView,
 )
 
@@ -24,19 +40,35 @@ app_name = 'payments'
 urlpatterns = [
     # Payment management
     path('upload/', UploadMpesaCSV.as_view(), name='upload-csv'),
+    path('upload/jobs/<int:pk>/', UploadJobDetailView.as_view(), name='upload-job'),
     path('list/', PaymentListView.as_view(), name='payment-list'),
+    path('export/', PaymentExportView.as_view(), name='payment-export'),
     path('<int:pk>/', PaymentDetailView.as_view(), name='payment-detail'),
     path('reconcile/', ReconcilePaymentsView.as_view(), name='reconcile'),
+    path('reconcile/preview/', ReconcilePreviewView.as_view(), name='reconcile-preview'),
+    path('reversals/', ReversePaymentsView.as_view(), name='reverse-payments'),
     path('unmatched/', UnmatchedPaymentsView.as_view(), name='unmatched'),
+    path('unmatched/suggestions/', PaymentMatchSuggestionsView.as_view(), name='match-suggestions'),
+    path('unmatched/auto-match/', AutoMatchPaymentsView.as_view(), name='auto-match'),
     
     # Student management
     path('students/', StudentListView.as_view(), name='student-list'),
+    path('students/export/', StudentExportView.as_view(), name='student-export'),
     path('students/<int:pk>/', StudentDetailView.as_view(), name='student-detail'),
     path('students/<int:pk>/fees/', StudentFeesView.as_view(), name='student-fees'),
+    path('students/<int:pk>/allocations/', StudentAllocationsView.as_view(), name='student-allocations'),
+    path('fees/<int:pk>/allocations/', FeeAllocationsView.as_view(), name='fee-allocations'),
+    
+    # Fee structure
+    path('fee-structures/', FeeStructureListView.as_view(), name='fee-structures'),
+    path('fees/assign/', AssignFeesView.as_view(), name='assign-fees'),
     
     # Dashboard & Reports
     path('dashboard/stats/', DashboardStatsView.as_view(), name='dashboard-stats'),
     path('dashboard/trends/', CollectionTrendsView.as_view(), name='collection-trends'),
     path('dashboard/class-balances/', ClassBalancesView.as_view(), name='class-balances'),
+    path('statements/', StatementJobView.as_view(), name='statement-jobs'),
+    path('statements/<int:pk>/', StatementJobDetailView.as_view(), name='statement-job'),
+    path('statements/<int:pk>/download/', StatementArchiveView.as_view(), name='statement-download'),
     path('audit-trail/', AuditTrailView.as_view(), name='audit-trail'),
 ]
\ No newline at end of file
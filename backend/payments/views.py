@@ -1,27 +1,85 @@
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status, permissions, generics, filters
-from rest_framework.pagination import PageNumberPagination
-from django.db.models import Sum, Count, Q, F
+from rest_framework.renderers import BrowsableAPIRenderer
+from rest_framework.exceptions import ValidationError, NotFound
+from django.db.models import Sum, Count, F, Prefetch
+from django.db.models.functions import TruncWeek, TruncMonth
+from django.utils import timezone
+from django.utils.dateparse import parse_date
 from django.shortcuts import get_object_or_404
+from django.http import StreamingHttpResponse, FileResponse
 
-from .models import Payment
+from .models import Payment, PaymentAllocation, UploadJob, DailyCollection, StatementJob
+from .pagination import StandardResultsSetPagination, KeysetResultsSetPagination
+from .readers import ValuesListMixin, PaymentReader, StudentListReader
+from .renderers import FastJSONRenderer
 from .serializers import (
-    PaymentSerializer, PaymentUploadSerializer, StudentSerializer,
-    StudentListSerializer, StudentFeeSerializer, ClassSerializer
+    PaymentSerializer, PaymentDetailSerializer, PaymentAllocationSerializer,
+    PaymentUploadSerializer, StudentSerializer, StudentListSerializer,
+    StudentFeeSerializer, ClassSerializer, UploadJobSerializer, StatementJobSerializer,
+    FeeStructureSerializer
+)
+from .services.jobs import enqueue_upload_job
+from .services.statements import enqueue_statement_job
+from .services.fee_assignment import assign_fees
+from .services.balances import annotate_student_balances
+from .services.dashboard import get_dashboard_stats
+from .services.exports import (
+    PAYMENT_EXPORT_COLUMNS, STUDENT_EXPORT_COLUMNS, payment_export_rows,
+    student_export_rows, stream_csv, stream_xlsx
+)
+from .services.reversals import reverse_payment, reverse_upload, reverse_date_range
+from .services.matching import (
+    AUTO_MATCH_THRESHOLD, unmatched_student_payments, suggest_matches, auto_match_payments
 )
-from .parsers.mpesa_parser import parse_mpesa_csv
 from .services.reconciliation import (
-    reconcile_payment, batch_reconcile_payments,
+    reconcile_payment, parallel_reconcile_payments, simulate_reconciliation,
     get_reconciliation_report, get_unmatched_payments
 )
-from academics.models import Student, StudentFee, Class
+from academics.models import Student, StudentFee, Class, AcademicYear, FeeStructure
+from school.tenancy import get_current_school
+
+
+# Everything PaymentSerializer dereferences, so a page costs a fixed number of queries
+PAYMENT_RELATED = (
+    'school', 'uploaded_by', 'matched_fee',
+    'matched_fee__fee_item', 'matched_fee__academic_year',
+)
+
+# Hot list endpoints render through orjson (when installed)
+FAST_RENDERERS = [FastJSONRenderer, BrowsableAPIRenderer]
+
+# Everything PaymentAllocationSerializer dereferences
+ALLOCATION_RELATED = (
+    'payment', 'student_fee__fee_item', 'student_fee__academic_year',
+)
+
 
+EXPORT_CONTENT_TYPES = {
+    'csv': 'text/csv; charset=utf-8',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+}
 
-class StandardResultsSetPagination(PageNumberPagination):
-    page_size = 50
-    page_size_query_param = 'page_size'
-    max_page_size = 200
+
+def export_response(request, name, columns, rows):
+    """
+    Stream `rows` as CSV (default) or XLSX, chosen with ?file_type=.
+    Bytes go out as rows are read, so large exports start immediately.
+    """
+    file_type = request.query_params.get('file_type', 'csv')
+    if file_type not in EXPORT_CONTENT_TYPES:
+        raise ValidationError({'file_type': 'Must be csv or xlsx'})
+    
+    if file_type == 'xlsx':
+        content = stream_xlsx(columns, rows, sheet_name=name.title())
+    else:
+        content = stream_csv(columns, rows)
+    
+    response = StreamingHttpResponse(content, content_type=EXPORT_CONTENT_TYPES[file_type])
+    filename = f"{name}-{timezone.localdate().isoformat()}.{file_type}"
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
 
 
 # ==================== PAYMENT ENDPOINTS ====================
@@ -35,7 +93,7 @@ class UploadMpesaCSV(APIView):
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
         
         file = serializer.validated_data['file']
-        school = request.user.school
+        school = get_current_school()
         
         if not school:
             return Response(
@@ -43,37 +101,48 @@ class UploadMpesaCSV(APIView):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        try:
-            # Parse CSV
-            parse_mpesa_csv(file, school, request.user)
-            
-            # Reconcile newly uploaded payments
-            result = batch_reconcile_payments(school=school)
-            
+        # Parsing and reconciliation run in the process_upload_jobs worker
+        job, created = enqueue_upload_job(file, school, request.user)
+        
+        if not created:
+            # Same bytes already uploaded: hand back the earlier job's result
             return Response({
-                "success": "Payments uploaded and reconciled",
-                "summary": result
+                "success": "File already uploaded",
+                "cached": True,
+                "job": UploadJobSerializer(job).data
             }, status=status.HTTP_200_OK)
         
-        except Exception as e:
-            return Response(
-                {"error": f"Failed to process file: {str(e)}"},
-                status=status.HTTP_500_INTERNAL_SERVER_ERROR
-            )
+        return Response({
+            "success": "File queued for processing",
+            "cached": False,
+            "job": UploadJobSerializer(job).data
+        }, status=status.HTTP_202_ACCEPTED)
+
+
+class UploadJobDetailView(generics.RetrieveAPIView):
+    """Poll the progress of a CSV upload job"""
+    serializer_class = UploadJobSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    
+    def get_queryset(self):
+        return UploadJob.objects.filter(school=get_current_school())
 
 
-class PaymentListView(generics.ListAPIView):
+class PaymentListView(ValuesListMixin, generics.ListAPIView):
     """List all payments with filtering"""
     serializer_class = PaymentSerializer
     permission_classes = [permissions.IsAuthenticated]
-    pagination_class = StandardResultsSetPagination
+    renderer_classes = FAST_RENDERERS
+    row_reader = PaymentReader()
+    pagination_class = KeysetResultsSetPagination
+    keyset_ordering = ('-transaction_date', '-id')
     filter_backends = [filters.SearchFilter, filters.OrderingFilter]
     search_fields = ['transaction_code', 'student_admission_number']
     ordering_fields = ['transaction_date', 'amount', 'created_at']
     ordering = ['-transaction_date']
     
     def get_queryset(self):
-        queryset = Payment.objects.filter(school=self.request.user.school)
+        queryset = Payment.scoped.all()
         
         # Filter by status
         status_filter = self.request.query_params.get('status', None)
@@ -88,16 +157,29 @@ class PaymentListView(generics.ListAPIView):
         if end_date:
             queryset = queryset.filter(transaction_date__lte=end_date)
         
-        return queryset.select_related('school', 'uploaded_by', 'matched_fee')
+        return queryset.select_related(*PAYMENT_RELATED)
+
+
+class PaymentExportView(PaymentListView):
+    """Download every payment matching the list filters as CSV or XLSX"""
+    
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        return export_response(request, 'payments', PAYMENT_EXPORT_COLUMNS, payment_export_rows(queryset))
 
 
 class PaymentDetailView(generics.RetrieveAPIView):
-    """Get single payment details"""
-    serializer_class = PaymentSerializer
+    """Get single payment details, including where it was allocated"""
+    serializer_class = PaymentDetailSerializer
     permission_classes = [permissions.IsAuthenticated]
     
     def get_queryset(self):
-        return Payment.objects.filter(school=self.request.user.school)
+        return Payment.scoped.select_related(*PAYMENT_RELATED).prefetch_related(
+            Prefetch(
+                'allocations',
+                queryset=PaymentAllocation.objects.select_related(*ALLOCATION_RELATED)
+            )
+        )
 
 
 class ReconcilePaymentsView(APIView):
@@ -105,8 +187,14 @@ class ReconcilePaymentsView(APIView):
     permission_classes = [permissions.IsAuthenticated]
     
     def post(self, request):
-        school = request.user.school
-        result = batch_reconcile_payments(school=school)
+        school = get_current_school()
+        if not school:
+            return Response(
+                {"error": "User must be associated with a school"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        result = parallel_reconcile_payments(school=school)
         
         return Response({
             "success": "Reconciliation completed",
@@ -114,50 +202,194 @@ class ReconcilePaymentsView(APIView):
         }, status=status.HTTP_200_OK)
 
 
-class UnmatchedPaymentsView(generics.ListAPIView):
+class ReversePaymentsView(APIView):
+    """
+    Unapply payments from the fees they paid.
+
+    Body: one of `payment` (id), `upload_job` (id) or `start_date` +
+    `end_date`. With `requeue` the payments go back to UNPROCESSED instead
+    of REVERSED; `reconcile` also requeues and re-runs reconciliation.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    
+    def post(self, request):
+        school = get_current_school()
+        reconcile = bool(request.data.get('reconcile', False))
+        requeue = reconcile or bool(request.data.get('requeue', False))
+        
+        if request.data.get('payment'):
+            payment = get_object_or_404(Payment.scoped, pk=request.data['payment'])
+            result = reverse_payment(payment, requeue=requeue)
+        elif request.data.get('upload_job'):
+            job = get_object_or_404(UploadJob, pk=request.data['upload_job'], school=school)
+            result = reverse_upload(job, requeue=requeue)
+        elif request.data.get('start_date') or request.data.get('end_date'):
+            try:
+                start_date = parse_date(str(request.data.get('start_date', '')))
+                end_date = parse_date(str(request.data.get('end_date', '')))
+            except ValueError:
+                start_date = end_date = None
+            if start_date is None or end_date is None or start_date > end_date:
+                raise ValidationError({'date_range': 'Provide start_date and end_date as YYYY-MM-DD'})
+            result = reverse_date_range(school, start_date, end_date, requeue=requeue)
+        else:
+            raise ValidationError({'detail': 'Provide payment, upload_job or start_date and end_date'})
+        
+        admission_numbers = result.pop('admission_numbers')
+        if reconcile and admission_numbers:
+            result['reconciliation'] = parallel_reconcile_payments(
+                school=school, admission_numbers=admission_numbers
+            )
+        
+        return Response({
+            "success": "Payments requeued" if requeue else "Payments reversed",
+            "summary": result
+        }, status=status.HTTP_200_OK)
+
+
+class ReconcilePreviewView(APIView):
+    """
+    What reconciliation would do right now, without saving anything.
+    Optional ?upload_job=<id> limits the preview to one upload's payments.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    
+    def get(self, request):
+        school = get_current_school()
+        if not school:
+            return Response(
+                {"error": "User must be associated with a school"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        upload_job = None
+        upload_job_id = request.query_params.get('upload_job')
+        if upload_job_id:
+            upload_job = get_object_or_404(UploadJob, pk=upload_job_id, school=school)
+        
+        return Response(simulate_reconciliation(school=school, upload_job=upload_job))
+
+
+class UnmatchedPaymentsView(ValuesListMixin, generics.ListAPIView):
     """Get all failed/unmatched payments"""
     serializer_class = PaymentSerializer
     permission_classes = [permissions.IsAuthenticated]
-    pagination_class = StandardResultsSetPagination
+    renderer_classes = FAST_RENDERERS
+    row_reader = PaymentReader()
+    pagination_class = KeysetResultsSetPagination
+    keyset_ordering = ('-transaction_date', '-id')
+    
+    def get_queryset(self):
+        return get_unmatched_payments(
+            school=get_current_school()
+        ).select_related(*PAYMENT_RELATED)
+
+
+class PaymentMatchSuggestionsView(generics.ListAPIView):
+    """Failed 'student not found' payments with ranked student suggestions"""
+    serializer_class = PaymentSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    pagination_class = KeysetResultsSetPagination
+    keyset_ordering = ('-transaction_date', '-id')
     
     def get_queryset(self):
-        return get_unmatched_payments(school=self.request.user.school)
+        return unmatched_student_payments(
+            get_current_school()
+        ).select_related(*PAYMENT_RELATED).order_by('-transaction_date')
+    
+    def list(self, request, *args, **kwargs):
+        school = get_current_school()
+        if not school:
+            return Response(
+                {"error": "User must be associated with a school"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(queryset)
+        payments = page if page is not None else list(queryset)
+        
+        suggestions = suggest_matches(payments, school)
+        results = self.get_serializer(payments, many=True).data
+        for row in results:
+            row['suggestions'] = suggestions[row['id']]
+        
+        if page is not None:
+            return self.get_paginated_response(results)
+        return Response(results)
+
+
+class AutoMatchPaymentsView(APIView):
+    """Correct and reconcile unmatched payments with a confident suggestion"""
+    permission_classes = [permissions.IsAuthenticated]
+    
+    def post(self, request):
+        school = get_current_school()
+        if not school:
+            return Response(
+                {"error": "User must be associated with a school"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        try:
+            threshold = float(request.data.get('threshold', AUTO_MATCH_THRESHOLD))
+        except (TypeError, ValueError):
+            raise ValidationError({'threshold': 'Must be a number between 0 and 1'})
+        if not 0 < threshold <= 1:
+            raise ValidationError({'threshold': 'Must be a number between 0 and 1'})
+        
+        result = auto_match_payments(school, threshold=threshold)
+        
+        return Response({
+            "success": "Auto-match completed",
+            "summary": result
+        }, status=status.HTTP_200_OK)
 
 
 # ==================== STUDENT ENDPOINTS ====================
 
-class StudentListView(generics.ListAPIView):
-    """List all students with fee balances"""
+class StudentListView(ValuesListMixin, generics.ListAPIView):
+    """
+    List all students with fee balances.
+    Filters: ?class_id=<id>&payment_status=PAID|PARTIAL|UNPAID
+    Ordering also accepts outstanding_balance and payment_status.
+    """
     serializer_class = StudentListSerializer
     permission_classes = [permissions.IsAuthenticated]
+    renderer_classes = FAST_RENDERERS
+    row_reader = StudentListReader()
     pagination_class = StandardResultsSetPagination
     filter_backends = [filters.SearchFilter, filters.OrderingFilter]
     search_fields = ['first_name', 'last_name', 'student_id']
-    ordering_fields = ['student_id', 'last_name']
+    ordering_fields = ['student_id', 'last_name', 'outstanding_balance', 'payment_status']
     ordering = ['student_id']
     
     def get_queryset(self):
-        queryset = Student.objects.filter(school=self.request.user.school)
+        queryset = Student.scoped.all()
         
         # Filter by class
         class_id = self.request.query_params.get('class_id', None)
         if class_id:
             queryset = queryset.filter(student_class_id=class_id)
         
-        # Filter by payment status
+        queryset = annotate_student_balances(queryset)
+        
+        # Filter by payment status, as computed from the student's whole balance
         payment_status = self.request.query_params.get('payment_status', None)
-        if payment_status == 'PAID':
-            # Students with no outstanding balance
-            queryset = queryset.filter(
-                fees__is_paid=True
-            ).distinct()
-        elif payment_status == 'UNPAID':
-            # Students with unpaid fees
-            queryset = queryset.filter(
-                fees__is_paid=False
-            ).distinct()
+        if payment_status:
+            if payment_status not in ('PAID', 'PARTIAL', 'UNPAID'):
+                raise ValidationError({"payment_status": "Must be PAID, PARTIAL or UNPAID"})
+            queryset = queryset.filter(payment_status=payment_status)
         
-        return queryset.prefetch_related('fees', 'fees__fee_item')
+        return queryset.select_related('student_class')
+
+
+class StudentExportView(StudentListView):
+    """Download every student matching the list filters, with balances"""
+    
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        return export_response(request, 'students', STUDENT_EXPORT_COLUMNS, student_export_rows(queryset))
 
 
 class StudentDetailView(generics.RetrieveAPIView):
@@ -166,8 +398,8 @@ class StudentDetailView(generics.RetrieveAPIView):
     permission_classes = [permissions.IsAuthenticated]
     
     def get_queryset(self):
-        return Student.objects.filter(
-            school=self.request.user.school
+        return annotate_student_balances(Student.scoped.all()).select_related(
+            'student_class'
         ).prefetch_related(
             'fees',
             'fees__fee_item',
@@ -182,161 +414,338 @@ class StudentFeesView(generics.ListAPIView):
     
     def get_queryset(self):
         student_id = self.kwargs.get('pk')
-        student = get_object_or_404(
-            Student,
-            pk=student_id,
-            school=self.request.user.school
-        )
+        student = get_object_or_404(Student.scoped, pk=student_id)
         return StudentFee.objects.filter(student=student).select_related(
             'fee_item', 'academic_year'
         ).order_by('academic_year__start_date', 'term')
 
 
-# ==================== DASHBOARD & REPORTS ====================
+class StudentAllocationsView(generics.ListAPIView):
+    """Payment allocations for a student, newest payment first (fee statement)"""
+    serializer_class = PaymentAllocationSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    pagination_class = StandardResultsSetPagination
+    
+    def get_queryset(self):
+        student = get_object_or_404(Student.scoped, pk=self.kwargs.get('pk'))
+        return PaymentAllocation.objects.filter(
+            student_fee__student=student
+        ).select_related(*ALLOCATION_RELATED).order_by('-payment__transaction_date', 'id')
 
-class DashboardStatsView(APIView):
-    """Get overall financial statistics"""
+
+class FeeAllocationsView(generics.ListAPIView):
+    """Payments that went towards a single student fee, oldest first"""
+    serializer_class = PaymentAllocationSerializer
     permission_classes = [permissions.IsAuthenticated]
     
-    def get(self, request):
-        school = request.user.school
-        
-        # Payment statistics
-        payment_stats = Payment.objects.filter(school=school).aggregate(
-            total_payments=Count('id'),
-            total_collected=Sum('amount', filter=Q(status='MATCHED')),
-            matched_count=Count('id', filter=Q(status='MATCHED')),
-            failed_count=Count('id', filter=Q(status='FAILED')),
-            unprocessed_count=Count('id', filter=Q(status='UNPROCESSED')),
-        )
-        
-        # Fee statistics
-        fee_stats = StudentFee.objects.filter(
-            student__school=school
-        ).aggregate(
-            total_expected=Sum('fee_item__amount'),
-            total_paid=Sum('amount_paid'),
-            paid_fees_count=Count('id', filter=Q(is_paid=True)),
-            unpaid_fees_count=Count('id', filter=Q(is_paid=False)),
+    def get_queryset(self):
+        fee = get_object_or_404(StudentFee.scoped, pk=self.kwargs.get('pk'))
+        return PaymentAllocation.objects.filter(
+            student_fee=fee
+        ).select_related(*ALLOCATION_RELATED).order_by('created_at', 'id')
+
+
+# ==================== FEE STRUCTURE ====================
+
+class FeeStructureListView(generics.ListCreateAPIView):
+    """
+    List or add the fee items each class is billed for per term.
+    Optional filters: ?academic_year=<id>&term=<1-3>&student_class=<id>
+    """
+    serializer_class = FeeStructureSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    
+    def get_queryset(self):
+        queryset = FeeStructure.objects.filter(
+            school=get_current_school()
+        ).select_related('academic_year', 'student_class', 'fee_item').order_by(
+            'academic_year__start_date', 'term', 'student_class__name', 'fee_item__name'
         )
         
-        outstanding_balance = (fee_stats['total_expected'] or 0) - (fee_stats['total_paid'] or 0)
+        for param in ('academic_year', 'term', 'student_class'):
+            value = self.request.query_params.get(param)
+            if value:
+                if not value.isdigit():
+                    raise ValidationError({param: "Must be a number"})
+                queryset = queryset.filter(**{param: int(value)})
         
-        # Student statistics
-        student_stats = Student.objects.filter(school=school).aggregate(
-            total_students=Count('id')
-        )
+        return queryset
+    
+    def perform_create(self, serializer):
+        serializer.save(school=get_current_school())
+
+
+class AssignFeesView(APIView):
+    """
+    Generate StudentFee rows from the fee structure in bulk.
+
+    Body: `academic_year` (id), optional `term` and `student_class`.
+    Fees students already have are skipped and held credit is spent on the
+    new ones. With `reconcile`, FAILED payments for the billed students are
+    retried afterwards.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    
+    def post(self, request):
+        school = get_current_school()
+        if not request.data.get('academic_year'):
+            raise ValidationError({"academic_year": "This field is required"})
+        academic_year = get_object_or_404(AcademicYear, pk=request.data['academic_year'], school=school)
         
-        # Students by payment status
-        students_fully_paid = Student.objects.filter(
-            school=school,
-            fees__is_paid=True
-        ).distinct().count()
+        student_class = None
+        if request.data.get('student_class'):
+            student_class = get_object_or_404(Class.scoped, pk=request.data['student_class'])
+        term = request.data.get('term')
+        if term not in (None, ''):
+            if str(term) not in ('1', '2', '3'):
+                raise ValidationError({"term": "Must be 1, 2 or 3"})
+            term = int(term)
+        else:
+            term = None
         
-        students_with_balance = Student.objects.filter(
-            school=school,
-            fees__is_paid=False
-        ).distinct().count()
+        result = assign_fees(
+            school, academic_year, term=term, student_class=student_class,
+            reconcile=bool(request.data.get('reconcile', False))
+        )
         
         return Response({
-            "payments": {
-                "total_count": payment_stats['total_payments'],
-                "total_collected": float(payment_stats['total_collected'] or 0),
-                "matched_count": payment_stats['matched_count'],
-                "failed_count": payment_stats['failed_count'],
-                "unprocessed_count": payment_stats['unprocessed_count'],
-            },
-            "fees": {
-                "total_expected": float(fee_stats['total_expected'] or 0),
-                "total_paid": float(fee_stats['total_paid'] or 0),
-                "outstanding_balance": float(outstanding_balance),
-                "collection_rate": round(
-                    (fee_stats['total_paid'] / fee_stats['total_expected'] * 100)
-                    if fee_stats['total_expected'] else 0,
-                    2
-                ),
-                "paid_fees_count": fee_stats['paid_fees_count'],
-                "unpaid_fees_count": fee_stats['unpaid_fees_count'],
-            },
-            "students": {
-                "total_students": student_stats['total_students'],
-                "fully_paid": students_fully_paid,
-                "with_balance": students_with_balance,
-            }
-        })
+            "success": f"Created {result['created']} student fees",
+            "summary": result
+        }, status=status.HTTP_200_OK)
+
+
+# ==================== DASHBOARD & REPORTS ====================
+
+class DashboardStatsView(APIView):
+    """Get overall financial statistics (cached per school)"""
+    permission_classes = [permissions.IsAuthenticated]
+    
+    def get(self, request):
+        stats, cache_info = get_dashboard_stats(get_current_school())
+        response = Response({**stats, "cache": cache_info})
+        response['X-Cache'] = 'HIT' if cache_info['hit'] else 'MISS'
+        return response
 
 
 class CollectionTrendsView(APIView):
-    """Get payment collection trends over time"""
+    """
+    Get payment collection trends over time, read from the daily rollup.
+    Optional: ?start_date=YYYY-MM-DD&end_date=YYYY-MM-DD&granularity=day|week|month
+    """
     permission_classes = [permissions.IsAuthenticated]
     
+    GRANULARITIES = {
+        'day': None,
+        'week': TruncWeek,
+        'month': TruncMonth,
+    }
+    
+    def get_date_param(self, name):
+        value = self.request.query_params.get(name)
+        if not value:
+            return None
+        try:
+            parsed = parse_date(value)
+        except ValueError:
+            parsed = None
+        if parsed is None:
+            raise ValidationError({name: "Must be a date in YYYY-MM-DD format"})
+        return parsed
+    
     def get(self, request):
-        from django.db.models.functions import TruncDate
+        granularity = request.query_params.get('granularity', 'day')
+        if granularity not in self.GRANULARITIES:
+            raise ValidationError({"granularity": "Must be one of day, week, month"})
         
-        school = request.user.school
+        start_date = self.get_date_param('start_date')
+        end_date = self.get_date_param('end_date')
         
-        # Group payments by date
-        daily_collections = Payment.objects.filter(
-            school=school,
-            status='MATCHED'
-        ).annotate(
-            date=TruncDate('transaction_date')
-        ).values('date').annotate(
-            total_amount=Sum('amount'),
-            payment_count=Count('id')
-        ).order_by('date')
+        days = DailyCollection.objects.filter(school=get_current_school())
+        if start_date:
+            days = days.filter(date__gte=start_date)
+        if end_date:
+            days = days.filter(date__lte=end_date)
         
-        return Response({
-            "daily_collections": list(daily_collections)
-        })
+        trunc = self.GRANULARITIES[granularity]
+        if trunc is None:
+            collections = days.values('date', 'total_amount', 'payment_count').order_by('date')
+        else:
+            collections = days.annotate(
+                period=trunc('date')
+            ).values('period').annotate(
+                total_amount=Sum('total_amount'),
+                payment_count=Sum('payment_count'),
+            ).values('period', 'total_amount', 'payment_count').order_by('period')
+            collections = [
+                {
+                    "date": row['period'],
+                    "total_amount": row['total_amount'],
+                    "payment_count": row['payment_count'],
+                }
+                for row in collections
+            ]
+        
+        collections = list(collections)
+        response = {
+            "granularity": granularity,
+            "collections": collections,
+        }
+        if granularity == 'day':
+            # Kept for clients written against the original daily-only endpoint
+            response["daily_collections"] = collections
+        return Response(response)
 
 
 class ClassBalancesView(generics.ListAPIView):
-    """Get outstanding balances by class"""
+    """
+    Get outstanding balances by class, with a per-fee-item breakdown.
+    Optional filters: ?academic_year=<id>&term=<1-3>
+    """
     serializer_class = ClassSerializer
     permission_classes = [permissions.IsAuthenticated]
     
     def get_queryset(self):
-        return Class.objects.filter(school=self.request.user.school)
+        return Class.scoped.all()
+    
+    def get_fee_filters(self):
+        fee_filters = {}
+        academic_year = self.request.query_params.get('academic_year')
+        term = self.request.query_params.get('term')
+        
+        if academic_year:
+            if not academic_year.isdigit():
+                raise ValidationError({"academic_year": "Must be an academic year id"})
+            fee_filters['academic_year_id'] = int(academic_year)
+        if term:
+            if term not in ('1', '2', '3'):
+                raise ValidationError({"term": "Must be 1, 2 or 3"})
+            fee_filters['term'] = int(term)
+        
+        return fee_filters
     
     def list(self, request, *args, **kwargs):
-        classes = self.get_queryset()
+        classes = self.get_queryset().annotate(
+            student_count=Count('students')
+        ).order_by('id')
+        
+        # One grouped aggregate for every (class, fee item) pair in the school
+        fee_totals = StudentFee.scoped.filter(
+            student__student_class__isnull=False,
+            **self.get_fee_filters()
+        ).values(
+            'student__student_class_id', 'fee_item_id', 'fee_item__name'
+        ).annotate(
+            total_expected=Sum('fee_item__amount'),
+            total_paid=Sum('amount_paid'),
+        ).order_by('fee_item__name')
+        
+        breakdown = {}
+        for row in fee_totals:
+            breakdown.setdefault(row['student__student_class_id'], []).append(row)
         
         class_data = []
         for cls in classes:
-            students = cls.students.all()
-            
-            balance_data = StudentFee.objects.filter(
-                student__in=students
-            ).aggregate(
-                total_expected=Sum('fee_item__amount'),
-                total_paid=Sum('amount_paid'),
-            )
+            fee_items = []
+            class_expected = 0
+            class_paid = 0
             
-            outstanding = (balance_data['total_expected'] or 0) - (balance_data['total_paid'] or 0)
+            for row in breakdown.get(cls.id, []):
+                class_expected += row['total_expected'] or 0
+                class_paid += row['total_paid'] or 0
+                fee_items.append({
+                    "id": row['fee_item_id'],
+                    "name": row['fee_item__name'],
+                    "total_expected": float(row['total_expected'] or 0),
+                    "total_paid": float(row['total_paid'] or 0),
+                    "outstanding_balance": float((row['total_expected'] or 0) - (row['total_paid'] or 0)),
+                })
             
             class_data.append({
                 "id": cls.id,
                 "name": cls.name,
-                "student_count": students.count(),
-                "total_expected": float(balance_data['total_expected'] or 0),
-                "total_paid": float(balance_data['total_paid'] or 0),
-                "outstanding_balance": float(outstanding),
+                "student_count": cls.student_count,
+                "total_expected": float(class_expected),
+                "total_paid": float(class_paid),
+                "outstanding_balance": float(class_expected - class_paid),
+                "fee_items": fee_items,
             })
         
         return Response(class_data)
 
 
-class AuditTrailView(generics.ListAPIView):
+class StatementJobView(APIView):
+    """
+    Queue fee statements for the whole school, or one class with
+    `student_class`. Optional `academic_year` and `term` narrow the period.
+    The process_statement_jobs worker renders them into a zip.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    
+    def post(self, request):
+        school = get_current_school()
+        if not school:
+            return Response(
+                {"error": "User must be associated with a school"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        student_class = academic_year = None
+        
+        if request.data.get('student_class'):
+            student_class = get_object_or_404(Class.scoped, pk=request.data['student_class'])
+        if request.data.get('academic_year'):
+            academic_year = get_object_or_404(AcademicYear, pk=request.data['academic_year'], school=school)
+        term = request.data.get('term')
+        if term not in (None, ''):
+            if str(term) not in ('1', '2', '3'):
+                raise ValidationError({"term": "Must be 1, 2 or 3"})
+            term = int(term)
+        else:
+            term = None
+        
+        job = enqueue_statement_job(
+            school, request.user,
+            student_class=student_class, academic_year=academic_year, term=term
+        )
+        return Response({
+            "success": "Statements queued for generation",
+            "job": StatementJobSerializer(job).data
+        }, status=status.HTTP_202_ACCEPTED)
+
+
+class StatementJobDetailView(generics.RetrieveAPIView):
+    """Poll a statement job; `archive` links to the zip once it completes"""
+    serializer_class = StatementJobSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    
+    def get_queryset(self):
+        return StatementJob.objects.filter(school=get_current_school())
+
+
+class StatementArchiveView(StatementJobDetailView):
+    """Download a completed statement job's zip (only for the job's own school)"""
+    
+    def retrieve(self, request, *args, **kwargs):
+        job = self.get_object()
+        if not job.archive:
+            raise NotFound("Statements are not ready yet")
+        return FileResponse(
+            job.archive.open('rb'),
+            as_attachment=True,
+            filename=f'statements-{job.pk}.zip',
+            content_type='application/zip',
+        )
+
+
+class AuditTrailView(ValuesListMixin, generics.ListAPIView):
     """Immutable payment audit trail"""
     serializer_class = PaymentSerializer
     permission_classes = [permissions.IsAuthenticated]
-    pagination_class = StandardResultsSetPagination
+    renderer_classes = FAST_RENDERERS
+    row_reader = PaymentReader()
+    pagination_class = KeysetResultsSetPagination
+    keyset_ordering = ('created_at', 'id')
     
     def get_queryset(self):
         # Return all payments in chronological order
-        return Payment.objects.filter(
-            school=self.request.user.school
-        ).select_related(
-            'school', 'uploaded_by', 'matched_fee'
-        ).order_by('created_at')
\ No newline at end of file
+        return Payment.scoped.select_related(*PAYMENT_RELATED).order_by('created_at')
\ No newline at end of file
@@ -0,0 +1,12 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from school.models import School
+from school.tenancy import forget_school
+
+
+@receiver(post_save, sender=School)
+@receiver(post_delete, sender=School)
+def school_changed(sender, instance, **kwargs):
+    # Only this process's cache; others pick the change up after TENANT_CACHE_TIMEOUT
+    forget_school(instance.pk)
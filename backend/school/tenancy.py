@@ -0,0 +1,125 @@
+"""
+The school ("tenant") the current request or job works for.
+
+TenantMiddleware publishes the request here. DRF authenticates inside the
+view, after middleware has run, so the school is resolved the first time
+it is asked for once the user is known, from `user.school_id`, and kept on
+the request. Code outside a request (workers, commands, shells) sets it
+with `tenant_context(school)`.
+
+School rows come from a small in-process cache, so resolving the tenant
+costs no query once a school has been seen.
+"""
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import models
+
+from school.models import School
+
+_current_request = ContextVar('tenant_request', default=None)
+_current_school = ContextVar('tenant_school', default=None)
+
+# school id -> (School, monotonic expiry)
+_schools = {}
+
+
+def get_school(school_id):
+    """School by id, from the in-process cache (TENANT_CACHE_TIMEOUT seconds)"""
+    cached = _schools.get(school_id)
+    if cached is not None and cached[1] > time.monotonic():
+        return cached[0]
+    school = School.objects.get(pk=school_id)
+    _schools[school_id] = (school, time.monotonic() + settings.TENANT_CACHE_TIMEOUT)
+    return school
+
+
+def forget_school(school_id):
+    _schools.pop(school_id, None)
+
+
+def _request_school(request):
+    user = getattr(request, 'user', None)
+    if user is None or not user.is_authenticated:
+        # Not memoised: DRF may still authenticate later in the request
+        return None
+    try:
+        return request._tenant_school
+    except AttributeError:
+        request._tenant_school = get_school(user.school_id) if user.school_id else None
+        return request._tenant_school
+
+
+def has_tenant_context():
+    return _current_school.get() is not None or _current_request.get() is not None
+
+
+def get_current_school():
+    """
+    The current tenant's School, or None for an anonymous request or a user
+    without a school.
+    """
+    school = _current_school.get()
+    if school is not None:
+        return school
+    request = _current_request.get()
+    if request is None:
+        return None
+    return _request_school(request)
+
+
+@contextmanager
+def tenant_context(school):
+    """Run a block as `school`, e.g. in a worker or management command"""
+    token = _current_school.set(school)
+    try:
+        yield school
+    finally:
+        _current_school.reset(token)
+
+
+class TenantMiddleware:
+    """Make the request's school available to get_current_school() and scoped managers"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        token = _current_request.set(request)
+        try:
+            return self.get_response(request)
+        finally:
+            _current_request.reset(token)
+
+
+class SchoolScopedManager(models.Manager):
+    """
+    Manager limited to the current tenant's rows.
+
+    `school_field` is the lookup to the owning school, through a relation
+    for models without their own `school` column. The filter is on the id,
+    so the School row is never joined. Outside a tenant context the manager
+    raises rather than returning every school's rows; a request whose user
+    has no school gets an empty queryset.
+
+    Models keep a plain `objects` as their default manager for the admin,
+    services and workers, which pass the school explicitly.
+    """
+
+    def __init__(self, school_field='school'):
+        super().__init__()
+        self.school_field = school_field
+
+    def get_queryset(self):
+        if not has_tenant_context():
+            raise RuntimeError(
+                f'{self.model.__name__}.{self.name} used outside a tenant context; '
+                'use tenant_context(school) or filter objects by school'
+            )
+        queryset = super().get_queryset()
+        school = get_current_school()
+        if school is None:
+            return queryset.none()
+        return queryset.filter(**{f'{self.school_field}_id': school.pk})
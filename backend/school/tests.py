@@ -1,3 +1,67 @@
+from datetime import date
+from decimal import Decimal
+
 from django.test import TestCase
+from rest_framework.test import APIClient
+
+from accounts.models import User
+from academics.models import Class, Student, StudentFee, AcademicYear, FeeItem
+from school.models import School
+from school.tenancy import get_school, tenant_context
+
+
+class TenantScopingTests(TestCase):
+
+    def setUp(self):
+        self.school = School.objects.create(name="Test Academy")
+        self.other_school = School.objects.create(name="Other Academy")
+        self.students = {}
+        for school, prefix in ((self.school, 'TA'), (self.other_school, 'OA')):
+            student_class = Class.objects.create(name="Form 1", school=school)
+            year = AcademicYear.objects.create(
+                name=f"{prefix}2026", start_date=date(2026, 1, 6), end_date=date(2026, 11, 30), school=school
+            )
+            fee_item = FeeItem.objects.create(name="Tuition", amount=Decimal("10000.00"), school=school)
+            student = Student.objects.create(
+                first_name="Amina", last_name="Otieno", student_id=f"{prefix}0001",
+                school=school, student_class=student_class
+            )
+            StudentFee.objects.create(student=student, fee_item=fee_item, academic_year=year, term=1)
+            self.students[school.pk] = student
+
+        user = User.objects.create_user(username='bursar', password='bursar123', role='ADMIN', school=self.school)
+        self.client = APIClient()
+        self.client.force_authenticate(user)
+
+    def test_views_only_see_the_users_school(self):
+        own = self.students[self.school.pk]
+        other = self.students[self.other_school.pk]
+
+        response = self.client.get('/api/payments/students/')
+        self.assertEqual([row['student_id'] for row in response.json()['results']], [own.student_id])
+        self.assertEqual(self.client.get(f'/api/payments/students/{own.pk}/').status_code, 200)
+        self.assertEqual(self.client.get(f'/api/payments/students/{other.pk}/').status_code, 404)
+        self.assertEqual(self.client.get(f'/api/payments/students/{other.pk}/fees/').status_code, 404)
+
+        classes = self.client.get('/api/payments/dashboard/class-balances/').json()
+        self.assertEqual([row['total_expected'] for row in classes], [10000.0])
+
+    def test_scoped_managers_need_a_tenant(self):
+        with self.assertRaises(RuntimeError):
+            list(Student.scoped.all())
+
+        with tenant_context(self.other_school):
+            self.assertEqual(list(Student.scoped.all()), [self.students[self.other_school.pk]])
+            self.assertEqual(
+                list(StudentFee.scoped.values_list('student_id', flat=True)),
+                [self.students[self.other_school.pk].pk]
+            )
+
+    def test_schools_are_cached_until_saved(self):
+        get_school(self.school.pk)
+        with self.assertNumQueries(0):
+            self.assertEqual(get_school(self.school.pk).name, "Test Academy")
 
-# Create your tests here.
+        self.school.name = "Renamed Academy"
+        self.school.save()
+        self.assertEqual(get_school(self.school.pk).name, "Renamed Academy")
@@ -18,6 +18,7 @@ import toast from 'react-hot-toast';
 const Upload = () => {
   const [file, setFile] = useState(null);
   const [uploading, setUploading] = useState(false);
+  const [progress, setProgress] = useState(null);
   const [result, setResult] = useState(null);
   const [dragActive, setDragActive] = useState(false);
 
@@ -78,17 +79,43 @@ const Upload = () => {
     setUploading(true);
     try {
       const response = await paymentsService.uploadCSV(file);
-      
-      setResult(response);
+      if (response.cached) {
+        toast('This file was already uploaded; showing the earlier result');
+      }
+
+      // Processing happens in the background; poll until the job finishes
+      const job = await paymentsService.waitForUploadJob(response.job.id, {
+        onProgress: setProgress,
+      });
+
+      if (job.status === 'FAILED') {
+        toast.error(job.error_message || 'Failed to process file');
+        return;
+      }
+
+      setResult({
+        job,
+        summary: {
+          total: job.rows_matched + job.rows_failed,
+          matched: job.rows_matched,
+          failed: job.rows_failed,
+          duplicates: job.rows_duplicate,
+        },
+      });
       toast.success('File uploaded and processed successfully!');
       
       // Clear file after successful upload
       setFile(null);
     } catch (error) {
       console.error('Upload error:', error);
-      toast.error(error.response?.data?.error || 'Failed to upload file');
+      if (error.code === 'UPLOAD_TIMEOUT') {
+        toast.error(error.message);
+      } else {
+        toast.error(error.response?.data?.error || 'Failed to upload file');
+      }
     } finally {
       setUploading(false);
+      setProgress(null);
     }
   };
 
@@ -207,6 +234,13 @@ const Upload = () => {
                   Clear
                 </Button>
               </div>
+              {progress && (
+                <p className="text-sm text-navy-500">
+                  {progress.status === 'QUEUED'
+                    ? 'Waiting for processing to start...'
+                    : `Parsed ${progress.rows_parsed} rows, matched ${progress.rows_matched}`}
+                </p>
+              )}
             </div>
           )}
         </div>
@@ -241,6 +275,12 @@ const Upload = () => {
               />
             </div>
 
+            {result.summary?.duplicates > 0 && (
+              <p className="text-sm text-navy-500 mb-4">
+                {result.summary.duplicates} row(s) were already uploaded and were skipped.
+              </p>
+            )}
+
             {result.summary?.failed > 0 && (
               <div className="bg-warning-50 border border-warning-200 rounded-lg p-4 flex items-start">
                 <AlertCircle className="w-5 h-5 text-warning-600 mr-3 flex-shrink-0 mt-0.5" />
@@ -20,6 +20,33 @@ export const paymentsService = {
     return response.data;
   },
 
+  // Get upload job progress
+  getUploadJob: async (id) => {
+    const response = await api.get(`/payments/upload/jobs/${id}/`);
+    return response.data;
+  },
+
+  // Poll an upload job until the worker finishes it, giving up after `timeout` ms
+  waitForUploadJob: async (id, { interval = 2000, timeout = 10 * 60 * 1000, onProgress } = {}) => {
+    const deadline = Date.now() + timeout;
+    for (;;) {
+      const job = await paymentsService.getUploadJob(id);
+      if (onProgress) onProgress(job);
+      if (job.status === 'COMPLETED' || job.status === 'FAILED') {
+        return job;
+      }
+      if (Date.now() + interval > deadline) {
+        const error = new Error(
+          'The file is still being processed. Check the payments list again in a few minutes.'
+        );
+        error.code = 'UPLOAD_TIMEOUT';
+        error.job = job;
+        throw error;
+      }
+      await new Promise((resolve) => setTimeout(resolve, interval));
+    }
+  },
+
   // Get payments list
   getPayments: async (params = {}) => {
     const response = await api.get('/payments/list/', { params });